@@ -0,0 +1,128 @@
+"""
+取得レイヤー（fetch_company_bundle）またはバッチ処理（src.batch）のローカル負荷試験
+
+FMPのスタブサーバー（benchmarks.fmp_stub_server）を起動し、遅延・429・エラーを注入した状態で
+合成銘柄を取得する。ディスクキャッシュは使わない（batch モードでは一時ディレクトリを使う）。
+
+実行方法:
+    python -m benchmarks.bench_fetch --tickers 200 --concurrency 8 --latency-ms 50 --rate-limit 100 --error-rate 0.02
+    python -m benchmarks.bench_fetch --mode batch --tickers 200 --workers 4 --latency-ms 50
+    python -m benchmarks.bench_fetch --tickers 100 --client-plan 600/60 --lanes interactive,batch --concurrency 16
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import numpy as np
+
+from benchmarks.fmp_stub_server import FMPStubServer, StubConfig
+
+
+def run_fetch(server, tickers, concurrency, max_retries, backoff_base, client_plan, lanes):
+    from src import data_fetchers
+
+    data_fetchers.configure(api_key="stub", base_url=server.url)
+    data_fetchers.configure_rate_limit(plan=client_plan)
+    data_fetchers.configure_cache(enabled=False)
+    data_fetchers.configure_session(pool_maxsize=max(16, concurrency * 4),
+                                    max_retries=max_retries, backoff_base=backoff_base)
+
+    def fetch(args):
+        ticker, lane = args
+        start = time.perf_counter()
+        bundle = data_fetchers.fetch_company_bundle(ticker, lane=lane)
+        return time.perf_counter() - start, bundle.ok
+
+    # 銘柄を順にレーンへ割り当てる（例: interactive,batch で半数ずつ）
+    jobs = [(ticker, lanes[i % len(lanes)]) for i, ticker in enumerate(tickers)]
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(fetch, jobs))
+    elapsed = time.perf_counter() - start
+
+    latencies = np.array([r[0] for r in results])
+    lane_latencies = {
+        lane: np.array([r[0] for r, (_, job_lane) in zip(results, jobs) if job_lane == lane]) for lane in lanes
+    }
+    return {
+        "mode": "fetch",
+        "tickers": len(tickers),
+        "ok": int(sum(r[1] for r in results)),
+        "elapsed_sec": elapsed,
+        "tickers_per_sec": len(tickers) / elapsed,
+        "bundle_p50_ms": float(np.percentile(latencies, 50) * 1e3),
+        "bundle_p95_ms": float(np.percentile(latencies, 95) * 1e3),
+        "bundle_p50_ms_by_lane": {lane: float(np.percentile(v, 50) * 1e3) for lane, v in lane_latencies.items()},
+        "session": data_fetchers.get_session_stats(),
+        "rate_limit": data_fetchers.get_rate_limit_stats(),
+    }
+
+
+def run_batch_mode(server, tickers, workers, fetch_concurrency, client_plan):
+    from src.batch import run_batch
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # ワーカープロセス（spawn）は環境変数を引き継ぐ
+        os.environ.update({
+            "FMP_BASE_URL": server.url,
+            "FMP_API_KEY": "stub",
+            "FMP_CACHE_DIR": str(Path(tmp) / "cache"),
+            "FMP_PLAN": client_plan,
+            "FMP_RATE_LIMIT_DIR": str(Path(tmp) / "ratelimit"),
+        })
+        start = time.perf_counter()
+        counts = run_batch(tickers, Path(tmp) / "results.csv", workers=workers,
+                           fetch_concurrency=fetch_concurrency, progress=False)
+        elapsed = time.perf_counter() - start
+
+    return {
+        "mode": "batch",
+        "tickers": len(tickers),
+        **counts,
+        "elapsed_sec": elapsed,
+        "tickers_per_sec": len(tickers) / elapsed,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="スタブサーバーを使った取得レイヤーの負荷試験")
+    parser.add_argument("--mode", choices=["fetch", "batch"], default="fetch")
+    parser.add_argument("--tickers", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8, help="fetch モードで同時に取得する銘柄数")
+    parser.add_argument("--workers", type=int, default=4, help="batch モードのワーカープロセス数")
+    parser.add_argument("--fetch-concurrency", type=int, default=4, help="batch モードのFMPへの同時アクセス数")
+    parser.add_argument("--max-retries", type=int, default=3)
+    parser.add_argument("--backoff-base", type=float, default=0.1)
+    parser.add_argument("--latency-ms", type=float, default=20.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=10.0)
+    parser.add_argument("--rate-limit", type=float, default=None)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--client-plan", default="unlimited",
+                        help="クライアント側のレート制限（プラン名または '300/60'、unlimited で無効）")
+    parser.add_argument("--lanes", default="interactive",
+                        help="fetch モードで銘柄を順に割り当てるレーン（カンマ区切り、例: interactive,batch）")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+                        rate_limit=args.rate_limit, error_rate=args.error_rate)
+    tickers = [f"SYN{i:05d}" for i in range(args.tickers)]
+
+    with FMPStubServer(config) as server:
+        if args.mode == "fetch":
+            report = run_fetch(server, tickers, args.concurrency, args.max_retries, args.backoff_base,
+                               args.client_plan, args.lanes.split(","))
+        else:
+            report = run_batch_mode(server, tickers, args.workers, args.fetch_concurrency, args.client_plan)
+        report["server"] = server.get_stats()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
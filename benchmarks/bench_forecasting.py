@@ -0,0 +1,56 @@
+"""
+シナリオごとの三表予測（dict ベース）とバッチ予測（forecast_statements_batch）の比較
+
+実行方法:
+    python -m benchmarks.bench_forecasting
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_company_payloads
+from src.pipeline import build_history, forecast_scenario
+from src.batch_forecasting import forecast_statements_batch
+
+
+def main():
+    parser = argparse.ArgumentParser(description="forecast_statements_batch benchmark")
+    parser.add_argument("--scenarios", type=int, nargs="+", default=[3, 100, 1000])
+    parser.add_argument("--years", type=int, default=10)
+    args = parser.parse_args()
+
+    payloads = make_company_payloads("BENCH")
+    history = build_history(payloads["income"], payloads["balance"], payloads["cash_flow"])
+    pl_list, bs_list, returns_list = history["pl_list"], history["bs_list"], history["returns_list"]
+    rng = np.random.default_rng(0)
+
+    print(f"{'scenarios':>10} {'per-scenario [ms]':>18} {'batch [ms]':>11} {'speedup':>8} {'max abs diff':>13}")
+    for n in args.scenarios:
+        growth_matrix = rng.normal(0.05, 0.03, (n, args.years))
+        ppe_coef = rng.uniform(0.2, 1.0, n)
+        intangible_coef = rng.uniform(0.2, 1.0, n)
+
+        start = time.perf_counter()
+        loop_fcf = np.array([
+            [cf["fcf"] for cf in forecast_scenario(
+                pl_list, bs_list, returns_list, list(growth_matrix[i]),
+                ppe_growth_coef=ppe_coef[i], intangible_growth_coef=intangible_coef[i]
+            )["cf_list"][len(pl_list):]]
+            for i in range(n)
+        ])
+        t_loop = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = forecast_statements_batch(
+            pl_list, bs_list, returns_list, growth_matrix,
+            ppe_growth_coef=ppe_coef, intangible_growth_coef=intangible_coef
+        )
+        t_batch = time.perf_counter() - start
+
+        diff = np.max(np.abs(batch["cf"]["fcf"] - loop_fcf))
+        print(f"{n:>10} {t_loop * 1e3:>18.1f} {t_batch * 1e3:>11.2f} {t_loop / t_batch:>7.0f}x {diff:>13.3g}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+ヘッドレスなワーカーの起動時間（モジュール読み込み時間）の計測
+
+新しいインタプリタでワーカーが使うモジュールを読み込み、所要時間と
+重い依存（streamlit / matplotlib / seaborn / pandas）が読み込まれていないことを確認する。
+--max-ms を超えた場合、または重い依存が読み込まれた場合は終了コード1で終了する（CIでの退行検知用）。
+
+実行方法:
+    python -m benchmarks.bench_import --max-ms 200
+"""
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# バッチ処理のワーカーが読み込むモジュール
+WORKER_MODULES = ["src.core", "src.batch", "src.data_fetchers", "src.pipeline", "src.batch_forecasting"]
+FORBIDDEN_MODULES = ["streamlit", "matplotlib", "seaborn", "pandas"]
+
+_PROBE = """
+import json, sys, time
+start = time.perf_counter()
+import importlib
+for name in {modules!r}:
+    importlib.import_module(name)
+from src import core
+core.value_company  # 計算コアの実体まで読み込む
+elapsed_ms = (time.perf_counter() - start) * 1000
+print(json.dumps({{
+    "elapsed_ms": elapsed_ms,
+    "loaded_forbidden": [m for m in {forbidden!r} if m in sys.modules],
+}}))
+"""
+
+
+def measure_once(modules=WORKER_MODULES):
+    """新しいインタプリタで1回読み込み、(インタプリタ起動込みの時間, 読み込み時間, 読み込まれた重い依存) を返す"""
+    import time
+    code = _PROBE.format(modules=modules, forbidden=FORBIDDEN_MODULES)
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    result = json.loads(completed.stdout.strip().splitlines()[-1])
+    return wall_ms, result["elapsed_ms"], result["loaded_forbidden"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ヘッドレスなワーカーの読み込み時間を計測する")
+    parser.add_argument("--repeat", type=int, default=5, help="計測回数（中央値を採用）")
+    parser.add_argument("--max-ms", type=float, default=None, help="読み込み時間の上限（ミリ秒）")
+    args = parser.parse_args(argv)
+
+    # 1回目は .pyc の生成を含むため捨てる
+    measure_once()
+    runs = [measure_once() for _ in range(args.repeat)]
+    wall_ms = statistics.median(r[0] for r in runs)
+    import_ms = statistics.median(r[1] for r in runs)
+    forbidden = sorted({m for r in runs for m in r[2]})
+
+    print(f"読み込み時間（中央値）: {import_ms:8.1f} ms")
+    print(f"プロセス起動込み      : {wall_ms:8.1f} ms")
+    print(f"重い依存の読み込み    : {', '.join(forbidden) if forbidden else 'なし'}")
+
+    failed = False
+    if forbidden:
+        print("NG: ワーカーの読み込み経路に重い依存が含まれています", file=sys.stderr)
+        failed = True
+    if args.max_ms is not None and import_ms > args.max_ms:
+        print(f"NG: 読み込み時間が上限 {args.max_ms:.0f} ms を超えています", file=sys.stderr)
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,41 @@
+"""
+モンテカルロ評価（run_monte_carlo）のパス数ごとの処理時間
+
+実行方法:
+    python -m benchmarks.bench_monte_carlo
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_company_payloads
+from src.pipeline import build_history
+from src.financial_utils import reconstruct_market_data
+from src.monte_carlo import run_monte_carlo
+
+
+def main():
+    parser = argparse.ArgumentParser(description="run_monte_carlo benchmark")
+    parser.add_argument("--paths", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payloads = make_company_payloads("BENCH")
+    history = build_history(payloads["income"], payloads["balance"], payloads["cash_flow"])
+    market_data = reconstruct_market_data(payloads["profile"], 0.04, 0.055)
+
+    print(f"{'paths':>10} {'best [ms]':>10} {'median fair price':>18}")
+    for n_paths in args.paths:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = run_monte_carlo(
+                history["pl_list"], history["bs_list"], history["returns_list"],
+                market_data, base_wacc=0.08, n_paths=n_paths, seed=0,
+            )
+            timings.append(time.perf_counter() - start)
+        median = result["summary"]["fair_share_price"]["percentiles"][50]
+        print(f"{n_paths:>10} {min(timings) * 1e3:>10.1f} {median:>18.2f}")
+
+
+if __name__ == "__main__":
+    main()
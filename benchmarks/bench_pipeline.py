@@ -0,0 +1,255 @@
+"""
+パイプラインの段階ごとのベンチマーク（合成FMPレスポンスを使用、ネットワーク不要）
+
+計測する段階:
+    reconstruct_*（PL・BS・CF）、compute_nopat_from_pl、compute_financial_ratios_from_pl_bs_nopat_nwc_ic、
+    forecast_*（PL・BS・CF）、compute_wacc、compute_dcf_valuation、sensitivity_analysis_dcf、グラフ描画
+
+段階ごとに1呼び出しあたりの処理時間（p50 / p95 / 平均）、スループット（呼び出し/秒）、
+ピークメモリ（tracemalloc、処理時間とは別に計測）を JSON で出力する。
+--save-baseline で結果を保存し、--baseline で保存済みの結果と比較できる。
+
+実行方法:
+    python -m benchmarks.bench_pipeline --tickers 50 --years 10 --save-baseline bench_baseline.json
+    python -m benchmarks.bench_pipeline --tickers 50 --years 10 --baseline bench_baseline.json
+"""
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.synthetic import make_universe
+from src.financial_utils import (
+    reconstruct_income_statement, reconstruct_balance_sheet, extract_returns_from_cf,
+    compute_nopat_from_pl, compute_nwc_from_bs, compute_invested_capital_from_bs,
+    compute_financial_ratios_from_pl_bs_nopat_nwc_ic, reconstruct_market_data,
+)
+from src.financial_forcasting import forecast_pl_from_growth, forecast_bs_from_pl, forecast_cf_from_pl_bs_nopat_nwc
+from src.compute_wacc import compute_cost_of_equity, compute_cost_of_debt_from_pl_bs, compute_wacc
+from src.dcf import compute_dcf_valuation, sensitivity_analysis_dcf
+from src.pipeline import (default_growth_rates, DEFAULT_RISK_FREE_RATE, DEFAULT_MARKET_RISK_PREMIUM,
+                          DEFAULT_PERPETUAL_GROWTH_RATE, DEFAULT_GROWTH_COEF)
+
+# 比較時にこの割合以上遅くなった段階を退行として扱う
+DEFAULT_TOLERANCE = 0.10
+
+
+def prepare_context(payloads):
+    """1銘柄分の各段階の入力を事前に計算しておく（この処理は計測対象外）"""
+    ctx = {"raw": payloads}
+    ctx["pl_list"] = reconstruct_income_statement(payloads["income"])
+    ctx["bs_list"] = reconstruct_balance_sheet(payloads["balance"])
+    ctx["returns_list"] = extract_returns_from_cf(payloads["cash_flow"])
+    ctx["nopat_list"] = compute_nopat_from_pl(ctx["pl_list"])
+    ctx["nwc_list"] = compute_nwc_from_bs(ctx["bs_list"])
+    ctx["ic_list"] = compute_invested_capital_from_bs(ctx["bs_list"])
+    ctx["growth_rates"] = default_growth_rates(ctx["pl_list"])
+
+    ctx["ext_pl"] = forecast_pl_from_growth(ctx["pl_list"], ctx["growth_rates"])
+    ctx["ext_bs"] = forecast_bs_from_pl(
+        ctx["ext_pl"], ctx["pl_list"], ctx["bs_list"], ctx["returns_list"],
+        ppe_growth_coef=DEFAULT_GROWTH_COEF, intangible_growth_coef=DEFAULT_GROWTH_COEF
+    )
+    ctx["ext_nopat"] = compute_nopat_from_pl(ctx["ext_pl"])
+    ctx["ext_nwc"] = compute_nwc_from_bs(ctx["ext_bs"])
+    ctx["cf_list"] = forecast_cf_from_pl_bs_nopat_nwc(ctx["ext_pl"], ctx["ext_bs"], ctx["ext_nopat"], ctx["ext_nwc"])
+
+    market_data = reconstruct_market_data(
+        payloads["profile"], risk_free_rate=DEFAULT_RISK_FREE_RATE, market_risk_premium=DEFAULT_MARKET_RISK_PREMIUM
+    )
+    ctx["cost_of_equity"] = compute_cost_of_equity(market_data)
+    ctx["cost_of_debt"] = compute_cost_of_debt_from_pl_bs(ctx["pl_list"], ctx["bs_list"])
+    ctx["wacc"] = compute_wacc(ctx["cost_of_equity"], ctx["cost_of_debt"], ctx["bs_list"], ctx["nopat_list"])
+    return ctx
+
+
+def _render_sensitivity_chart(ctx):
+    from src.render_cache import figure_to_bytes
+    from src.figures import build_sensitivity_figure
+    fig = build_sensitivity_figure("Normal", ctx["cf_list"], ctx["wacc"], DEFAULT_PERPETUAL_GROWTH_RATE)
+    return figure_to_bytes(fig)
+
+
+def _render_metrics_chart(ctx):
+    from src.render_cache import figure_to_bytes
+    from src.utils import to_dataframe
+    from src.figures import build_multiple_metrics_figure
+    df = to_dataframe(ctx["pl_list"])[["revenue", "operating_income", "net_income"]]
+    return figure_to_bytes(build_multiple_metrics_figure(df, "Income Statement"))
+
+
+# 段階名 → 1銘柄分の処理（入力は prepare_context の結果）
+STAGES = {
+    "reconstruct_income_statement": lambda c: reconstruct_income_statement(c["raw"]["income"]),
+    "reconstruct_balance_sheet": lambda c: reconstruct_balance_sheet(c["raw"]["balance"]),
+    "extract_returns_from_cf": lambda c: extract_returns_from_cf(c["raw"]["cash_flow"]),
+    "compute_nopat_from_pl": lambda c: compute_nopat_from_pl(c["pl_list"]),
+    "compute_financial_ratios_from_pl_bs_nopat_nwc_ic": lambda c: compute_financial_ratios_from_pl_bs_nopat_nwc_ic(
+        c["pl_list"], c["bs_list"], c["nopat_list"], c["nwc_list"], c["ic_list"]),
+    "forecast_pl_from_growth": lambda c: forecast_pl_from_growth(c["pl_list"], c["growth_rates"]),
+    "forecast_bs_from_pl": lambda c: forecast_bs_from_pl(
+        c["ext_pl"], c["pl_list"], c["bs_list"], c["returns_list"],
+        ppe_growth_coef=DEFAULT_GROWTH_COEF, intangible_growth_coef=DEFAULT_GROWTH_COEF),
+    "forecast_cf_from_pl_bs_nopat_nwc": lambda c: forecast_cf_from_pl_bs_nopat_nwc(
+        c["ext_pl"], c["ext_bs"], c["ext_nopat"], c["ext_nwc"]),
+    "compute_wacc": lambda c: compute_wacc(c["cost_of_equity"], c["cost_of_debt"], c["bs_list"], c["nopat_list"]),
+    "compute_dcf_valuation": lambda c: compute_dcf_valuation(c["cf_list"], c["wacc"], DEFAULT_PERPETUAL_GROWTH_RATE),
+    "sensitivity_analysis_dcf": lambda c: sensitivity_analysis_dcf(c["cf_list"], c["wacc"], DEFAULT_PERPETUAL_GROWTH_RATE),
+    "render.metrics_chart": _render_metrics_chart,
+    "render.sensitivity_heatmap": _render_sensitivity_chart,
+}
+RENDER_STAGES = [name for name in STAGES if name.startswith("render.")]
+
+
+def time_stage(func, contexts, repeat):
+    """全銘柄 × repeat 回呼び出し、1呼び出しごとの処理時間（秒）の配列を返す"""
+    func(contexts[0])  # ウォームアップ（遅延インポートやキャッシュの初期化を除外する）
+    samples = []
+    for _ in range(repeat):
+        for ctx in contexts:
+            start = time.perf_counter()
+            func(ctx)
+            samples.append(time.perf_counter() - start)
+    return np.array(samples)
+
+
+def peak_memory(func, contexts, max_calls=10):
+    """1呼び出しあたりのピークメモリ（バイト）の最大値を返す"""
+    tracemalloc.start()
+    try:
+        peak = 0
+        for ctx in contexts[:max_calls]:
+            tracemalloc.reset_peak()
+            base, _ = tracemalloc.get_traced_memory()
+            func(ctx)
+            _, call_peak = tracemalloc.get_traced_memory()
+            peak = max(peak, call_peak - base)
+    finally:
+        tracemalloc.stop()
+    return int(peak)
+
+
+def run_suite(n_tickers=20, years=10, repeat=5, stages=None, seed=0, render_tickers=3):
+    """
+    ベンチマークを実行し、結果を dict で返す。
+    グラフ描画は他の段階より桁違いに重いため、先頭の render_tickers 銘柄・1回のみ計測する。
+    """
+    universe = make_universe(n_tickers, years=years, seed=seed)
+    contexts = [prepare_context(payloads) for payloads in universe.values()]
+    selected = stages or list(STAGES)
+
+    results = {}
+    for name in selected:
+        func = STAGES[name]
+        if name in RENDER_STAGES:
+            stage_contexts, stage_repeat = contexts[:render_tickers], 1
+        else:
+            stage_contexts, stage_repeat = contexts, repeat
+        samples = time_stage(func, stage_contexts, stage_repeat)
+        results[name] = {
+            "calls": int(samples.size),
+            "p50_ms": float(np.percentile(samples, 50) * 1e3),
+            "p95_ms": float(np.percentile(samples, 95) * 1e3),
+            "mean_ms": float(samples.mean() * 1e3),
+            "throughput_per_sec": float(samples.size / samples.sum()),
+            "peak_memory_bytes": peak_memory(func, stage_contexts),
+        }
+
+    return {
+        "config": {"tickers": n_tickers, "years": years, "repeat": repeat, "seed": seed},
+        "environment": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+        },
+        "stages": results,
+    }
+
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """
+    p50 を基準に保存済みの結果と比較する。
+
+    Returns:
+        dict: 段階名 → {"baseline_p50_ms", "current_p50_ms", "ratio", "regression"}
+    """
+    comparison = {}
+    for name, stats in current["stages"].items():
+        base = baseline.get("stages", {}).get(name)
+        if base is None:
+            continue
+        ratio = stats["p50_ms"] / base["p50_ms"] if base["p50_ms"] > 0 else float("nan")
+        comparison[name] = {
+            "baseline_p50_ms": base["p50_ms"],
+            "current_p50_ms": stats["p50_ms"],
+            "ratio": ratio,
+            "regression": bool(ratio > 1 + tolerance),
+        }
+    return comparison
+
+
+def print_table(report, comparison=None):
+    header = f"{'stage':<52} {'p50 [ms]':>10} {'p95 [ms]':>10} {'calls/s':>10} {'peak mem':>10}"
+    if comparison is not None:
+        header += f" {'vs base':>8}"
+    print(header, file=sys.stderr)
+    for name, stats in report["stages"].items():
+        line = (f"{name:<52} {stats['p50_ms']:>10.3f} {stats['p95_ms']:>10.3f} "
+                f"{stats['throughput_per_sec']:>10.0f} {stats['peak_memory_bytes'] / 1024:>8.0f}KB")
+        if comparison is not None and name in comparison:
+            mark = " !" if comparison[name]["regression"] else ""
+            line += f" {comparison[name]['ratio']:>7.2f}x{mark}"
+        print(line, file=sys.stderr)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="パイプラインの段階ごとのベンチマーク")
+    parser.add_argument("--tickers", type=int, default=20, help="合成する銘柄数")
+    parser.add_argument("--years", type=int, default=10, help="1銘柄あたりの実績年数")
+    parser.add_argument("--repeat", type=int, default=5, help="銘柄ごとの繰り返し回数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=None, help="計測する段階（既定は全段階）")
+    parser.add_argument("--skip-render", action="store_true", help="グラフ描画の計測を省略する")
+    parser.add_argument("-o", "--output", help="結果のJSONの出力先（省略時は標準出力）")
+    parser.add_argument("--save-baseline", help="結果を比較用のベースラインとして保存する")
+    parser.add_argument("--baseline", help="保存済みのベースラインと比較する")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="p50 がこの割合以上遅くなった段階を退行とみなす")
+    parser.add_argument("--fail-on-regression", action="store_true", help="退行があれば終了コード1で終了する")
+    args = parser.parse_args(argv)
+
+    stages = args.stages
+    if args.skip_render:
+        stages = [name for name in (stages or STAGES) if name not in RENDER_STAGES]
+
+    report = run_suite(args.tickers, args.years, args.repeat, stages=stages, seed=args.seed)
+
+    comparison = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            comparison = compare(report, json.load(f), tolerance=args.tolerance)
+        report["comparison"] = comparison
+
+    print_table(report, comparison)
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            f.write(text)
+
+    if args.fail_on_regression and comparison and any(c["regression"] for c in comparison.values()):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
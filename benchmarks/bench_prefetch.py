@@ -0,0 +1,109 @@
+"""
+検索候補の先読み（src/prefetch.py）のベンチマーク
+
+ローカルのスタブサーバーに対して、検索 → 候補の表示 → ユーザーが考える時間（think time）→ 選択 を繰り返し、
+選択してから過去の財務データ・プロフィールが揃うまでの時間を、先読みなし・ありで比較する。
+あわせて、検索語を短い間隔で打ち直した場合に、外れた候補の先読みが取り消されリクエストが減ることを確認する。
+
+実行方法:
+    python -m benchmarks.bench_prefetch --trials 20 --think-ms 500 --latency-ms 80
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.fmp_stub_server import FMPStubServer, StubConfig
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="検索候補の先読みによる選択後の待ち時間の比較")
+    parser.add_argument("--trials", type=int, default=20)
+    parser.add_argument("--candidates", type=int, default=5)
+    parser.add_argument("--think-ms", type=float, default=500.0, help="候補の表示から選択までの時間")
+    parser.add_argument("--retype-ms", type=float, default=30.0, help="検索語を打ち直す間隔（取り消しの確認）")
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    from src import data_fetchers
+    from src.financial_utils import reconstruct_income_statement, reconstruct_balance_sheet, extract_returns_from_cf
+    from src.shared_cache import HistoryStore
+    from src.prefetch import Prefetcher
+
+    def open_ticker(store, ticker):
+        """main.py の銘柄選択後の処理と同じ手順で、過去の財務データとプロフィールを揃える"""
+        history = store.get(ticker)
+        if history is None:
+            bundle = data_fetchers.fetch_company_bundle(ticker)
+            bundle.raise_for_errors()
+            history = store.get_or_load(ticker, lambda: {
+                "pl_list": reconstruct_income_statement(bundle.income),
+                "bs_list": reconstruct_balance_sheet(bundle.balance),
+                "returns_list": extract_returns_from_cf(bundle.cash_flow),
+            })
+            return history, bundle.profile
+        return history, data_fetchers.fetch_market_data(ticker)
+
+    rng = np.random.default_rng(0)
+    report = {}
+    with FMPStubServer(StubConfig(latency_ms=args.latency_ms)) as server, \
+            tempfile.TemporaryDirectory() as cache_dir:
+        data_fetchers.configure(api_key="stub", base_url=server.url)
+        data_fetchers.configure_rate_limit(plan="unlimited")
+
+        for mode in ("no_prefetch", "prefetch"):
+            # 試行ごとに別の銘柄を使い、キャッシュは空の状態から始める
+            data_fetchers.configure_cache(cache_dir=f"{cache_dir}/{mode}")
+            store = HistoryStore()
+            prefetcher = Prefetcher(max_workers=args.workers, store=store)
+            server.reset_stats()
+            waits = []
+            offset = 0 if mode == "no_prefetch" else args.trials * args.candidates
+            for trial in range(args.trials):
+                candidates = [f"SYN{offset + trial * args.candidates + i:05d}" for i in range(args.candidates)]
+                if mode == "prefetch":
+                    prefetcher.request("bench:search", candidates)
+                time.sleep(args.think_ms / 1e3)
+                selected = candidates[int(rng.integers(len(candidates)))]
+                start = time.perf_counter()
+                open_ticker(store, selected)
+                waits.append(time.perf_counter() - start)
+            prefetcher.shutdown()
+            report[mode] = {
+                "select_to_ready_p50_ms": float(np.percentile(waits, 50) * 1e3),
+                "select_to_ready_p95_ms": float(np.percentile(waits, 95) * 1e3),
+                "requests": server.get_stats()["requests"],
+                "prefetch": prefetcher.get_stats() if mode == "prefetch" else None,
+            }
+
+        # 検索語の打ち直し: 候補が次々に置き換わる場合、外れた候補の先読みは取り消される
+        data_fetchers.configure_cache(cache_dir=f"{cache_dir}/retype")
+        store = HistoryStore()
+        prefetcher = Prefetcher(max_workers=args.workers, store=store)
+        server.reset_stats()
+        base = 2 * args.trials * args.candidates
+        for trial in range(args.trials):
+            candidates = [f"SYN{base + trial * args.candidates + i:05d}" for i in range(args.candidates)]
+            prefetcher.request("bench:search", candidates)
+            time.sleep(args.retype_ms / 1e3)
+        prefetcher.request("bench:search", [])
+        prefetcher.shutdown()
+        report["retype"] = {
+            "searches": args.trials,
+            "requests_without_cancellation": args.trials * args.candidates * 4,
+            "requests": server.get_stats()["requests"],
+            "prefetch": prefetcher.get_stats(),
+        }
+
+    report["speedup_p50"] = report["no_prefetch"]["select_to_ready_p50_ms"] / max(
+        report["prefetch"]["select_to_ready_p50_ms"], 1e-9)
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
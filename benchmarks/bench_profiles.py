@@ -0,0 +1,61 @@
+"""
+プロフィール（株価・ベータ）の更新のベンチマーク: 銘柄ごとの取得と一括取得（fetch_profiles_bulk）の比較
+
+実行方法:
+    python -m benchmarks.bench_profiles --tickers 3000 --batch-size 100 --latency-ms 50
+"""
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.fmp_stub_server import FMPStubServer, StubConfig
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="プロフィールの銘柄ごとの取得と一括取得の比較")
+    parser.add_argument("--tickers", type=int, default=3000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    args = parser.parse_args(argv)
+
+    from src import data_fetchers
+    from src.financial_utils import reconstruct_market_data
+
+    tickers = [f"SYN{i:05d}" for i in range(args.tickers)]
+    report = {}
+    with FMPStubServer(StubConfig(latency_ms=args.latency_ms)) as server:
+        data_fetchers.configure(api_key="stub", base_url=server.url)
+        data_fetchers.configure_cache(enabled=False)
+        data_fetchers.configure_rate_limit(plan="unlimited")
+        data_fetchers.configure_session(pool_maxsize=max(16, args.concurrency * 2))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            single = dict(zip(tickers, executor.map(data_fetchers.fetch_market_data, tickers)))
+        report["per_ticker"] = {"elapsed_sec": time.perf_counter() - start, **server.get_stats()}
+        server.reset_stats()
+
+        start = time.perf_counter()
+        bulk = data_fetchers.fetch_profiles_bulk(tickers, batch_size=args.batch_size, max_workers=args.concurrency)
+        report["bulk"] = {"elapsed_sec": time.perf_counter() - start, **server.get_stats()}
+
+    # 一括取得の結果が銘柄ごとの取得と一致することを確認する
+    mismatched = [
+        t for t in tickers
+        if reconstruct_market_data(bulk[t], 0.04, 0.055) != reconstruct_market_data(single[t], 0.04, 0.055)
+    ]
+    report["tickers"] = len(tickers)
+    report["missing"] = len(set(tickers) - set(bulk))
+    report["mismatched"] = len(mismatched)
+    for mode in ("per_ticker", "bulk"):
+        report[mode] = {key: report[mode][key] for key in ("elapsed_sec", "requests", "bytes_sent")}
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if not mismatched and not report["missing"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+"""
+DCF分析タブのグラフ（シナリオ別の比較グラフ2枚・感応度分析のヒートマップ3枚）の描画のベンチマーク:
+プロセス内で順に描画する場合と、ワーカープロセス（src/figures.py の RenderPool）で並列に描画する場合の比較
+
+最初のグラフが表示できるまでの時間（time-to-first-chart）と、全てのグラフが揃うまでの時間を計測する。
+ワーカープロセスは起動済み（render_pool.warm_up() 後）の状態で計測し、起動時間は別に表示する。
+並列化の効果は CPU 数に依存する（1CPU では短縮されない）。
+
+実行方法:
+    python -m benchmarks.bench_render --repeat 5 --workers 4
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import as_completed
+
+import numpy as np
+
+
+def make_figures(seed=0):
+    """main.py の DCF分析タブと同じ5枚分の (builder, args) を作る"""
+    from src.figures import build_ev_comparison_figure, build_price_comparison_figure, build_sensitivity_figure
+
+    rng = np.random.default_rng(seed)
+    scenarios = ["Downside", "Normal", "Upside"]
+    fcfs = [np.cumprod(np.full(10, 1.0 + g)) * 5e9 * rng.uniform(0.9, 1.1) for g in (0.02, 0.05, 0.08)]
+    labels = scenarios
+    enterprise_values = [float(x) for x in rng.uniform(80, 160, size=3)]
+    fair_prices = [float(x) for x in rng.uniform(100, 200, size=3)]
+    market_prices = [150.0] * 3
+    return [
+        (build_ev_comparison_figure, (labels, enterprise_values)),
+        (build_price_comparison_figure, (labels, fair_prices, market_prices)),
+        *[(build_sensitivity_figure, (scenario, fcf, 0.08, 0.025)) for scenario, fcf in zip(scenarios, fcfs)],
+    ]
+
+
+def render_serial(figures):
+    from src.figures import render_figure
+
+    start = time.perf_counter()
+    first = None
+    for builder, args in figures:
+        render_figure(builder, args)
+        first = first or time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def render_parallel(pool, figures):
+    start = time.perf_counter()
+    futures = [pool.submit(builder, args) for builder, args in figures]
+    first = None
+    for future in as_completed(futures):
+        future.result()
+        first = first or time.perf_counter() - start
+    return first, time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="グラフの描画: 順に描画 vs ワーカープロセスで並列に描画")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args(argv)
+
+    import matplotlib
+    matplotlib.use("Agg")
+    from src.figures import RenderPool
+
+    figures = make_figures()
+    render_serial(figures)  # フォント・テーマの初期化を計測から除く
+
+    pool = RenderPool(max_workers=args.workers)
+    start = time.perf_counter()
+    pool.warm_up()
+    render_parallel(pool, figures)
+    startup_sec = time.perf_counter() - start
+
+    results = {"serial": [], "parallel": []}
+    for i in range(args.repeat):
+        figures = make_figures(seed=i + 1)
+        results["serial"].append(render_serial(figures))
+        results["parallel"].append(render_parallel(pool, figures))
+    pool.shutdown()
+
+    def summarize(samples):
+        first, total = np.array(samples).T
+        return {"first_chart_ms": float(np.median(first) * 1e3), "all_charts_ms": float(np.median(total) * 1e3)}
+
+    report = {
+        "figures": len(figures),
+        "cpus": os.cpu_count(),
+        "workers": args.workers,
+        "worker_startup_sec": startup_sec,
+        "serial": summarize(results["serial"]),
+        "parallel": summarize(results["parallel"]),
+    }
+    report["speedup_first_chart"] = report["serial"]["first_chart_ms"] / report["parallel"]["first_chart_ms"]
+    report["speedup_all_charts"] = report["serial"]["all_charts_ms"] / report["parallel"]["all_charts_ms"]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
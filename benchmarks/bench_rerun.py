@@ -0,0 +1,105 @@
+"""
+ダッシュボード再実行時の計算時間：全再計算と計算グラフ（ComputeGraph）による差分再計算の比較
+
+シナリオ2の成長率を1セルだけ変更した再実行を想定する（グラフ描画は含まない）。
+
+実行方法:
+    python -m benchmarks.bench_rerun
+"""
+import argparse
+import time
+
+from benchmarks.synthetic import make_company_payloads
+from src.compute_graph import ComputeGraph, hash_inputs
+from src.financial_utils import reconstruct_market_data
+from src.pipeline import (build_history, build_history_frames, forecast_scenario, compact_scenario,
+                          compute_cost_of_capital, default_growth_rates, SCENARIO_GROWTH_MULTIPLIERS)
+from src.compute_wacc import CapitalStructure
+from src.dcf import compute_dcf_valuation_grid, compute_fair_share_price_from_bs, extract_fcf_array
+
+
+def rerun(graph, ticker, history, profile, growth_inputs, history_key=None, profile_key=None):
+    """
+    main.py の計算部分と同じノード構成で1回分の再実行を行う
+    （history_key・profile_key は main.py では銘柄の読み込み時に1回だけ計算する内容のハッシュ）
+    """
+    pl_list, bs_list, returns_list = history["pl_list"], history["bs_list"], history["returns_list"]
+    history_key = history_key or hash_inputs(history)
+    profile_key = profile_key or hash_inputs(profile)
+
+    history_node = graph.compute(
+        "history", lambda history_key: build_history_frames(pl_list, bs_list), history_key=history_key)
+    capital_node = graph.compute(
+        "capital_structure",
+        lambda history: CapitalStructure.from_history(pl_list, bs_list, history["nopat_list"]),
+        history=history_node
+    )
+
+    for idx, growth_rates in enumerate(growth_inputs):
+        forecast_node = graph.compute(
+            f"forecast_{idx}",
+            lambda history, growth_rates, ppe_coef, intangible_coef: compact_scenario(forecast_scenario(
+                pl_list, bs_list, returns_list, growth_rates,
+                ppe_growth_coef=ppe_coef, intangible_growth_coef=intangible_coef)),
+            history=history_node, growth_rates=growth_rates, ppe_coef=0.5, intangible_coef=0.5
+        )
+        fcf = extract_fcf_array(forecast_node.value["cf_list"], start=len(pl_list))
+
+        def compute_costs(capital, market_data_key, rfr, mrp):
+            market_data = reconstruct_market_data(profile, risk_free_rate=rfr, market_risk_premium=mrp)
+            return market_data, compute_cost_of_capital(
+                pl_list, bs_list, None, market_data, capital_structure=capital)
+
+        cost_node = graph.compute(f"cost_{idx}", compute_costs, capital=capital_node,
+                                  market_data_key=profile_key, rfr=0.04, mrp=0.055)
+
+        def compute_valuation(fcf, costs, wacc, growth):
+            enterprise_value = float(compute_dcf_valuation_grid(fcf, wacc, growth))
+            return compute_fair_share_price_from_bs(enterprise_value, bs_list, costs[0])
+
+        graph.compute(f"dcf_{idx}", compute_valuation, fcf=fcf,
+                      costs=cost_node, wacc=cost_node.value[1][2], growth=0.02)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="dashboard rerun benchmark")
+    parser.add_argument("--reruns", type=int, default=50)
+    args = parser.parse_args()
+
+    payloads = make_company_payloads("BENCH")
+    history = build_history(payloads["income"], payloads["balance"], payloads["cash_flow"])
+    growth_inputs = [
+        [round(r, 4) for r in default_growth_rates(history["pl_list"], multiplier=m)]
+        for m in SCENARIO_GROWTH_MULTIPLIERS
+    ]
+
+    def edited(i):
+        inputs = [list(g) for g in growth_inputs]
+        inputs[1][0] += 0.0001 * (i + 1)  # シナリオ2の1年目を編集
+        return inputs
+
+    # main.py と同様、内容のハッシュは銘柄の読み込み時に1回だけ計算する
+    keys = {"history_key": hash_inputs(history), "profile_key": hash_inputs(payloads["profile"])}
+
+    # 全再計算（毎回新しいグラフ＝キャッシュなし）
+    start = time.perf_counter()
+    for i in range(args.reruns):
+        rerun(ComputeGraph(), "BENCH", history, payloads["profile"], edited(i), **keys)
+    t_full = (time.perf_counter() - start) / args.reruns
+
+    # 差分再計算
+    graph = ComputeGraph()
+    rerun(graph, "BENCH", history, payloads["profile"], growth_inputs, **keys)
+    start = time.perf_counter()
+    for i in range(args.reruns):
+        rerun(graph, "BENCH", history, payloads["profile"], edited(i), **keys)
+    t_incremental = (time.perf_counter() - start) / args.reruns
+
+    recomputed = sorted(name for name, s in graph.get_stats().items() if s["misses"] > 1)
+    print(f"full recompute : {t_full * 1e3:8.2f} ms / rerun")
+    print(f"incremental    : {t_incremental * 1e3:8.2f} ms / rerun  ({t_full / t_incremental:.1f}x)")
+    print(f"recomputed nodes per edit: {', '.join(recomputed)}")
+
+
+if __name__ == "__main__":
+    main()
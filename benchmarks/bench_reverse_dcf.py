@@ -0,0 +1,73 @@
+"""
+逆DCF（市場株価から永久成長率・WACC・売上高成長率を逆算）のベンチマーク
+
+合成銘柄ごとに既知の前提で企業価値を計算し、それを目標として逆算した値が前提に一致するかと、
+全銘柄を一括で解いた場合と1銘柄ずつ解いた場合の処理時間を比較する。
+
+実行方法:
+    python -m benchmarks.bench_reverse_dcf --tickers 2000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_universe
+from src.pipeline import build_history
+from src.batch_forecasting import prepare_pl_drivers, prepare_bs_drivers, stack_drivers, forecast_from_drivers
+from src.dcf import compute_dcf_valuation_paths
+from src.reverse_dcf import implied_perpetual_growth, implied_wacc, implied_revenue_growth, summarize_convergence
+
+
+def main():
+    parser = argparse.ArgumentParser(description="reverse DCF benchmark")
+    parser.add_argument("--tickers", type=int, default=2000)
+    parser.add_argument("--loop-tickers", type=int, default=200, help="1銘柄ずつ解く比較に使う銘柄数")
+    args = parser.parse_args()
+
+    histories = [
+        build_history(p["income"], p["balance"], p["cash_flow"])
+        for p in make_universe(args.tickers).values()
+    ]
+    n = len(histories)
+    rng = np.random.default_rng(0)
+    wacc = rng.uniform(0.06, 0.11, n)
+    growth = rng.uniform(-0.01, 0.04, n)
+    revenue_growth = rng.uniform(-0.05, 0.15, n)
+
+    pl_drivers = stack_drivers([prepare_pl_drivers(h["pl_list"]) for h in histories])
+    bs_drivers = stack_drivers([prepare_bs_drivers(h["pl_list"], h["bs_list"], h["returns_list"]) for h in histories])
+    fcf = forecast_from_drivers(pl_drivers, bs_drivers, np.repeat(revenue_growth[:, None], 10, axis=1))["cf"]["fcf"]
+    target_ev = compute_dcf_valuation_paths(fcf, wacc, growth)
+
+    cases = {
+        "perpetual_growth": (lambda: implied_perpetual_growth(fcf, target_ev, wacc), growth,
+                             lambda i: implied_perpetual_growth(fcf[i:i + 1], target_ev[i], wacc[i])),
+        "wacc": (lambda: implied_wacc(fcf, target_ev, growth), wacc,
+                 lambda i: implied_wacc(fcf[i:i + 1], target_ev[i], growth[i])),
+        "revenue_growth": (lambda: implied_revenue_growth(histories, target_ev, wacc, growth), revenue_growth,
+                           lambda i: implied_revenue_growth(histories[i:i + 1], target_ev[i], wacc[i], growth[i])),
+    }
+
+    m = min(args.loop_tickers, n)
+    print(f"{'solve for':>16} {'batch [ms]':>11} {'loop/ticker [ms]':>17} {'speedup':>8} "
+          f"{'max |err| (unique root)':>24}  status")
+    for name, (solve_batch, truth, solve_one) in cases.items():
+        start = time.perf_counter()
+        x, diagnostics = solve_batch()
+        t_batch = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for i in range(m):
+            solve_one(i)
+        t_loop_per_ticker = (time.perf_counter() - start) / m
+
+        unique = diagnostics["converged"] & (diagnostics.get("sign_changes", np.ones(n)) == 1)
+        error = np.max(np.abs(x - truth)[unique]) if unique.any() else float("nan")
+        summary = summarize_convergence(diagnostics)
+        print(f"{name:>16} {t_batch * 1e3:>11.1f} {t_loop_per_ticker * 1e3:>17.3f} "
+              f"{t_loop_per_ticker * n / t_batch:>7.0f}x {error:>24.3g}  {summary['status_counts']}")
+
+
+if __name__ == "__main__":
+    main()
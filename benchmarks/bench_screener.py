@@ -0,0 +1,72 @@
+"""
+横断スクリーニング（src.screener）のベンチマーク
+
+合成銘柄の Universe を作り、指標・DCF評価の一括計算と、フィルタ + 上位k件の抽出の時間を測る。
+比較として、銘柄ごとに pipeline.value_company を呼ぶ場合の時間を一部の銘柄から推計する。
+
+実行方法:
+    python -m benchmarks.bench_screener --tickers 5000
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_universe
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="横断スクリーニングのベンチマーク")
+    parser.add_argument("--tickers", type=int, default=5000)
+    parser.add_argument("--top", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--loop-sample", type=int, default=100, help="銘柄ごとの評価の推計に使う銘柄数")
+    args = parser.parse_args(argv)
+
+    from src.pipeline import value_company
+    from src.screener import Screener, Universe
+
+    payloads = make_universe(args.tickers)
+    report = {"tickers": args.tickers}
+
+    start = time.perf_counter()
+    universe = Universe.from_payloads(payloads)
+    report["load_sec"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    screener = Screener(universe)
+    report["compute_sec"] = time.perf_counter() - start
+
+    # 「理論株価が株価を上回る銘柄のうち ROIC 上位50」
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        rows = screener.top("roic", k=args.top, where=screener["fair_share_price"] > screener["price"])
+        timings.append(time.perf_counter() - start)
+    report["query_p50_ms"] = float(np.median(timings) * 1e3)
+
+    timings = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        mask = screener.mask(roic=(0.15, None), operating_margin=(0.2, None), upside=(0.0, None))
+        screener.top("upside", k=args.top, where=mask)
+        timings.append(time.perf_counter() - start)
+    report["multi_filter_query_p50_ms"] = float(np.median(timings) * 1e3)
+    report["matches"] = len(rows)
+    report["top3"] = [row["ticker"] for row in rows[:3]]
+
+    sample = list(payloads.items())[:args.loop_sample]
+    start = time.perf_counter()
+    for _, p in sample:
+        value_company(p["income"], p["balance"], p["cash_flow"], p["profile"])
+    per_ticker = (time.perf_counter() - start) / len(sample)
+    report["per_ticker_loop_estimated_sec"] = per_ticker * args.tickers
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
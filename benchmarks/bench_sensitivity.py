@@ -0,0 +1,76 @@
+"""
+感応度分析（WACC × 永久成長率）のループ実装とベクトル化実装の比較ベンチマーク
+
+実行方法:
+    python -m benchmarks.bench_sensitivity
+"""
+import argparse
+import time
+from copy import deepcopy
+
+import numpy as np
+
+from src.dcf import compute_dcf_valuation, sensitivity_analysis_dcf
+
+
+def make_cf_list(years=10, base_fcf=1.0e9, growth=0.05):
+    return [{"fcf": base_fcf * (1 + growth) ** t} for t in range(years)]
+
+
+# 従来の二重ループ実装（比較用）
+def sensitivity_analysis_dcf_loop(cf_list, base_wacc, base_growth,
+                                  wacc_range=(-0.01, 0.01),
+                                  growth_range=(-0.005, 0.005),
+                                  wacc_steps=5, growth_steps=5):
+    wacc_list = np.linspace(base_wacc + wacc_range[0], base_wacc + wacc_range[1], wacc_steps)
+    g_list = np.linspace(base_growth + growth_range[0], base_growth + growth_range[1], growth_steps)
+
+    result_matrix = np.zeros((len(wacc_list), len(g_list)))
+    for i, wacc in enumerate(wacc_list):
+        for j, g in enumerate(g_list):
+            if g >= wacc:
+                result_matrix[i, j] = np.nan
+                continue
+            result_matrix[i, j] = compute_dcf_valuation(deepcopy(cf_list), wacc, g)
+
+    return result_matrix, list(wacc_list), list(g_list)
+
+
+def best_of(func, repeat, **kwargs):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(**kwargs)
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="sensitivity_analysis_dcf benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 50, 200])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cf_list = make_cf_list()
+
+    print(f"{'grid':>10} {'loop [ms]':>12} {'vector [ms]':>12} {'speedup':>9} {'max rel err':>12}")
+    for n in args.sizes:
+        kwargs = dict(
+            cf_list=cf_list, base_wacc=0.08, base_growth=0.02,
+            wacc_range=(-0.03, 0.03), growth_range=(-0.02, 0.02),
+            wacc_steps=n, growth_steps=n,
+        )
+        t_loop, (m_loop, _, _) = best_of(sensitivity_analysis_dcf_loop, args.repeat, **kwargs)
+        t_vec, (m_vec, _, _) = best_of(sensitivity_analysis_dcf, args.repeat, **kwargs)
+
+        if not np.array_equal(np.isnan(m_loop), np.isnan(m_vec)):
+            raise AssertionError("NaN cells differ between implementations")
+        valid = ~np.isnan(m_loop)
+        rel_err = np.max(np.abs(m_vec[valid] - m_loop[valid]) / np.abs(m_loop[valid])) if valid.any() else 0.0
+
+        print(f"{n:>4}x{n:<5} {t_loop * 1e3:>12.2f} {t_vec * 1e3:>12.3f} "
+              f"{t_loop / t_vec:>8.0f}x {rel_err:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+多数のセッションを開いた場合のメモリ使用量のベンチマーク: 従来のセッション状態と SessionStore の比較
+
+従来: セッションごとに生のレスポンス（income / balance / cash-flow / profile）・再構成したリスト・
+      計算グラフ（上限なし）・シナリオごとの cf_list を保持する
+現在: 過去の財務データは history_store でセッション間で共有し、セッションには SessionStore
+      （上限付き）に計算グラフの結果とプロフィール・FCFのベクトルだけを保持する
+
+サイズは estimate_size による概算。
+
+実行方法:
+    python -m benchmarks.bench_session_memory --sessions 300 --tickers 30 --budget-mb 64
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.bench_rerun import rerun
+from benchmarks.synthetic import make_company_payloads
+from src.compute_graph import ComputeGraph
+from src.dcf import extract_fcf_array
+from src.pipeline import (build_history, build_history_frames, forecast_scenario, default_growth_rates,
+                          SCENARIO_GROWTH_MULTIPLIERS)
+from src.session_store import SessionStore, SessionRegistry
+from src.shared_cache import HistoryStore, estimate_size
+
+MB = 1024 * 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="セッションごとのメモリ使用量の比較")
+    parser.add_argument("--sessions", type=int, default=300)
+    parser.add_argument("--tickers", type=int, default=30, help="セッションが開く銘柄の種類")
+    parser.add_argument("--session-mb", type=float, default=32.0)
+    parser.add_argument("--budget-mb", type=float, default=64.0, help="全セッションの合計の上限")
+    args = parser.parse_args(argv)
+
+    tickers = [f"SYN{i:05d}" for i in range(args.tickers)]
+    payloads = {t: make_company_payloads(t) for t in tickers}
+    rng = np.random.default_rng(0)
+    opened = [tickers[i] for i in rng.integers(len(tickers), size=args.sessions)]
+
+    def growth_inputs(history):
+        return [[round(r, 4) for r in default_growth_rates(history["pl_list"], multiplier=m)]
+                for m in SCENARIO_GROWTH_MULTIPLIERS]
+
+    # 従来のセッション状態（生のレスポンス・再構成したリスト・List[dict] の予測結果をセッションごとに保持）
+    legacy_bytes = []
+    for ticker in opened:
+        p = payloads[ticker]
+        history = build_history(p["income"], p["balance"], p["cash_flow"])
+        forecasts = [
+            forecast_scenario(history["pl_list"], history["bs_list"], history["returns_list"], growth_rates)
+            for growth_rates in growth_inputs(history)
+        ]
+        state = {
+            "income_raw": p["income"], "balance_raw": p["balance"], "cf_raw": p["cash_flow"],
+            "market_data_raw": p["profile"],
+            "pl_list": history["pl_list"], "bs_list": history["bs_list"], "returns_list": history["returns_list"],
+            "history": build_history_frames(history["pl_list"], history["bs_list"]),
+            **{f"forecast_{idx}": forecast for idx, forecast in enumerate(forecasts)},
+            **{f"cf_list_{idx}": forecast["cf_list"] for idx, forecast in enumerate(forecasts)},
+        }
+        legacy_bytes.append(estimate_size(state))
+
+    # SessionStore（合計の上限付き）
+    registry = SessionRegistry(max_bytes=int(args.budget_mb * MB))
+    history_store = HistoryStore()
+    stores = []
+    start = time.perf_counter()
+    for i, ticker in enumerate(opened):
+        p = payloads[ticker]
+        history = history_store.get_or_load(ticker, lambda: build_history(p["income"], p["balance"], p["cash_flow"]))
+        store = SessionStore(f"session{i}", max_bytes=int(args.session_mb * MB), registry=registry)
+        store.put("ticker", ticker, pin=True)
+        store.put("market_data_raw", p["profile"], pin=True)
+        store.put("history_raw", history, shared=True)
+        graph = ComputeGraph(store=store)
+        rerun(graph, ticker, history, p["profile"], growth_inputs(history))
+        for idx in range(3):
+            forecast = graph._entries.get(f"node:forecast_{idx}")
+            if forecast is not None:
+                store.put(f"fcf_{idx}", extract_fcf_array(forecast.value["cf_list"], start=len(history["pl_list"])), pin=True)
+        stores.append(store)
+    elapsed = time.perf_counter() - start
+    process = registry.get_stats(top=0)
+
+    # 上限で破棄されたセッションの再実行（破棄されたノードだけ再計算される）
+    oldest = stores[0]
+    p = payloads[opened[0]]
+    start = time.perf_counter()
+    rerun(ComputeGraph(store=oldest), opened[0], history_store.get(opened[0]), p["profile"],
+          growth_inputs(history_store.get(opened[0])))
+    rerun_after_eviction_ms = (time.perf_counter() - start) * 1e3
+
+    report = {
+        "sessions": args.sessions,
+        "tickers": args.tickers,
+        "legacy": {
+            "per_session_mb": float(np.mean(legacy_bytes) / MB),
+            "total_mb": float(np.sum(legacy_bytes) / MB),
+        },
+        "session_store": {
+            "per_session_mb": process["bytes"] / args.sessions / MB,
+            "total_mb": process["bytes"] / MB,
+            "pinned_mb": process["pinned_bytes"] / MB,
+            "budget_mb": args.budget_mb,
+            "shared_history_mb": history_store.get_stats()["bytes"] / MB,
+            "evicted_mb": process["evicted_bytes"] / MB,
+            "open_sec": elapsed,
+            "rerun_after_eviction_ms": rerun_after_eviction_ms,
+        },
+    }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0 if process["bytes"] <= registry.max_bytes else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
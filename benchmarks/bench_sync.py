@@ -0,0 +1,84 @@
+"""
+財務諸表のローカルストア（src.fundamentals_store）の差分同期のベンチマーク
+
+FMPのスタブサーバーで合成銘柄の財務諸表を初回同期したあと、最新の決算年を1年進めて
+（全銘柄が新しい決算を1期公表した状態）、全件の取り直しと差分同期の転送量・所要時間を比較する。
+
+実行方法:
+    python -m benchmarks.bench_sync --tickers 3000 --workers 16
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+from datetime import date
+from pathlib import Path
+
+from benchmarks.fmp_stub_server import FMPStubServer, StubConfig
+
+
+def run_sync(server, store, tickers, workers, force, today):
+    from src.fundamentals_store import sync_universe
+
+    server.reset_stats()
+    start = time.perf_counter()
+    summary = sync_universe(store, tickers, max_workers=workers, force=force, today=today)
+    elapsed = time.perf_counter() - start
+    stats = server.get_stats()
+    return {
+        "elapsed_sec": elapsed,
+        "http_requests": stats["requests"],
+        "bytes_sent": stats["bytes_sent"],
+        **{key: summary[key] for key in ("requests", "skipped_requests", "rows_received", "rows_written")},
+        "errors": len(summary["errors"]),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ローカルストアの差分同期と全件取得の転送量の比較")
+    parser.add_argument("--tickers", type=int, default=3000)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--client-plan", default="unlimited", help="クライアント側のレート制限（プラン名または '300/60'）")
+    args = parser.parse_args(argv)
+
+    from src import data_fetchers
+    from src.fundamentals_store import FundamentalsStore
+    from src.pipeline import build_history_from_store
+
+    tickers = [f"SYN{i:05d}" for i in range(args.tickers)]
+    # 2023年度までの10期 → 2024年度までの11期（過去分の値は同じ乱数列から生成されるため変わらない）
+    config = StubConfig(years=10, last_year=2023, latency_ms=args.latency_ms)
+
+    with FMPStubServer(config) as server, tempfile.TemporaryDirectory() as tmp:
+        data_fetchers.configure(api_key="stub", base_url=server.url)
+        data_fetchers.configure_rate_limit(plan=args.client_plan)
+        data_fetchers.configure_session(pool_maxsize=max(16, args.workers * 2))
+        store = FundamentalsStore(Path(tmp) / "fundamentals.sqlite3")
+
+        report = {"initial": run_sync(server, store, tickers, args.workers, False, date(2024, 6, 30))}
+        report["unchanged"] = run_sync(server, store, tickers, args.workers, False, date(2024, 6, 30))
+
+        config.years, config.last_year = 11, 2024
+        today = date(2025, 3, 31)
+        report["full_refresh"] = run_sync(server, store, tickers, args.workers, True, today)
+        # 全件取得で書き込まれた最新期を消し、差分同期を同じ状態から測る
+        conn = store._connect()
+        with conn:
+            conn.execute("DELETE FROM statements WHERE date >= '2024-12-31'")
+        report["delta_sync"] = run_sync(server, store, tickers, args.workers, False, today)
+        report["delta_bytes_ratio"] = report["delta_sync"]["bytes_sent"] / report["full_refresh"]["bytes_sent"]
+
+        start = time.perf_counter()
+        for ticker in tickers[:200]:
+            build_history_from_store(store, ticker)
+        report["build_history_from_store_ms"] = (time.perf_counter() - start) / min(200, len(tickers)) * 1e3
+        report["store"] = store.get_stats()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,91 @@
+"""
+無リスク利子率 × 市場リスクプレミアム × 永久成長率の感応度キューブのベンチマーク
+
+格子点ごとに reconstruct_market_data → compute_cost_of_capital → compute_dcf_valuation を呼ぶ従来の方法と、
+CapitalStructure を1回だけ作り compute_dcf_sensitivity_cube で一括計算する方法を比較する。
+あわせて、同じ要素数の WACC × g 格子を compute_dcf_valuation_grid で1回計算する時間も示す。
+
+実行方法:
+    python -m benchmarks.bench_wacc_surface --sizes 5 20 50
+"""
+import argparse
+import time
+
+import numpy as np
+
+from benchmarks.synthetic import make_company_payloads
+from src.financial_utils import reconstruct_market_data
+from src.pipeline import build_history, default_growth_rates, forecast_scenario, compute_cost_of_capital
+from src.compute_wacc import CapitalStructure
+from src.dcf import compute_dcf_valuation, compute_dcf_valuation_grid, compute_dcf_sensitivity_cube, extract_fcf_array
+
+
+def best_of(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="rfr x mrp x g sensitivity cube benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[5, 20, 50], help="各軸の点数")
+    parser.add_argument("--loop-max", type=int, default=20, help="ループ実装を計測する最大の点数")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    payloads = make_company_payloads("SYN00000")
+    history = build_history(payloads["income"], payloads["balance"], payloads["cash_flow"])
+    pl_list, bs_list, nopat_list = history["pl_list"], history["bs_list"], history["nopat_list"]
+    scenario = forecast_scenario(pl_list, bs_list, history["returns_list"], default_growth_rates(pl_list))
+    cf_list = scenario["cf_list"]
+    fcf = extract_fcf_array(cf_list)
+    profile = payloads["profile"]
+
+    t_summary, capital = best_of(
+        lambda: CapitalStructure.from_history(pl_list, bs_list, nopat_list,
+                                              reconstruct_market_data(profile, 0.04, 0.055)),
+        args.repeat)
+    print(f"CapitalStructure.from_history: {t_summary * 1e3:.3f} ms（ティッカーごとに1回）")
+
+    print(f"{'cube':>12} {'loop [ms]':>11} {'cube [ms]':>10} {'1 grid op [ms]':>15} "
+          f"{'speedup':>8} {'max rel err':>12}")
+    for n in args.sizes:
+        rfr = np.linspace(0.02, 0.06, n)
+        mrp = np.linspace(0.04, 0.07, n)
+        growth = np.linspace(0.0, 0.03, n)
+
+        t_cube, cube = best_of(lambda: compute_dcf_sensitivity_cube(fcf, capital, rfr, mrp, growth), args.repeat)
+        flat_wacc = np.linspace(0.05, 0.10, n * n)[:, None]
+        t_grid, _ = best_of(lambda: compute_dcf_valuation_grid(fcf, flat_wacc, growth[None, :]), args.repeat)
+
+        loop_ms = rel_err = float("nan")
+        if n <= args.loop_max:
+            def loop():
+                out = np.full((n, n, n), np.nan)
+                for i, r in enumerate(rfr):
+                    for j, m in enumerate(mrp):
+                        market_data = reconstruct_market_data(profile, risk_free_rate=r, market_risk_premium=m)
+                        _, _, wacc = compute_cost_of_capital(pl_list, bs_list, nopat_list, market_data)
+                        for k, g in enumerate(growth):
+                            if g < wacc:
+                                out[i, j, k] = compute_dcf_valuation(cf_list, wacc, g)
+                return out
+
+            t_loop, ev_loop = best_of(loop, 1)
+            loop_ms = t_loop * 1e3
+            ev_cube = cube["enterprise_value"]
+            if not np.array_equal(np.isnan(ev_loop), np.isnan(ev_cube)):
+                raise AssertionError("NaN cells differ between implementations")
+            valid = ~np.isnan(ev_loop)
+            rel_err = np.max(np.abs(ev_cube[valid] - ev_loop[valid]) / np.abs(ev_loop[valid])) if valid.any() else 0.0
+
+        speedup = "-" if np.isnan(loop_ms) else f"{loop_ms / (t_cube * 1e3):.0f}x"
+        print(f"{n:>3}x{n:>3}x{n:<3} {loop_ms:>11.1f} {t_cube * 1e3:>10.3f} {t_grid * 1e3:>15.3f} "
+              f"{speedup:>8} {rel_err:>12.2e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,419 @@
+"""
+FMP API のローカルスタブサーバー（負荷試験・障害試験用、ネットワーク不要）
+
+search / stock/list / income-statement / balance-sheet-statement / cash-flow-statement / profile の各エンドポイントに、
+記録済みのレスポンス（fixtures）または合成レスポンス（benchmarks.synthetic）を返す。
+遅延・429（レート制限）・5xx エラーを設定に応じて注入できる。
+
+- fixtures ディレクトリの構成: <dir>/<endpoint>/<SYMBOL>.json、<dir>/search/<query>.json
+- --record を指定すると、fixtures にないリクエストを --upstream（実際のFMP）へ中継して保存する（APIキーは保存しない）
+- fixtures になく、記録もしない場合は合成レスポンスを返す（--no-synthetic の場合は FMP と同じく空リスト）
+- GET /_stats で受け付けたリクエスト数・注入した障害の件数を、GET /_reset でそれらのリセットを行う
+
+実行例:
+    python -m benchmarks.fmp_stub_server --port 8765 --latency-ms 80 --rate-limit 20 --error-rate 0.02
+    FMP_BASE_URL=http://127.0.0.1:8765/api/v3 FMP_API_KEY=stub python -m src.batch tickers.txt -o out.csv
+
+    # 実際のFMPのレスポンスを記録し、以降はオフラインで再生する
+    python -m benchmarks.fmp_stub_server --fixtures fixtures/ --record
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+from benchmarks.synthetic import make_company_payloads, make_symbol_list
+
+API_PREFIX = "/api/v3"
+UPSTREAM_URL = "https://financialmodelingprep.com/api/v3"
+
+# エンドポイント → make_company_payloads の戻り値のキー
+STATEMENT_ENDPOINTS = {
+    "income-statement": "income",
+    "balance-sheet-statement": "balance",
+    "cash-flow-statement": "cash_flow",
+    "profile": "profile",
+}
+SEARCH_ENDPOINT = "search"
+SYMBOL_LIST_ENDPOINT = "stock"  # /stock/list（全銘柄一覧）
+
+
+@dataclass
+class StubConfig:
+    """
+    スタブサーバーの動作設定
+
+    Parameters:
+        fixtures_dir (str or None): 記録済みレスポンスのディレクトリ
+        record (bool): fixtures にないリクエストを upstream へ中継し、fixtures_dir に保存する
+        upstream (str): 記録時の中継先
+        synthetic (bool): fixtures にない銘柄に合成レスポンスを返す
+        universe (int): 検索対象とする合成銘柄数（SYN00000〜）
+        years (int): 合成レスポンスの年数
+        last_year (int): 合成レスポンスの最新の決算年（新しい決算の公表を再現する場合に進める）
+        seed (int): 合成レスポンス・障害注入の乱数シード
+        latency_ms (float): 応答前の待機時間の平均（ミリ秒）
+        latency_jitter_ms (float): 待機時間のばらつき（±一様乱数、ミリ秒）
+        rate_limit (float or None): 1秒あたりの許容リクエスト数（超過分は 429、None で無制限）
+        burst (int or None): レート制限のバースト許容量（既定は rate_limit と同じ）
+        error_rate (float): エラー応答を返す確率
+        error_codes (List[int]): 注入するエラーのステータスコード
+    """
+    fixtures_dir: str = None
+    record: bool = False
+    upstream: str = UPSTREAM_URL
+    synthetic: bool = True
+    universe: int = 1000
+    years: int = 10
+    last_year: int = 2024
+    seed: int = 0
+    latency_ms: float = 0.0
+    latency_jitter_ms: float = 0.0
+    rate_limit: float = None
+    burst: int = None
+    error_rate: float = 0.0
+    error_codes: list = field(default_factory=lambda: [500, 502, 503])
+
+
+class _TokenBucket:
+    """全リクエストで共有するトークンバケット（rate 個/秒、最大 capacity 個）"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """トークンを1つ取得する。取得できなければ次のトークンまでの秒数を返す"""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+@lru_cache(maxsize=4096)
+def _synthetic_payloads(ticker, years, seed, last_year=2024):
+    return make_company_payloads(ticker, years=years, seed=seed, last_year=last_year)
+
+
+def _fixture_name(value):
+    return quote(value, safe="") + ".json"
+
+
+class FMPStubServer:
+    """
+    スタブサーバー本体。start() でバックグラウンドスレッドで起動し、url を data_fetchers.configure に渡す。
+
+        with FMPStubServer(StubConfig(latency_ms=50)) as server:
+            data_fetchers.configure(api_key="stub", base_url=server.url)
+            ...
+    """
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self._rng = random.Random(self.config.seed)
+        self._rng_lock = threading.Lock()
+        self._bucket = None
+        if self.config.rate_limit:
+            self._bucket = _TokenBucket(self.config.rate_limit, self.config.burst or max(1, int(self.config.rate_limit)))
+        self._stats_lock = threading.Lock()
+        self._stats = self._empty_stats()
+        self._universe = [f"SYN{i:05d}" for i in range(self.config.universe)]
+
+        handler = type("_Handler", (_StubRequestHandler,), {"stub": self})
+        self._httpd = ThreadingHTTPServer((host, port), handler)
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}{API_PREFIX}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fmp-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self._httpd.serve_forever()
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    # ---- 統計 ----
+
+    @staticmethod
+    def _empty_stats():
+        return {"requests": 0, "by_endpoint": {}, "by_status": {}, "injected_429": 0,
+                "injected_errors": 0, "fixture_hits": 0, "recorded": 0, "synthetic": 0, "bytes_sent": 0}
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def get_stats(self):
+        with self._stats_lock:
+            return json.loads(json.dumps(self._stats))
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = self._empty_stats()
+
+    # ---- 応答の生成 ----
+
+    def _random(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def inject_faults(self):
+        """
+        設定に応じて遅延・429・エラーを注入する。
+
+        Returns:
+            Tuple[int, dict, dict] or None: 注入する応答 (status, body, headers)。注入しない場合は None
+        """
+        config = self.config
+        if config.latency_ms or config.latency_jitter_ms:
+            jitter = (self._random() * 2 - 1) * config.latency_jitter_ms
+            time.sleep(max(0.0, config.latency_ms + jitter) / 1000)
+
+        if self._bucket is not None:
+            wait = self._bucket.acquire()
+            if wait > 0:
+                self._count("injected_429")
+                body = {"Error Message": "Limit Reach . Please upgrade your plan or visit our documentation"}
+                return 429, body, {"Retry-After": str(max(1, math.ceil(wait)))}
+
+        if config.error_rate and self._random() < config.error_rate:
+            self._count("injected_errors")
+            with self._rng_lock:
+                status = self._rng.choice(config.error_codes)
+            return status, {"Error Message": "Injected error"}, {}
+        return None
+
+    def lookup(self, endpoint, argument, query):
+        """エンドポイントへの応答本文（JSON に変換可能な値）を返す"""
+        payload = self._read_fixture(endpoint, argument)
+        if payload is not None:
+            self._count("fixture_hits")
+            return payload
+
+        if self.config.record and self.config.fixtures_dir:
+            payload = self._fetch_upstream(endpoint, argument, query)
+            if isinstance(payload, list) and payload:
+                self._write_fixture(endpoint, argument, payload)
+                self._count("recorded")
+            return payload
+
+        if not self.config.synthetic:
+            return []
+        self._count("synthetic")
+        if endpoint == SEARCH_ENDPOINT:
+            return self._synthetic_search(argument, int(query.get("limit", 10)))
+        if endpoint == SYMBOL_LIST_ENDPOINT:
+            return self._synthetic_symbol_list()
+        return self._synthetic_statement(endpoint, argument)
+
+    def _synthetic_symbol_list(self):
+        # 合成銘柄（SYN00000〜）に、名前で検索できる合成銘柄一覧を加える
+        listed = [
+            {"symbol": ticker, "name": f"{ticker} Synthetic Inc.", "price": 100.0,
+             "exchange": "Synthetic Exchange", "exchangeShortName": "SYN", "type": "stock"}
+            for ticker in self._universe
+        ]
+        return listed + make_symbol_list(self.config.universe, seed=self.config.seed)
+
+    def _synthetic_statement(self, endpoint, symbols):
+        key = STATEMENT_ENDPOINTS[endpoint]
+        # profile は FMP と同じくカンマ区切りの複数銘柄に対応する
+        tickers = symbols.split(",") if endpoint == "profile" else [symbols]
+        payload = []
+        for ticker in tickers:
+            ticker = ticker.strip().upper()
+            if ticker:
+                payload.extend(_synthetic_payloads(ticker, self.config.years, self.config.seed,
+                                                  self.config.last_year)[key])
+        return payload
+
+    def _synthetic_search(self, text, limit):
+        text = text.strip().upper()
+        matches = []
+        for ticker in self._universe:
+            name = f"{ticker} Synthetic Inc."
+            if text in ticker or text in name.upper():
+                matches.append({
+                    "symbol": ticker, "name": name, "currency": "USD",
+                    "stockExchange": "Synthetic Exchange", "exchangeShortName": "SYN",
+                })
+                if len(matches) >= limit:
+                    break
+        return matches
+
+    def _fixture_path(self, endpoint, argument):
+        if argument.strip() == "":
+            return None
+        name = argument.lower() if endpoint == SEARCH_ENDPOINT else argument.upper()
+        return Path(self.config.fixtures_dir) / endpoint / _fixture_name(name)
+
+    def _read_fixture(self, endpoint, argument):
+        if not self.config.fixtures_dir:
+            return None
+        path = self._fixture_path(endpoint, argument)
+        if path is None or not path.exists():
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def _write_fixture(self, endpoint, argument, payload):
+        path = self._fixture_path(endpoint, argument)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(payload, f, ensure_ascii=False)
+        tmp_path.replace(path)
+
+    def _fetch_upstream(self, endpoint, argument, query):
+        import requests
+
+        if endpoint == SEARCH_ENDPOINT:
+            url = f"{self.config.upstream}/search"
+        elif endpoint == SYMBOL_LIST_ENDPOINT:
+            url = f"{self.config.upstream}/stock/list"
+        else:
+            url = f"{self.config.upstream}/{endpoint}/{argument}"
+        response = requests.get(url, params=query, timeout=30)
+        response.raise_for_status()
+        return response.json()
+
+
+class _StubRequestHandler(BaseHTTPRequestHandler):
+    stub = None  # サーバーごとのサブクラスで FMPStubServer を設定する
+    protocol_version = "HTTP/1.1"  # keep-alive を有効にする
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        path = parts.path
+
+        if path == "/_stats":
+            return self._send(200, self.stub.get_stats(), count=False)
+        if path == "/_reset":
+            self.stub.reset_stats()
+            return self._send(200, {"reset": True}, count=False)
+
+        if not path.startswith(API_PREFIX + "/"):
+            return self._send(404, {"Error Message": f"Unknown path: {path}"})
+        endpoint, _, argument = path[len(API_PREFIX) + 1:].partition("/")
+        argument = unquote(argument)
+        if endpoint == SEARCH_ENDPOINT:
+            argument = query.get("query", "")
+        elif endpoint == SYMBOL_LIST_ENDPOINT and argument == "list":
+            pass
+        elif endpoint not in STATEMENT_ENDPOINTS or not argument:
+            return self._send(404, {"Error Message": f"Unknown endpoint: {endpoint}"}, endpoint=endpoint)
+
+        if not query.get("apikey"):
+            return self._send(401, {"Error Message": "Invalid API KEY."}, endpoint=endpoint)
+
+        fault = self.stub.inject_faults()
+        if fault is not None:
+            status, body, headers = fault
+            return self._send(status, body, headers=headers, endpoint=endpoint)
+
+        try:
+            payload = self.stub.lookup(endpoint, argument, query)
+        except Exception as e:  # 記録時の中継エラーなど
+            return self._send(502, {"Error Message": f"{type(e).__name__}: {e}"}, endpoint=endpoint)
+
+        if endpoint != SEARCH_ENDPOINT and "limit" in query and isinstance(payload, list):
+            payload = payload[:int(query["limit"])]
+        return self._send(200, payload, endpoint=endpoint)
+
+    def _send(self, status, body, headers=None, endpoint=None, count=True):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+        if count:
+            stub = self.stub
+            with stub._stats_lock:
+                stats = stub._stats
+                stats["requests"] += 1
+                stats["bytes_sent"] += len(data)
+                stats["by_status"][str(status)] = stats["by_status"].get(str(status), 0) + 1
+                if endpoint:
+                    stats["by_endpoint"][endpoint] = stats["by_endpoint"].get(endpoint, 0) + 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="FMP API のローカルスタブサーバー")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--fixtures", default=None, help="記録済みレスポンスのディレクトリ")
+    parser.add_argument("--record", action="store_true", help="fixtures にないリクエストを upstream から取得して保存する")
+    parser.add_argument("--upstream", default=UPSTREAM_URL, help="記録時の中継先")
+    parser.add_argument("--no-synthetic", action="store_true", help="fixtures にない銘柄には空リストを返す")
+    parser.add_argument("--universe", type=int, default=1000, help="検索対象の合成銘柄数")
+    parser.add_argument("--years", type=int, default=10, help="合成レスポンスの年数")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="応答の遅延（ミリ秒）")
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0, help="遅延のばらつき（±ミリ秒）")
+    parser.add_argument("--rate-limit", type=float, default=None, help="1秒あたりの許容リクエスト数（超過分は429）")
+    parser.add_argument("--burst", type=int, default=None, help="レート制限のバースト許容量")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="5xx エラーを返す確率")
+    parser.add_argument("--error-codes", type=int, nargs="+", default=[500, 502, 503])
+    args = parser.parse_args(argv)
+
+    if args.record and not args.fixtures:
+        parser.error("--record には --fixtures が必要です")
+
+    config = StubConfig(
+        fixtures_dir=args.fixtures, record=args.record, upstream=args.upstream,
+        synthetic=not args.no_synthetic, universe=args.universe, years=args.years, seed=args.seed,
+        latency_ms=args.latency_ms, latency_jitter_ms=args.latency_jitter_ms,
+        rate_limit=args.rate_limit, burst=args.burst,
+        error_rate=args.error_rate, error_codes=args.error_codes,
+    )
+    server = FMPStubServer(config, host=args.host, port=args.port)
+    print(f"FMP stub server: {server.url}（FMP_BASE_URL に指定してください）", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
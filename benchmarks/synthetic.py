@@ -0,0 +1,151 @@
+"""
+ベンチマーク用の合成FMPレスポンス（income / balance / cash-flow / profile）を生成する
+"""
+import zlib
+
+import numpy as np
+
+
+def _rng(ticker, seed):
+    return np.random.default_rng([zlib.crc32(ticker.encode("utf-8")), seed])
+
+
+def make_company_payloads(ticker, years=10, seed=0, last_year=2024):
+    """
+    1銘柄分のFMP形式のレスポンスを生成する（FMPと同じく日付の降順）。
+
+    Returns:
+        dict: {"income": list, "balance": list, "cash_flow": list, "profile": list}
+    """
+    rng = _rng(ticker, seed)
+    revenue = rng.uniform(1e9, 5e10)
+    cost_ratio = rng.uniform(0.4, 0.7)
+    sga_ratio = rng.uniform(0.05, 0.2)
+    tax_rate = rng.uniform(0.15, 0.25)
+
+    income, balance, cash_flow = [], [], []
+    for i in range(years):
+        date = f"{last_year - years + 1 + i}-12-31"
+        revenue *= 1 + rng.normal(0.06, 0.04)
+        depreciation = revenue * rng.uniform(0.03, 0.05)
+        operating_income = revenue * (1 - cost_ratio - sga_ratio) - depreciation
+        interest_income = revenue * 0.005
+        interest_expense = revenue * 0.004
+        other = revenue * rng.normal(0.0, 0.002)
+        income_before_tax = operating_income + interest_income - interest_expense + other
+        income_tax = income_before_tax * tax_rate
+
+        income.append({
+            "date": date, "symbol": ticker,
+            "revenue": revenue,
+            "costOfRevenue": revenue * cost_ratio,
+            "sellingGeneralAndAdministrativeExpenses": revenue * sga_ratio,
+            "depreciationAndAmortization": depreciation,
+            "operatingIncome": operating_income,
+            "interestIncome": interest_income,
+            "interestExpense": interest_expense,
+            "totalOtherIncomeExpensesNet": other,
+            "incomeBeforeTax": income_before_tax,
+            "incomeTaxExpense": income_tax,
+            "netIncome": income_before_tax - income_tax,
+        })
+
+        assets = {
+            "cashAndCashEquivalents": revenue * rng.uniform(0.1, 0.3),
+            "shortTermInvestments": revenue * 0.05,
+            "netReceivables": revenue * rng.uniform(0.08, 0.15),
+            "inventory": revenue * rng.uniform(0.03, 0.1),
+            "otherCurrentAssets": revenue * 0.02,
+            "propertyPlantEquipmentNet": revenue * rng.uniform(0.3, 0.5),
+            "longTermInvestments": revenue * 0.1,
+            "intangibleAssets": revenue * rng.uniform(0.05, 0.15),
+            "otherNonCurrentAssets": revenue * 0.04,
+        }
+        liabilities = {
+            "shortTermDebt": revenue * 0.04,
+            "accountPayables": revenue * rng.uniform(0.06, 0.1),
+            "deferredRevenue": revenue * 0.02,
+            "otherCurrentLiabilities": revenue * 0.03,
+            "longTermDebt": revenue * rng.uniform(0.2, 0.4),
+            "otherNonCurrentLiabilities": revenue * 0.04,
+        }
+        total_assets = sum(assets.values())
+        total_liabilities = sum(liabilities.values())
+        equity = total_assets - total_liabilities
+        balance.append({
+            "date": date, "symbol": ticker, **assets, **liabilities,
+            "totalAssets": total_assets,
+            "totalLiabilities": total_liabilities,
+            "commonStock": equity * 0.2,
+            "retainedEarnings": equity * 0.8,
+            "accumulatedOtherComprehensiveIncomeLoss": 0.0,
+            "totalStockholdersEquity": equity,
+        })
+
+        net_income = income[-1]["netIncome"]
+        cash_flow.append({
+            "date": date, "symbol": ticker,
+            "dividendsPaid": -net_income * rng.uniform(0.1, 0.3),
+            "commonStockRepurchased": -net_income * rng.uniform(0.1, 0.4),
+        })
+
+    price = float(rng.uniform(10, 500))
+    profile = [{
+        "symbol": ticker,
+        "companyName": f"{ticker} Synthetic Inc.",
+        "price": price,
+        "beta": float(rng.uniform(0.6, 1.6)),
+        "mktCap": revenue * rng.uniform(1.0, 6.0),
+    }]
+
+    return {
+        "income": income[::-1],
+        "balance": balance[::-1],
+        "cash_flow": cash_flow[::-1],
+        "profile": profile,
+    }
+
+
+def make_universe(n_tickers, years=10, seed=0):
+    """n_tickers 銘柄分の {ticker: payloads} を生成する"""
+    return {
+        f"SYN{i:05d}": make_company_payloads(f"SYN{i:05d}", years=years, seed=seed)
+        for i in range(n_tickers)
+    }
+
+
+_NAME_SYLLABLES = ["ap", "ple", "mi", "cro", "soft", "al", "pha", "bet", "ama", "zon", "tes", "la", "nvi", "dia",
+                   "me", "ta", "ora", "cle", "in", "tel", "cis", "co", "ado", "be", "sa", "les", "for", "ce",
+                   "net", "flix", "qual", "comm", "bro", "ad", "vi", "sa", "pay", "pal", "sho", "pi", "fy"]
+_NAME_SUFFIXES = ["Inc.", "Corporation", "Holdings Inc.", "Group plc", "Technologies Inc.", "Co., Ltd.", "ETF", "Fund"]
+_EXCHANGES = ["NASDAQ", "NYSE", "AMEX", "OTC", "TSX", "LSE", "XETRA"]
+
+
+def make_symbol_list(n_symbols, seed=0):
+    """
+    FMP stock/list 形式の合成銘柄一覧（symbol / name / price / exchangeShortName / type）を生成する。
+    """
+    rng = np.random.default_rng(seed)
+    symbols = set()
+    items = []
+    while len(items) < n_symbols:
+        n_syllables = int(rng.integers(2, 5))
+        stem = "".join(rng.choice(_NAME_SYLLABLES, n_syllables))
+        symbol = "".join(ch for ch in stem.upper() if ch.isalpha())[:int(rng.integers(2, 6))]
+        if rng.random() < 0.1:
+            symbol += rng.choice([".TO", ".L", "-B", ".DE"])
+        if symbol in symbols:
+            symbol = f"{symbol}{len(items) % 100}"
+            if symbol in symbols:
+                continue
+        symbols.add(symbol)
+        suffix = rng.choice(_NAME_SUFFIXES)
+        items.append({
+            "symbol": symbol,
+            "name": f"{stem.capitalize()} {suffix}",
+            "price": float(rng.uniform(1, 500)),
+            "exchange": "",
+            "exchangeShortName": str(rng.choice(_EXCHANGES)),
+            "type": "etf" if suffix in ("ETF", "Fund") else "stock",
+        })
+    return items
@@ -1,9 +1,16 @@
+import time
+import uuid
+
 import streamlit as st
 import seaborn as sns
 import matplotlib.pyplot as plt
 import pandas as pd
 
-from src.data_fetchers import  search_ticker_by_name, fetch_income_statement, fetch_balance_sheet, fetch_cash_flow, fetch_market_data
+from src.data_fetchers import fetch_company_bundle, fetch_market_data
+from src.shared_cache import history_store
+from src.prefetch import prefetcher, parse_watchlist, DEFAULT_WATCHLIST
+from src.session_store import get_session_store, session_registry
+from src.symbol_index import search_symbols, get_index_stats
 
 from src.utils import to_dataframe, average_growth
 
@@ -11,39 +18,68 @@ from src.financial_utils import(
     reconstruct_income_statement,
     reconstruct_balance_sheet,
     extract_returns_from_cf,
-    compute_nopat_from_pl,
-    compute_nwc_from_bs,
-    compute_invested_capital_from_bs,
-    compute_financial_ratios_from_pl_bs_nopat_nwc_ic,
     reconstruct_market_data
 )
 
-from src.financial_forcasting import(
-    forecast_pl_from_growth,
-    forecast_bs_from_pl,
-    forecast_cf_from_pl_bs_nopat_nwc,
-)
+from src.pipeline import build_history_frames, forecast_scenario, compact_scenario, compute_cost_of_capital
+
+from src.compute_wacc import CapitalStructure
+
+from src.dcf import compute_dcf_valuation_grid, compute_fair_share_price_from_bs, extract_fcf_array
 
-from src.compute_wacc import compute_cost_of_equity, compute_cost_of_debt_from_pl_bs, compute_wacc, infer_cost_of_debt_from_wacc
+from src.compute_graph import ComputeGraph, hash_inputs
 
-from src.dcf import compute_dcf_valuation, compute_fair_share_price_from_bs
+from src import instrumentation
+from src.instrumentation import stage, capture
 
-from src.visualization import plot_multiple_metrics, plot_dcf_comparison_charts, plot_dcf_sensitivity_heatmaps
+from src.visualization import plot_multiple_metrics, plot_dcf_comparison_charts, plot_dcf_sensitivity_heatmaps, render_batch
+from src.figures import render_pool
+
+rerun_start = time.perf_counter()
 
 st.set_page_config(page_title="財務・DCF分析ダッシュボード", layout="wide")
 st.title("📈 財務分析＆DCF分析ダッシュボード")
 
+# 先読みの要求元・メモリ使用量の内訳をセッションごとに区別する
+if "session_id" not in st.session_state:
+    st.session_state.session_id = uuid.uuid4().hex
+session_id = st.session_state.session_id
+
+# セッションの計算結果はメモリ上限付きのストアに保持する（生のレスポンスは保持しない）
+session_store = get_session_store(st.session_state)
+
+# 再実行時に変更のあった入力の下流だけを再計算するための計算グラフ（セッションごと）
+if "compute_graph" not in st.session_state:
+    st.session_state.compute_graph = ComputeGraph(store=session_store)
+graph = st.session_state.compute_graph
+
+# ウォッチリストの銘柄は選択前からバックグラウンドで取得しておく
+# （再実行のたびに要求し直さず、入力が変わった場合のみ先読みの対象を置き換える）
+watchlist = st.sidebar.text_input("ウォッチリスト（先読みする銘柄、カンマ区切り）", value=DEFAULT_WATCHLIST)
+if st.session_state.get("watchlist_requested") != watchlist:
+    st.session_state.watchlist_requested = watchlist
+    prefetcher.request(f"{session_id}:watchlist", parse_watchlist(watchlist))
+
+# グラフを描画するワーカープロセスは、銘柄の選択・データの取得の間に起動しておく（プロセスごとに1回）
+@st.cache_resource
+def start_render_pool():
+    render_pool.warm_up()
+    return render_pool
+
+
+start_render_pool()
+
 company_query = st.text_input("企業名またはティッカーを入力してください（例: Apple）")
 
 selected_ticker = None
 
 if company_query:
-    search_results = search_ticker_by_name(company_query)
-
     if "search_cache" not in st.session_state or st.session_state.search_cache.get("query") != company_query:
-        # 企業名とティッカーのリストを作成
-        search_results = search_ticker_by_name(company_query)
+        # 企業名とティッカーのリストを作成（ローカルのインデックスで検索し、該当がない場合のみAPIを使う）
+        search_results = search_symbols(company_query)
         st.session_state.search_cache = {"query": company_query, "results": search_results}
+        # 検索候補を先読みする（前の検索の候補で未完了のものは取り消す）
+        prefetcher.request(f"{session_id}:search", [item["symbol"] for item in search_results])
     else:
         search_results = st.session_state.search_cache["results"]
     
@@ -55,65 +91,74 @@ if company_query:
             selected_ticker = selected_option.split(" - ")[0]
     else:
         st.warning("企業が見つかりませんでした。別のキーワードでお試しください。")
+elif "search_cache" in st.session_state:
+    del st.session_state.search_cache
+    prefetcher.request(f"{session_id}:search", [])
 
 if selected_ticker:
     st.success(f"選択されたティッカー: {selected_ticker}")
     ticker = selected_ticker 
-    if "ticker_cache" not in st.session_state or st.session_state.ticker_cache != ticker:
+    # pin したデータもセッションの上限を超える場合は破棄されうるため、揃っていなければ読み込み直す
+    loaded_keys = ("market_data_raw", "history_raw", "history_key", "market_data_key")
+    if session_store.get("ticker") != ticker or any(key not in session_store for key in loaded_keys):
         with st.spinner("データを取得しています..."):
-            # データ取得と処理
-            income_raw = fetch_income_statement(ticker)
-            balance_raw = fetch_balance_sheet(ticker)
-            cf_raw = fetch_cash_flow(ticker)
-            market_data_raw = fetch_market_data(ticker)
-
-            pl_list = reconstruct_income_statement(income_raw)
-            bs_list = reconstruct_balance_sheet(balance_raw)
-            returns_list = extract_returns_from_cf(cf_raw)
-
-            # セッションに保存
-            st.session_state.update({
-                "ticker_cache": ticker,
-                "income_raw": income_raw,
-                "balance_raw": balance_raw,
-                "cf_raw": cf_raw,
-                "market_data_raw": market_data_raw,
-                "pl_list": pl_list,
-                "bs_list": bs_list,
-                "returns_list": returns_list
-            })
+            # 過去の財務データはセッション間で共有する（同じ銘柄を同時に開いた場合も取得・再構成は1回）
+            history_raw = history_store.get(ticker)
+            if history_raw is None:
+                # データ取得（4エンドポイントを並行取得）と処理
+                bundle = fetch_company_bundle(ticker)
+                if not bundle.ok:
+                    for name, error in bundle.errors.items():
+                        st.error(f"{name} の取得に失敗しました: {error}")
+                    st.stop()
+
+                history_raw = history_store.get_or_load(ticker, lambda: {
+                    "pl_list": reconstruct_income_statement(bundle.income),
+                    "bs_list": reconstruct_balance_sheet(bundle.balance),
+                    "returns_list": extract_returns_from_cf(bundle.cash_flow),
+                })
+                market_data_raw = bundle.profile
+            else:
+                # 株価を含むプロフィールのみ取得する
+                try:
+                    market_data_raw = fetch_market_data(ticker)
+                except Exception as e:
+                    st.error(f"profile の取得に失敗しました: {e}")
+                    st.stop()
+
+            # セッションに保存（過去の財務データは history_store と共有しているため変更しない）
+            session_store.put("ticker", ticker, pin=True)
+            session_store.put("market_data_raw", market_data_raw, pin=True)
+            session_store.put("history_raw", history_raw, shared=True)
+            # 計算グラフの入力にはデータ自体ではなく内容のハッシュを渡す（再実行のたびにハッシュしない）
+            session_store.put("history_key", hash_inputs(history_raw), pin=True)
+            session_store.put("market_data_key", hash_inputs(market_data_raw), pin=True)
+            for key in session_store.keys():
+                if key.startswith("fcf_"):
+                    session_store.pop(key)  # 前の銘柄のシナリオのFCF
 
     # セッションから読み込み
-    pl_list = st.session_state.pl_list
-    bs_list = st.session_state.bs_list
-    returns_list = st.session_state.returns_list
-    market_data_raw = st.session_state.market_data_raw
-
-    nopat_list = compute_nopat_from_pl(pl_list)
-    nwc_list = compute_nwc_from_bs(bs_list)
-    ic_list = compute_invested_capital_from_bs(bs_list)
-    ratios_list = compute_financial_ratios_from_pl_bs_nopat_nwc_ic(pl_list, bs_list, nopat_list, nwc_list, ic_list)
-
-    df_pl = to_dataframe(pl_list)
-    df_bs = to_dataframe(bs_list)
-    df_nopat = to_dataframe(nopat_list)
-    df_nwc = to_dataframe(nwc_list)
-    df_ic = to_dataframe(ic_list)
-    df_ratios = to_dataframe(ratios_list)
-
-    df_combined = df_pl \
-        .join(df_bs, how="outer", rsuffix="_bs") \
-        .join(df_nopat, how="outer", rsuffix="_nopat") \
-        .join(df_nwc, how="outer", rsuffix="_nwc") \
-        .join(df_ic, how="outer", rsuffix="_ic") \
-        .join(df_ratios, how="outer", rsuffix="_ratios")
-
-    df_combined.sort_index(inplace=True)
+    history_raw = session_store["history_raw"]
+    pl_list = history_raw["pl_list"]
+    bs_list = history_raw["bs_list"]
+    returns_list = history_raw["returns_list"]
+    market_data_raw = session_store["market_data_raw"]
+
+    # 過去データは過去の財務データ（pl_list・bs_list・returns_list）が変わったときだけ再計算。
+    # 下流のノードは history_node を入力に持つため、これらのデータの変更も反映される
+    history_node = graph.compute(
+        "history", lambda history_key: build_history_frames(pl_list, bs_list),
+        history_key=session_store["history_key"]
+    )
+    history = history_node.value
+    nopat_list = history["nopat_list"]
+    nwc_list = history["nwc_list"]
+    df_combined = history["df_combined"]
 
     # ---- タブ構成 ----  
     tab_fin, tab_forecast, tab_dcf = st.tabs(["📊 過去財務分析","📈 予測財務諸表", "💰 DCF分析"])
 
-    with tab_fin:
+    with tab_fin, stage("dashboard.tab_fin"):
         st.header("📊 過去の財務指標と推移")
 
         # 個別財務諸表の表示（転置）
@@ -161,7 +206,7 @@ if selected_ticker:
         )
         st.dataframe(df_combined[["nwc_days", "ppe_days", "intangible_days"]].T)
 
-    with tab_forecast:
+    with tab_forecast, stage("dashboard.tab_forecast"):
         st.header("📈 財務諸表予測（シナリオ別）")
 
         base_growth = average_growth(pl_list, "revenue") 
@@ -216,18 +261,23 @@ if selected_ticker:
                 else:
                     cleaned_growth_rates = [r for r in growth_rate_list if r is not None][:10]
 
-                    extended_pl_list = forecast_pl_from_growth(pl_list, cleaned_growth_rates)
-                    extended_bs_list = forecast_bs_from_pl(
-                        extended_pl_list, pl_list, bs_list, returns_list,
-                        ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef
-                    )
-                    extended_nopat_list = compute_nopat_from_pl(extended_pl_list)
-                    extended_nwc_list = compute_nwc_from_bs(extended_bs_list)
-                    extended_cf_list = forecast_cf_from_pl_bs_nopat_nwc(
-                        extended_pl_list, extended_bs_list, extended_nopat_list, extended_nwc_list
+                    # このシナリオの入力が変わったときだけ再予測
+                    forecast_node = graph.compute(
+                        f"forecast_{idx}",
+                        # 表示に使うPL・BS・CFだけを列指向にしてセッションに保持する
+                        lambda history, growth_rates, ppe_coef, intangible_coef: compact_scenario(forecast_scenario(
+                            pl_list, bs_list, returns_list, growth_rates,
+                            ppe_growth_coef=ppe_coef, intangible_growth_coef=intangible_coef
+                        )),
+                        history=history_node, growth_rates=cleaned_growth_rates,
+                        ppe_coef=ppe_growth_coef, intangible_coef=intangible_growth_coef
                     )
+                    extended_pl_list = forecast_node.value["pl_list"]
+                    extended_bs_list = forecast_node.value["bs_list"]
+                    extended_cf_list = forecast_node.value["cf_list"]
 
-                    st.session_state[f"cf_list_{idx}"] = extended_cf_list
+                    # DCFタブへは予測期間のFCFのベクトルだけを渡す（予測結果そのものは計算グラフが保持する）
+                    session_store.put(f"fcf_{idx}", extract_fcf_array(extended_cf_list, start=len(pl_list)), pin=True)
 
                     st.subheader("📄 予測PL（損益計算書）")
                     st.dataframe(to_dataframe(extended_pl_list).round(0).T)
@@ -302,9 +352,21 @@ if selected_ticker:
 
                         """)
 
-    with tab_dcf:
+    with tab_dcf, stage("dashboard.tab_dcf"), capture("dashboard.tab_dcf"):
         st.header("💰 DCF分析結果（シナリオ比較）")
 
+        # 資本構成・平均実効税率の要約もティッカーごとに1回だけ算出し、資本コストの計算で使い回す。
+        # 算出できない銘柄（実効税率が全て負の赤字企業など）はDCF分析のみ表示しない
+        try:
+            capital_node = graph.compute(
+                "capital_structure",
+                lambda history: CapitalStructure.from_history(pl_list, bs_list, history["nopat_list"]),
+                history=history_node
+            )
+        except ValueError as e:
+            st.error(f"資本コストを算出できないため、DCF分析を表示できません: {e}")
+            capital_node = None
+
         cols = st.columns(3)
 
         # 結果を格納するリスト
@@ -314,13 +376,16 @@ if selected_ticker:
             with col:
                 st.markdown(f"### シナリオ {idx + 1}")
 
-                cf_key = f"cf_list_{idx}"
-                if cf_key not in st.session_state:
+                fcf_key = f"fcf_{idx}"
+                if fcf_key not in session_store:
                     st.warning(f"シナリオ {idx+1} の予測が未入力です。")
                     summary_results.append(None)
                     continue
+                if capital_node is None:
+                    summary_results.append(None)
+                    continue
 
-                cf_list = st.session_state[cf_key]
+                fcf = session_store[fcf_key]
 
                 # 入力
                 rfr = st.number_input(
@@ -333,25 +398,16 @@ if selected_ticker:
                     "永久成長率（%）", value=2.0, step=0.1, key=f"growth_{idx}"
                 ) / 100
 
-                market_key = (rfr, mrp)
-                if "market_data_cache" not in st.session_state:
-                    st.session_state.market_data_cache = {}
-                if market_key in st.session_state.market_data_cache:
-                    market_data = st.session_state.market_data_cache[market_key]
-                else:
+                # 資本コストは過去の財務データ・プロフィール・無リスク利子率・市場リスクプレミアムが変わったときだけ再計算
+                def compute_costs(capital, market_data_key, rfr, mrp):
                     market_data = reconstruct_market_data(market_data_raw, risk_free_rate=rfr, market_risk_premium=mrp)
-                    st.session_state.market_data_cache[market_key] = market_data
+                    return market_data, compute_cost_of_capital(
+                        pl_list, bs_list, nopat_list, market_data, capital_structure=capital
+                    )
 
-                cost_key = (st.session_state.ticker_cache, rfr, mrp)
-                if "cost_cache" not in st.session_state:
-                    st.session_state.cost_cache = {}
-                if cost_key in st.session_state.cost_cache:
-                    ce, cd, wacc = st.session_state.cost_cache[cost_key]
-                else:
-                    ce = compute_cost_of_equity(market_data)
-                    cd = compute_cost_of_debt_from_pl_bs(pl_list, bs_list)
-                    wacc = compute_wacc(ce, cd, bs_list, nopat_list)
-                    st.session_state.cost_cache[cost_key] = (ce, cd, wacc)
+                cost_node = graph.compute(f"cost_{idx}", compute_costs, capital=capital_node,
+                                          market_data_key=session_store["market_data_key"], rfr=rfr, mrp=mrp)
+                market_data, (ce, cd, wacc) = cost_node.value
 
                 input_wacc = st.number_input(
                     "加重平均資本コスト（WACC, %）", 
@@ -361,10 +417,17 @@ if selected_ticker:
                 ) / 100
 
                 if abs(input_wacc - wacc) > 1e-6:
-                    cd = infer_cost_of_debt_from_wacc(input_wacc, ce, bs_list, nopat_list)
+                    cd = float(capital_node.value.infer_cost_of_debt(input_wacc, ce))
 
-                enterprise_value = compute_dcf_valuation(cf_list, input_wacc, growth)
-                result = compute_fair_share_price_from_bs(enterprise_value, bs_list, market_data)
+                def compute_valuation(fcf, costs, wacc, growth):
+                    enterprise_value = float(compute_dcf_valuation_grid(fcf, wacc, growth))
+                    return compute_fair_share_price_from_bs(enterprise_value, bs_list, costs[0])
+
+                result = graph.compute(
+                    f"dcf_{idx}", compute_valuation,
+                    fcf=fcf,
+                    costs=cost_node, wacc=input_wacc, growth=growth
+                ).value
 
                 # 表示用に格納
                 summary_results.append({
@@ -374,7 +437,7 @@ if selected_ticker:
                     "current_market_price": result["current_market_price"],
                     "wacc": input_wacc,
                     "growth": growth,
-                    "cf_list": cf_list
+                    "fcf": fcf
                 })
 
                 # メトリクス表示
@@ -396,13 +459,61 @@ if selected_ticker:
         # 有効なシナリオのみ集計
         valid_results = [res for res in summary_results if res is not None]
 
-        # 棒グラフで比較
-        st.subheader("📊 シナリオ別：企業価値 & 理論株価 比較")
-
-        plot_dcf_comparison_charts(valid_results)
-
-        # 感応度分析
-        st.subheader("📈 シナリオ別 感応度分析（WACC × 永久成長率）")
-
-        plot_dcf_sensitivity_heatmaps(valid_results)
-
+        # 比較グラフ・感応度分析のヒートマップ（計5枚）はワーカープロセスでまとめて並列に描画し、
+        # 描画が終わったものから表示する
+        with render_batch():
+            # 棒グラフで比較
+            st.subheader("📊 シナリオ別：企業価値 & 理論株価 比較")
+
+            plot_dcf_comparison_charts(valid_results)
+
+            # 感応度分析
+            st.subheader("📈 シナリオ別 感応度分析（WACC × 永久成長率）")
+
+            plot_dcf_sensitivity_heatmaps(valid_results)
+
+
+# ---- 処理時間の計測パネル（DCF_INSTRUMENT=1 で有効） ----
+if instrumentation.is_enabled():
+    instrumentation.record("dashboard.rerun", time.perf_counter() - rerun_start)
+
+    with st.expander("⏱ 処理時間（計測）", expanded=False):
+        metrics = instrumentation.snapshot()
+        if metrics["stages"]:
+            df_metrics = pd.DataFrame(metrics["stages"]).T.sort_values("total_sec", ascending=False)
+            st.dataframe(df_metrics.style.format({
+                "total_sec": "{:.4f}", "avg_sec": "{:.4f}", "max_sec": "{:.4f}", "bytes": "{:,.0f}"
+            }))
+
+        for profile in reversed(metrics["profiles"][-3:]):
+            st.markdown(
+                f"**{profile['label']}**: peak memory {profile['memory_peak_bytes'] / 1e6:.1f} MB"
+            )
+            st.code(profile["cprofile"], language="text")
+
+        # セッションごと・プロセス全体のメモリ使用量（DCF_SESSION_MAX_BYTES / DCF_SESSIONS_MAX_BYTES が上限）
+        process_memory = session_registry.get_stats(top=0)
+        session_memory = session_store.get_stats()
+        st.markdown(
+            f"**メモリ（概算）**: このセッション {session_memory['bytes'] / 1e6:.1f} / "
+            f"{session_memory['max_bytes'] / 1e6:.0f} MB（共有 {session_memory['shared_bytes'] / 1e6:.1f} MB）、"
+            f"全 {process_memory['sessions']} セッション {process_memory['bytes'] / 1e6:.1f} / "
+            f"{process_memory['max_bytes'] / 1e6:.0f} MB"
+        )
+        st.json({"session": session_memory, "process": process_memory}, expanded=False)
+
+        # ローカル検索インデックス（再構築に失敗している間はリモート検索にフォールバックする）
+        index_stats = get_index_stats()
+        if index_stats["last_error_time"] and index_stats["last_error_time"] > (index_stats["last_refresh_time"] or 0):
+            st.warning(f"検索インデックスの再構築に失敗しました: {index_stats['last_error']}")
+        st.json({"symbol_index": index_stats}, expanded=False)
+
+        col_download, col_reset = st.columns(2)
+        with col_download:
+            st.download_button(
+                "JSONでダウンロード", instrumentation.export_json(),
+                file_name="dcf_metrics.json", mime="application/json"
+            )
+        with col_reset:
+            if st.button("計測値をリセット"):
+                instrumentation.reset()
@@ -0,0 +1,306 @@
+"""
+複数銘柄のDCF評価をヘッドレスで一括実行するバッチ処理
+
+実行例:
+    FMP_API_KEY=... python -m src.batch tickers.txt -o results.csv --workers 8 --fetch-concurrency 4
+
+- 銘柄ごとの処理（取得 → 再構成 → 予測 → WACC → DCF）はプロセスプールで並列に実行する
+- 同時にFMPへ問い合わせるワーカー数は --fetch-concurrency で制限する
+- 結果は完了した順に出力ファイルへ追記する（.csv または .parquet）
+- 出力ファイルとエラーファイルに記録済みの銘柄は再実行時にスキップする（中断からの再開）
+"""
+import argparse
+import csv
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+RESULT_FIELDS = [
+    "ticker", "enterprise_value", "net_debt", "equity_value", "shares_outstanding",
+    "fair_share_price", "current_market_price", "upside", "wacc", "cost_of_equity",
+    "cost_of_debt", "beta", "perpetual_growth_rate", "base_revenue_growth", "elapsed_sec",
+]
+ERROR_FIELDS = ["ticker", "stage", "error_type", "error"]
+
+# ワーカープロセス内でFMPへの同時アクセス数を制限するセマフォ
+_fetch_semaphore = None
+
+
+def _init_worker(fetch_semaphore):
+    global _fetch_semaphore
+    _fetch_semaphore = fetch_semaphore
+    # 画面操作（interactive）のリクエストを優先させる
+    from src.data_fetchers import configure_rate_limit
+    configure_rate_limit(lane="batch")
+
+
+def value_ticker(ticker, assumptions, profile=None):
+    """
+    1銘柄分のパイプラインを実行する（ワーカープロセスで実行）。
+    profile（事前に一括取得したプロフィール）を渡した場合は、財務諸表のみ取得する。
+    例外は送出せず、("ok", row) または ("error", row) を返す。
+    """
+    # ワーカーでのみ必要なモジュールは遅延インポート
+    from src.data_fetchers import fetch_company_bundle
+    from src.pipeline import value_company
+
+    start = time.perf_counter()
+    stage = "fetch"
+    try:
+        if _fetch_semaphore is not None:
+            with _fetch_semaphore:
+                bundle = fetch_company_bundle(ticker, profile=profile)
+        else:
+            bundle = fetch_company_bundle(ticker, profile=profile)
+        bundle.raise_for_errors()
+
+        stage = "valuation"
+        result = value_company(
+            bundle.income, bundle.balance, bundle.cash_flow, bundle.profile, **assumptions
+        )
+    except Exception as e:
+        return "error", {
+            "ticker": ticker,
+            "stage": stage,
+            "error_type": type(e).__name__,
+            "error": "".join(traceback.format_exception_only(type(e), e)).strip(),
+        }
+
+    price = result.get("current_market_price")
+    row = {key: result.get(key) for key in RESULT_FIELDS if key in result}
+    row["ticker"] = ticker
+    row["upside"] = result["fair_share_price"] / price - 1 if price else None
+    row["elapsed_sec"] = time.perf_counter() - start
+    return "ok", row
+
+
+class CsvWriter:
+    """行ごとに追記・フラッシュするCSVライター"""
+
+    def __init__(self, path, fieldnames):
+        self.path = Path(path)
+        is_new = not self.path.exists() or self.path.stat().st_size == 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.DictWriter(self._file, fieldnames=fieldnames, extrasaction="ignore")
+        if is_new:
+            self._writer.writeheader()
+            self._file.flush()
+
+    def write(self, row):
+        self._writer.writerow(row)
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetWriter:
+    """
+    一定行数ごとにパートファイルを書き出すParquetライター（要 pyarrow）。
+    出力先はディレクトリで、pandas.read_parquet でまとめて読み込める。
+    """
+
+    def __init__(self, path, fieldnames, rows_per_part=100):
+        import pandas as pd  # noqa: F401  pyarrow の有無は書き込み時に検出
+
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.fieldnames = fieldnames
+        self.rows_per_part = rows_per_part
+        self._rows = []
+        self._part = len(list(self.path.glob("part-*.parquet")))
+
+    def write(self, row):
+        self._rows.append(row)
+        if len(self._rows) >= self.rows_per_part:
+            self.flush()
+
+    def flush(self):
+        if not self._rows:
+            return
+        import pandas as pd
+
+        df = pd.DataFrame(self._rows, columns=self.fieldnames)
+        tmp_path = self.path / f".part-{self._part:05d}.parquet.tmp"
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, self.path / f"part-{self._part:05d}.parquet")
+        self._part += 1
+        self._rows = []
+
+    def close(self):
+        self.flush()
+
+
+def open_writer(path, fieldnames):
+    if str(path).endswith(".parquet"):
+        return ParquetWriter(path, fieldnames)
+    return CsvWriter(path, fieldnames)
+
+
+def read_done_tickers(path):
+    """出力済み（成功・失敗を問わず）の銘柄を返す"""
+    path = Path(path)
+    if not path.exists():
+        return set()
+    if path.is_dir():
+        import pandas as pd
+
+        parts = sorted(path.glob("part-*.parquet"))
+        if not parts:
+            return set()
+        return set(pd.concat([pd.read_parquet(p, columns=["ticker"]) for p in parts])["ticker"])
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["ticker"] for row in csv.DictReader(f) if row.get("ticker")}
+
+
+def read_tickers(path):
+    source = sys.stdin if path == "-" else open(path, encoding="utf-8")
+    with source:
+        tickers = []
+        for line in source:
+            ticker = line.split("#", 1)[0].strip().split(",")[0].strip().upper()
+            if ticker:
+                tickers.append(ticker)
+    # 重複を除き、入力順を保持
+    return list(dict.fromkeys(tickers))
+
+
+def prefetch_profiles(tickers, progress=True):
+    """
+    全銘柄のプロフィールをまとめて取得し、{ticker: プロフィール} を返す。
+    プロフィールのキャッシュの有効期限（15分）はバッチ全体の実行時間より短い場合があるため、
+    ワーカーにはキャッシュ経由ではなく銘柄ごとに直接渡す。
+    失敗した場合（・取得できなかった銘柄）もバッチ処理は続行し、ワーカーが銘柄ごとに取得する。
+    """
+    from src.data_fetchers import configure_rate_limit, fetch_profiles_bulk
+
+    configure_rate_limit(lane="batch")
+    try:
+        profiles = fetch_profiles_bulk(tickers)
+    except Exception as e:
+        if progress:
+            print(f"プロフィールの一括取得に失敗しました（銘柄ごとに取得します）: {type(e).__name__}", file=sys.stderr)
+        return {}
+    if progress:
+        missing = len(tickers) - len(profiles)
+        print(f"プロフィールを一括取得しました: {len(profiles)}/{len(tickers)} 銘柄"
+              + (f"（残りの {missing} 銘柄は銘柄ごとに取得します）" if missing else ""), file=sys.stderr)
+    return profiles
+
+
+def run_batch(tickers, output, errors_output=None, workers=None, fetch_concurrency=4,
+              retry_errors=False, assumptions=None, progress=True, bulk_profiles=True):
+    """
+    銘柄リストに対してDCF評価を並列実行し、結果を逐次出力する。
+
+    Parameters:
+        tickers (List[str]): 銘柄リスト
+        output (str or Path): 結果の出力先（.csv または .parquet）
+        errors_output (str or Path or None): エラーの出力先CSV（既定は <output>.errors.csv）
+        workers (int or None): ワーカープロセス数（既定はCPU数）
+        fetch_concurrency (int): FMPへ同時にアクセスするワーカー数の上限
+        retry_errors (bool): True の場合、前回失敗した銘柄も再実行する
+        assumptions (dict or None): value_company に渡す前提条件
+        progress (bool): 進捗を標準エラーに出力するか
+        bulk_profiles (bool): 事前にプロフィールを複数銘柄まとめて取得するか
+
+    Returns:
+        dict: {"ok": int, "error": int, "skipped": int}
+    """
+    output = Path(output)
+    errors_output = Path(errors_output) if errors_output else output.with_name(output.name + ".errors.csv")
+    assumptions = assumptions or {}
+
+    done = read_done_tickers(output)
+    if not retry_errors:
+        done |= read_done_tickers(errors_output)
+    pending = [t for t in tickers if t not in done]
+    counts = {"ok": 0, "error": 0, "skipped": len(tickers) - len(pending)}
+
+    if not pending:
+        return counts
+    profiles = prefetch_profiles(pending, progress=progress) if bulk_profiles else {}
+
+    result_writer = open_writer(output, RESULT_FIELDS)
+    error_writer = CsvWriter(errors_output, ERROR_FIELDS)
+    ctx = multiprocessing.get_context("spawn")
+    fetch_semaphore = ctx.BoundedSemaphore(max(1, fetch_concurrency))
+
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                 initializer=_init_worker, initargs=(fetch_semaphore,)) as executor:
+            futures = {executor.submit(value_ticker, t, assumptions, profiles.get(t)): t for t in pending}
+            for i, future in enumerate(as_completed(futures), start=1):
+                ticker = futures[future]
+                try:
+                    status, row = future.result()
+                except Exception as e:  # ワーカープロセス自体の異常終了など
+                    status, row = "error", {
+                        "ticker": ticker, "stage": "worker",
+                        "error_type": type(e).__name__, "error": str(e),
+                    }
+
+                if status == "ok":
+                    result_writer.write(row)
+                else:
+                    error_writer.write(row)
+                counts[status] += 1
+
+                if progress:
+                    elapsed = time.perf_counter() - start
+                    print(f"[{i}/{len(pending)}] {ticker}: {status} "
+                          f"({i / elapsed:.1f} tickers/s)", file=sys.stderr)
+    finally:
+        result_writer.close()
+        error_writer.close()
+
+    return counts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="複数銘柄のDCF評価をバッチ実行する")
+    parser.add_argument("tickers", help="銘柄リストのファイル（1行1銘柄、'-' で標準入力）")
+    parser.add_argument("-o", "--output", default="dcf_results.csv", help="出力先（.csv または .parquet）")
+    parser.add_argument("--errors", default=None, help="エラーの出力先CSV（既定: <output>.errors.csv）")
+    parser.add_argument("--workers", type=int, default=None, help="ワーカープロセス数（既定: CPU数）")
+    parser.add_argument("--fetch-concurrency", type=int, default=4, help="FMPへの同時アクセス数の上限")
+    parser.add_argument("--retry-errors", action="store_true", help="前回失敗した銘柄も再実行する")
+    parser.add_argument("--risk-free-rate", type=float, default=None, help="無リスク利子率（小数）")
+    parser.add_argument("--market-risk-premium", type=float, default=None, help="市場リスクプレミアム（小数）")
+    parser.add_argument("--perpetual-growth", type=float, default=None, help="永久成長率（小数）")
+    parser.add_argument("--base-url", default=None,
+                        help="FMP APIのベースURL（ローカルのスタブサーバーを使う場合など、既定: 環境変数 FMP_BASE_URL）")
+    parser.add_argument("--no-bulk-profiles", action="store_true",
+                        help="プロフィールを事前にまとめて取得せず、銘柄ごとに取得する")
+    parser.add_argument("--quiet", action="store_true", help="進捗を表示しない")
+    args = parser.parse_args(argv)
+
+    # ワーカープロセス（spawn）は環境変数を引き継ぐため、環境変数経由で設定する
+    if args.base_url:
+        os.environ["FMP_BASE_URL"] = args.base_url
+
+    assumptions = {
+        key: value for key, value in {
+            "risk_free_rate": args.risk_free_rate,
+            "market_risk_premium": args.market_risk_premium,
+            "perpetual_growth_rate": args.perpetual_growth,
+        }.items() if value is not None
+    }
+
+    counts = run_batch(
+        read_tickers(args.tickers), args.output, errors_output=args.errors,
+        workers=args.workers, fetch_concurrency=args.fetch_concurrency,
+        retry_errors=args.retry_errors, assumptions=assumptions, progress=not args.quiet,
+        bulk_profiles=not args.no_bulk_profiles,
+    )
+    print(f"ok={counts['ok']} error={counts['error']} skipped={counts['skipped']}", file=sys.stderr)
+    return 0 if counts["error"] == 0 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,431 @@
+import numpy as np
+from datetime import datetime
+
+from src.utils import (average_ratio, average_value, average_growth,
+                       average_dividend_ratio, average_buyback_ratio)
+from src.statements import as_records
+from src.instrumentation import timed
+
+# 予測PL・BS・CFの項目（financial_forcasting の出力 dict と同じ順序）
+PL_FORECAST_FIELDS = [
+    "revenue", "cost_of_revenue", "sg_and_a", "depreciation_amortization", "operating_income",
+    "interest_income", "interest_expense", "other_non_operating",
+    "income_before_tax", "income_tax", "net_income",
+]
+BS_FORECAST_FIELDS = [
+    "cash_and_equivalents", "short_term_investments", "net_receivables", "inventory",
+    "other_current_assets", "long_term_investments", "ppe", "intangible_assets",
+    "other_noncurrent_assets", "total_assets", "short_term_debt", "accounts_payable",
+    "other_current_liabilities", "deferred_revenue", "long_term_debt",
+    "other_noncurrent_liabilities", "total_liabilities", "common_stock", "retained_earnings",
+    "aoci", "capital_surplus", "total_equity",
+]
+CF_FIELDS = ["nopat", "depreciation", "delta_nwc", "capex", "fcf"]
+
+# BSのうち最新年度の値で一定とする項目
+_BS_CONSTANT_FIELDS = [
+    "short_term_investments", "other_current_assets", "long_term_investments",
+    "other_noncurrent_assets", "short_term_debt", "deferred_revenue", "long_term_debt",
+    "other_noncurrent_liabilities", "common_stock",
+]
+
+
+def prepare_pl_drivers(pl_list):
+    """
+    PL予測に用いる直近5年の平均比率・平均値と初期値を算出する（forecast_pl_from_growth と同じ定義）。
+    """
+    pl_list = as_records(pl_list)
+    recent_pl = pl_list[-5:]
+    base = pl_list[-1]
+
+    return {
+        "date": base["date"],
+        "revenue": base["revenue"],
+        "depreciation": base.get("depreciation_amortization", 0),
+        "cost_ratio": average_ratio(recent_pl, "cost_of_revenue", "revenue"),
+        "sga_ratio": average_ratio(recent_pl, "sg_and_a", "revenue"),
+        "depreciation_growth": average_growth(recent_pl, "depreciation_amortization"),
+        "interest_income": average_value(recent_pl, "interest_income"),
+        "interest_expense": average_value(recent_pl, "interest_expense"),
+        "other_non_operating": average_value(recent_pl, "other_non_operating"),
+        "tax_rate": average_ratio(recent_pl, "income_tax", "income_before_tax"),
+        "revenue_growth": average_growth(pl_list, "revenue"),
+    }
+
+
+def prepare_bs_drivers(pl_list, bs_list, returns_list):
+    """
+    BS予測に用いる売上高比率・還元率・固定資産の平均成長率と最新BSを算出する（forecast_bs_from_pl と同じ定義）。
+    """
+    pl_list = as_records(pl_list)
+    bs_list = as_records(bs_list)
+    returns_list = as_records(returns_list)
+    recent_pl = pl_list[-5:]
+    recent_bs = bs_list[-5:]
+    latest_bs = recent_bs[-1]
+
+    return {
+        "date": latest_bs["date"],
+        "latest_bs": latest_bs,
+        "net_receivables_ratio": average_ratio(recent_bs, "net_receivables", "revenue", recent_pl),
+        "inventory_ratio": average_ratio(recent_bs, "inventory", "revenue", recent_pl),
+        "accounts_payable_ratio": average_ratio(recent_bs, "accounts_payable", "revenue", recent_pl),
+        "other_current_liabilities_ratio": average_ratio(
+            recent_bs, "other_current_liabilities", "revenue", recent_pl),
+        "avg_ppe_growth": average_growth(bs_list, "ppe"),
+        "avg_intangible_growth": average_growth(recent_bs, "intangible_assets"),
+        "avg_revenue_growth": average_growth(pl_list, "revenue"),
+        "dividend_ratio": average_dividend_ratio(recent_pl, returns_list),
+        "buyback_ratio": average_buyback_ratio(recent_pl, returns_list),
+    }
+
+
+def stack_drivers(drivers_list):
+    """
+    複数企業の prepare_pl_drivers / prepare_bs_drivers の戻り値を、企業を行とする (企業数, 1) の配列にまとめる。
+
+    forecast_pl_batch / forecast_bs_batch に渡すと、各行がその企業の前提で予測される
+    （成長率マトリクスの行数は企業数と一致させる）。日付は企業ごとのリストになる。
+    """
+    def stack(values):
+        return np.array([np.nan if v is None else v for v in values], dtype=np.float64).reshape(-1, 1)
+
+    first = drivers_list[0]
+    stacked = {}
+    for key in first:
+        values = [d[key] for d in drivers_list]
+        if key == "date":
+            stacked[key] = values
+        elif key == "latest_bs":
+            stacked[key] = {
+                name: stack([bs.get(name) for bs in values])
+                for name in values[0] if name != "date"
+            }
+            # retained_earnings の欠損は forecast_bs_batch と同じく0として扱う
+            stacked[key]["retained_earnings"] = stack([bs.get("retained_earnings") or 0.0 for bs in values])
+        else:
+            stacked[key] = stack(values)
+    return stacked
+
+
+def forecast_dates(base_date, n_years):
+    """基準日から1年ずつ進めた予測年度の日付（"YYYY-MM-DD"）を返す"""
+    base = datetime.strptime(base_date, "%Y-%m-%d")
+    return [base.replace(year=base.year + i).strftime("%Y-%m-%d") for i in range(1, n_years + 1)]
+
+
+def _column(value, n_rows):
+    """スカラー または shape (シナリオ数,) の値を (シナリオ数, 1) の列にする"""
+    return np.broadcast_to(np.asarray(value, dtype=np.float64).reshape(-1, 1), (n_rows, 1))
+
+
+def _chain_product(initial, factors):
+    """initial * factors[:, 0] * factors[:, 1] * ... を先頭から順に累積する"""
+    stacked = np.concatenate([initial, factors], axis=1)
+    return np.cumprod(stacked, axis=1)[:, 1:]
+
+
+def _chain_sum(initial, increments):
+    """initial + increments[:, 0] + increments[:, 1] + ... を先頭から順に累積する"""
+    stacked = np.concatenate([initial, increments], axis=1)
+    return np.cumsum(stacked, axis=1)[:, 1:]
+
+
+def forecast_pl_batch(pl_drivers, growth_matrix, cost_ratio=None, sga_ratio=None):
+    """
+    シナリオ × 年の売上高成長率マトリクスから、予測PLを一括で計算する。
+
+    Parameters:
+        pl_drivers (dict): prepare_pl_drivers の戻り値
+        growth_matrix (np.ndarray): 売上高成長率（shape: (シナリオ数, 年数)）
+        cost_ratio, sga_ratio (float or np.ndarray or None): シナリオごとの売上原価率・販管費率。
+            None の場合は過去平均を使う
+
+    Returns:
+        dict: {項目名: np.ndarray (シナリオ数, 年数)}（PL_FORECAST_FIELDS）
+    """
+    growth_matrix = np.atleast_2d(np.asarray(growth_matrix, dtype=np.float64))
+    n_scenarios, n_years = growth_matrix.shape
+    shape = (n_scenarios, n_years)
+    d = pl_drivers
+
+    cost_ratio = d["cost_ratio"] if cost_ratio is None else cost_ratio
+    sga_ratio = d["sga_ratio"] if sga_ratio is None else sga_ratio
+
+    revenue = _chain_product(_column(d["revenue"], n_scenarios), 1 + growth_matrix)
+    depreciation = _chain_product(
+        _column(d["depreciation"], n_scenarios),
+        np.full(shape, 1 + d["depreciation_growth"])
+    )
+
+    cost_of_revenue = revenue * _column(cost_ratio, n_scenarios)
+    sg_and_a = revenue * _column(sga_ratio, n_scenarios)
+    operating_income = revenue - cost_of_revenue - sg_and_a - depreciation
+    income_before_tax = operating_income + d["interest_income"] - d["interest_expense"] + d["other_non_operating"]
+    income_tax = income_before_tax * d["tax_rate"]
+    net_income = income_before_tax - income_tax
+
+    return {
+        "revenue": revenue,
+        "cost_of_revenue": cost_of_revenue,
+        "sg_and_a": sg_and_a,
+        "depreciation_amortization": depreciation,
+        "operating_income": operating_income,
+        "interest_income": np.broadcast_to(np.float64(d["interest_income"]), shape),
+        "interest_expense": np.broadcast_to(np.float64(d["interest_expense"]), shape),
+        "other_non_operating": np.broadcast_to(np.float64(d["other_non_operating"]), shape),
+        "income_before_tax": income_before_tax,
+        "income_tax": income_tax,
+        "net_income": net_income,
+    }
+
+
+def forecast_bs_batch(bs_drivers, revenue, net_income, prev_revenue,
+                      ppe_growth_coef=None, intangible_growth_coef=None):
+    """
+    予測PLの売上高・当期純利益から、予測BSを一括で計算する。
+
+    現金は資産・負債・純資産の差額（プラグ）として、利益剰余金は前年残高に内部留保を
+    加える漸化式として、いずれも配列演算で求める。
+
+    Parameters:
+        bs_drivers (dict): prepare_bs_drivers の戻り値
+        revenue, net_income (np.ndarray): 予測年度の売上高・当期純利益（shape: (シナリオ数, 年数)）
+        prev_revenue (float or np.ndarray): 予測初年度の前年売上高（スカラー または shape: (シナリオ数,)）
+        ppe_growth_coef, intangible_growth_coef (float or np.ndarray or None):
+            シナリオごとの固定資産の弾力性。None の場合は過去の平均成長率の比
+
+    Returns:
+        dict: {項目名: np.ndarray (シナリオ数, 年数)}（BS_FORECAST_FIELDS）
+    """
+    revenue = np.atleast_2d(np.asarray(revenue, dtype=np.float64))
+    net_income = np.atleast_2d(np.asarray(net_income, dtype=np.float64))
+    n_scenarios, n_years = revenue.shape
+    shape = (n_scenarios, n_years)
+    d = bs_drivers
+    latest_bs = d["latest_bs"]
+
+    if ppe_growth_coef is None:
+        ppe_growth_coef = d["avg_ppe_growth"] / d["avg_revenue_growth"]
+    if intangible_growth_coef is None:
+        intangible_growth_coef = d["avg_intangible_growth"] / d["avg_revenue_growth"]
+
+    constants = {name: np.broadcast_to(np.float64(latest_bs[name]), shape) for name in _BS_CONSTANT_FIELDS}
+    aoci = np.zeros(shape)
+    capital_surplus = np.broadcast_to(np.float64(latest_bs.get("capital_surplus", 0.0)), shape)
+
+    # 売上高成長率（前年売上高が0の年は0）
+    prev = np.concatenate([_column(prev_revenue, n_scenarios), revenue[:, :-1]], axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        sales_growth_rate = np.where(prev != 0, (revenue - prev) / prev, 0.0)
+
+    # 資産・負債の売上高比例項目
+    net_receivables = revenue * d["net_receivables_ratio"]
+    inventory = revenue * d["inventory_ratio"]
+    accounts_payable = revenue * d["accounts_payable_ratio"]
+    other_current_liabilities = revenue * d["other_current_liabilities_ratio"]
+
+    # 固定資産：前年残高 × (1 + 係数 × 売上高成長率) の累積
+    ppe = _chain_product(
+        _column(latest_bs["ppe"], n_scenarios),
+        1 + _column(ppe_growth_coef, n_scenarios) * sales_growth_rate
+    )
+    intangible_assets = _chain_product(
+        _column(latest_bs["intangible_assets"], n_scenarios),
+        1 + _column(intangible_growth_coef, n_scenarios) * sales_growth_rate
+    )
+
+    # 利益剰余金：前年残高 + 当期純利益 × (1 - 還元率) の累積
+    distributed_ratio = np.minimum(d["dividend_ratio"] + d["buyback_ratio"], 1.0)
+    retained_earnings_base = latest_bs.get("retained_earnings")
+    retained_earnings = _chain_sum(
+        _column(0.0 if retained_earnings_base is None else retained_earnings_base, n_scenarios),
+        net_income * (1 - distributed_ratio)
+    )
+
+    non_cash_assets = (
+        constants["short_term_investments"] + net_receivables + inventory +
+        constants["other_current_assets"] + ppe + intangible_assets +
+        constants["long_term_investments"] + constants["other_noncurrent_assets"]
+    )
+    total_liabilities = (
+        constants["short_term_debt"] + accounts_payable + other_current_liabilities +
+        constants["deferred_revenue"] + constants["long_term_debt"] + constants["other_noncurrent_liabilities"]
+    )
+    total_equity = constants["common_stock"] + capital_surplus + retained_earnings + aoci
+
+    # 現金：資産と負債・純資産の差額
+    cash = total_liabilities + total_equity - non_cash_assets
+    total_assets = non_cash_assets + cash
+
+    return {
+        **constants,
+        "cash_and_equivalents": cash,
+        "net_receivables": net_receivables,
+        "inventory": inventory,
+        "ppe": ppe,
+        "intangible_assets": intangible_assets,
+        "total_assets": total_assets,
+        "accounts_payable": accounts_payable,
+        "other_current_liabilities": other_current_liabilities,
+        "total_liabilities": total_liabilities,
+        "retained_earnings": retained_earnings,
+        "aoci": aoci,
+        "capital_surplus": capital_surplus,
+        "total_equity": total_equity,
+    }
+
+
+def compute_nopat_batch(pl):
+    """予測PLの配列から NOPAT を計算する（compute_nopat_from_pl と同じ式）"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        effective_tax_rate = pl["income_tax"] / pl["income_before_tax"]
+    tax_on_operating_income = (
+        pl["income_tax"]
+        - effective_tax_rate * pl["interest_income"]
+        + effective_tax_rate * pl["interest_expense"]
+        - effective_tax_rate * pl["other_non_operating"]
+    )
+    return {
+        "effective_tax_rate": effective_tax_rate,
+        "tax_on_operating_income": tax_on_operating_income,
+        "nopat": pl["operating_income"] - tax_on_operating_income,
+    }
+
+
+def compute_nwc_batch(bs):
+    """予測BSの配列から正味運転資本を計算する（compute_nwc_from_bs と同じ式）"""
+    return (
+        bs["net_receivables"] +
+        bs["inventory"] +
+        bs["other_current_assets"] -
+        bs["accounts_payable"] -
+        bs["deferred_revenue"] -
+        bs["other_current_liabilities"]
+    )
+
+
+def forecast_cf_batch(nopat, depreciation, nwc, ppe, intangible_assets,
+                      prev_nwc=None, prev_ppe=None, prev_intangible_assets=None):
+    """
+    NOPAT・減価償却費・NWC・固定資産の配列からFCFを一括で計算する。
+
+    prev_* を指定した場合は、先頭年度の増減をその値との差分で計算する。
+    指定しない場合は forecast_cf_from_pl_bs_nopat_nwc と同様に先頭年度の増減を0とする。
+
+    Returns:
+        dict: {項目名: np.ndarray (シナリオ数, 年数)}（CF_FIELDS）
+    """
+    arrays = [np.atleast_2d(np.asarray(x, dtype=np.float64))
+              for x in (nopat, depreciation, nwc, ppe, intangible_assets)]
+    nopat, depreciation, nwc, ppe, intangible_assets = np.broadcast_arrays(*arrays)
+    n_scenarios = nopat.shape[0]
+
+    def delta(values, prev):
+        if prev is None:
+            head = np.zeros((n_scenarios, min(1, values.shape[1])))
+            return np.concatenate([head, values[:, 1:] - values[:, :-1]], axis=1)
+        prev_values = np.concatenate([_column(prev, n_scenarios), values[:, :-1]], axis=1)
+        return values - prev_values
+
+    delta_nwc = delta(nwc, prev_nwc)
+    ppe_investment = delta(ppe, prev_ppe)
+    intangible_investment = delta(intangible_assets, prev_intangible_assets)
+    capex = ppe_investment + intangible_investment
+
+    # FCF = NOPAT + 減価償却費 - ΔNWC - CapEx
+    fcf = nopat + depreciation - delta_nwc - capex
+
+    return {
+        "nopat": nopat,
+        "depreciation": depreciation,
+        "delta_nwc": delta_nwc,
+        "capex": capex,
+        "fcf": fcf,
+    }
+
+
+@timed()
+def forecast_statements_batch(pl_list, bs_list, returns_list, growth_matrix,
+                              ppe_growth_coef=None, intangible_growth_coef=None,
+                              cost_ratio=None, sga_ratio=None):
+    """
+    複数シナリオの三表（PL・BS・CF）予測を1回の配列演算で行う。
+
+    forecast_pl_from_growth → forecast_bs_from_pl → compute_nopat_from_pl →
+    compute_nwc_from_bs → forecast_cf_from_pl_bs_nopat_nwc をシナリオごとに呼んだ場合と
+    同じ値を、予測年度分だけ (シナリオ数, 年数) の配列で返す。
+
+    Parameters:
+        pl_list, bs_list, returns_list: 過去の財務データ（List[dict] または Statements）
+        growth_matrix (np.ndarray): 売上高成長率（shape: (シナリオ数, 年数)）
+        ppe_growth_coef, intangible_growth_coef (float or np.ndarray or None):
+            シナリオごとの固定資産の弾力性（shape: (シナリオ数,)）
+        cost_ratio, sga_ratio (float or np.ndarray or None): シナリオごとの売上原価率・販管費率
+
+    Returns:
+        dict: {
+            "dates": List[str],
+            "pl": {項目名: np.ndarray}, "bs": {...}, "nopat": {...},
+            "nwc": np.ndarray, "cf": {...}
+        }
+        （一定の項目は読み取り専用のブロードキャスト配列）
+    """
+    pl_list = as_records(pl_list)
+    bs_list = as_records(bs_list)
+    pl_drivers = prepare_pl_drivers(pl_list)
+    bs_drivers = prepare_bs_drivers(pl_list, bs_list, returns_list)
+
+    result = forecast_from_drivers(
+        pl_drivers, bs_drivers, growth_matrix,
+        ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef,
+        cost_ratio=cost_ratio, sga_ratio=sga_ratio
+    )
+    result["dates"] = forecast_dates(bs_drivers["date"], result["pl"]["revenue"].shape[1])
+    return result
+
+
+def forecast_from_drivers(pl_drivers, bs_drivers, growth_matrix,
+                          ppe_growth_coef=None, intangible_growth_coef=None,
+                          cost_ratio=None, sga_ratio=None):
+    """
+    算出済みの前提（prepare_*_drivers または stack_drivers の戻り値）から三表を一括で予測する。
+
+    Returns:
+        dict: {"pl": ..., "bs": ..., "nopat": ..., "nwc": ..., "cf": ...}（forecast_statements_batch から dates を除いたもの）
+    """
+    pl = forecast_pl_batch(pl_drivers, growth_matrix, cost_ratio=cost_ratio, sga_ratio=sga_ratio)
+    bs = forecast_bs_batch(
+        bs_drivers, pl["revenue"], pl["net_income"], pl_drivers["revenue"],
+        ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef
+    )
+    nopat = compute_nopat_batch(pl)
+    nwc = compute_nwc_batch(bs)
+
+    latest_bs = bs_drivers["latest_bs"]
+    latest_nwc = compute_nwc_batch({name: np.float64(latest_bs[name]) for name in (
+        "net_receivables", "inventory", "other_current_assets",
+        "accounts_payable", "deferred_revenue", "other_current_liabilities")})
+    cf = forecast_cf_batch(
+        nopat["nopat"], pl["depreciation_amortization"], nwc, bs["ppe"], bs["intangible_assets"],
+        prev_nwc=latest_nwc, prev_ppe=latest_bs["ppe"], prev_intangible_assets=latest_bs["intangible_assets"]
+    )
+
+    return {
+        "pl": pl,
+        "bs": bs,
+        "nopat": nopat,
+        "nwc": nwc,
+        "cf": cf,
+    }
+
+
+def batch_to_records(arrays, fields, dates, scenario=0):
+    """
+    予測結果の配列から1シナリオ分を List[dict]（{"date": ..., 項目: float}）に変換する。
+    """
+    columns = [np.asarray(arrays[name])[scenario].tolist() for name in fields]
+    return [
+        {"date": date, **dict(zip(fields, values))}
+        for date, values in zip(dates, zip(*columns))
+    ]
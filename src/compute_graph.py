@@ -0,0 +1,113 @@
+import hashlib
+import json
+import time
+
+import numpy as np
+
+
+class Node:
+    """
+    計算グラフのノードの結果。key は入力（上流ノードの key を含む）のハッシュで、
+    下流ノードはこの key を自身の入力として扱うため、上流が変わらない限り再計算されない。
+    """
+
+    __slots__ = ("name", "key", "value", "recomputed")
+
+    def __init__(self, name, key, value, recomputed):
+        self.name = name
+        self.key = key
+        self.value = value
+        self.recomputed = recomputed
+
+    def __repr__(self):
+        return f"Node({self.name!r}, key={self.key[:8]}, recomputed={self.recomputed})"
+
+
+def _canonical(value):
+    """入力値をハッシュ可能な JSON 互換の形に変換する"""
+    if isinstance(value, Node):
+        return {"__node__": value.name, "key": value.key}
+    if isinstance(value, np.ndarray):
+        return {"__ndarray__": hashlib.sha256(np.ascontiguousarray(value).tobytes()).hexdigest(),
+                "dtype": str(value.dtype), "shape": value.shape}
+    if isinstance(value, (np.floating, np.integer)):
+        return value.item()
+    if isinstance(value, dict):
+        return {str(k): _canonical(v) for k, v in sorted(value.items(), key=lambda kv: str(kv[0]))}
+    if isinstance(value, (list, tuple)):
+        return [_canonical(v) for v in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    raise TypeError(f"ハッシュできない入力です: {type(value).__name__}")
+
+
+def hash_inputs(inputs):
+    raw = json.dumps(_canonical(inputs), sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ComputeGraph:
+    """
+    入力のハッシュをキーにノードの結果をメモ化する、依存関係付きの計算グラフ。
+
+    ノードは名前ごとに直近の結果を1つだけ保持する。compute に渡した入力（上流ノードを含む）の
+    ハッシュが前回と同じであれば関数を呼ばずに前回の結果を返すため、Streamlit の再実行時には
+    変更されたウィジェットの下流にあるノードだけが再計算される。
+
+    関数が参照するデータはすべて compute の入力として渡すこと（クロージャで参照した値は
+    キーに含まれない）。
+
+    Parameters:
+        store (dict-like or None): 結果の保持先（session_store.SessionStore など）。None の場合は dict。
+            保持先で破棄された結果は、次の compute で再計算される
+    """
+
+    _PREFIX = "node:"
+
+    def __init__(self, store=None):
+        self._entries = {} if store is None else store
+        self.stats = {}
+
+    def compute(self, name, func, **inputs):
+        """
+        ノード name を評価する。
+
+        Parameters:
+            name (str): ノード名（グラフ内で一意）
+            func (Callable): ノードの計算関数（inputs をキーワード引数で受け取る）
+            **inputs: 入力値（数値・文字列・list/tuple/dict・np.ndarray・Node）
+
+        Returns:
+            Node: 計算結果（.value で値を取得）
+        """
+        key = hash_inputs(inputs)
+        stats = self.stats.setdefault(name, {"hits": 0, "misses": 0, "last_sec": 0.0, "total_sec": 0.0})
+
+        entry = self._entries.get(self._PREFIX + name)
+        if entry is not None and entry.key == key:
+            stats["hits"] += 1
+            return Node(name, key, entry.value, recomputed=False)
+
+        args = {k: v.value if isinstance(v, Node) else v for k, v in inputs.items()}
+        start = time.perf_counter()
+        value = func(**args)
+        elapsed = time.perf_counter() - start
+
+        stats["misses"] += 1
+        stats["last_sec"] = elapsed
+        stats["total_sec"] += elapsed
+        node = Node(name, key, value, recomputed=True)
+        self._entries[self._PREFIX + name] = node
+        return node
+
+    def invalidate(self, name=None):
+        """ノード name（None の場合は全ノード）の結果を破棄する"""
+        if name is None:
+            keys = [key for key in list(self._entries.keys()) if str(key).startswith(self._PREFIX)]
+        else:
+            keys = [self._PREFIX + name]
+        for key in keys:
+            self._entries.pop(key, None)
+
+    def get_stats(self):
+        return {name: dict(stats) for name, stats in self.stats.items()}
@@ -1,3 +1,10 @@
+from dataclasses import dataclass
+
+import numpy as np
+
+from src.instrumentation import timed
+
+
 def compute_cost_of_equity(market_data):
     """
     市場データから株主資本コスト（CAPM）を計算
@@ -18,6 +25,7 @@ def compute_cost_of_equity(market_data):
 
     return r_f + beta * risk_premium
 
+@timed()
 def compute_cost_of_debt_from_pl_bs(pl_list, bs_list, years=5):
     """
     直近n年間（デフォルトは5年間）のPLとBSのデータから、
@@ -62,6 +70,117 @@ def compute_cost_of_debt_from_pl_bs(pl_list, bs_list, years=5):
     return total_interest_expense / total_debt
 
 
+def _latest_capital(bs_list):
+    latest_bs = bs_list[-1]
+    equity = latest_bs.get("total_equity", 0.0)
+    debt = latest_bs.get("short_term_debt", 0.0) + latest_bs.get("long_term_debt", 0.0)
+    if equity + debt == 0:
+        raise ValueError("資本構成の合計がゼロです")
+    return latest_bs, equity, debt
+
+
+def _average_tax_rate(nopat_list, years):
+    # 直近years年の実効税率平均を計算（有効値のみ）
+    valid_tax_rates = [
+        x["effective_tax_rate"]
+        for x in nopat_list[-years:]
+        if x.get("effective_tax_rate") is not None and x["effective_tax_rate"] >= 0
+    ]
+    if not valid_tax_rates:
+        raise ValueError("有効な実効税率データがありません")
+    return sum(valid_tax_rates) / len(valid_tax_rates)
+
+
+@dataclass(frozen=True)
+class CapitalStructure:
+    """
+    WACCの算出に用いる資本構成・税率の要約（最新BSの資本構成と直近の平均実効税率）。
+
+    ティッカーごとに1回だけ算出しておき、無リスク利子率・市場リスクプレミアム・βを変えた
+    資本コストは costs() で配列のまま一括計算する。各フィールドは float のほか、
+    複数銘柄分の配列（shape: (銘柄数,)）でもよい。
+
+    Attributes:
+        equity (float): 純資産（株主資本）
+        debt (float): 有利子負債（短期 + 長期）
+        cash (float): 現金及び現金同等物
+        avg_tax_rate (float): 直近の平均実効税率
+        cost_of_debt (float): 過去のPL・BSから推定した負債コスト（推定できない場合は NaN）
+        beta (float): β（costs() で省略した場合に使う、不明な場合は NaN）
+    """
+    equity: float
+    debt: float
+    cash: float
+    avg_tax_rate: float
+    cost_of_debt: float = np.nan
+    beta: float = np.nan
+
+    @classmethod
+    @timed()
+    def from_history(cls, pl_list, bs_list, nopat_list, market_data=None, years=5):
+        """
+        過去のPL・BS・NOPATから要約を作る（compute_cost_of_debt_from_pl_bs・compute_wacc と同じ定義）。
+        負債コストが推定できない場合は NaN とし、例外は送出しない。
+        """
+        latest_bs, equity, debt = _latest_capital(bs_list)
+        try:
+            cost_of_debt = compute_cost_of_debt_from_pl_bs(pl_list, bs_list, years=years)
+        except ValueError:
+            cost_of_debt = np.nan
+        return cls(
+            equity=equity,
+            debt=debt,
+            cash=latest_bs.get("cash_and_equivalents", 0.0),
+            avg_tax_rate=_average_tax_rate(nopat_list, years),
+            cost_of_debt=cost_of_debt,
+            beta=np.nan if market_data is None else market_data["beta"],
+        )
+
+    @property
+    def equity_weight(self):
+        return self.equity / (self.equity + self.debt)
+
+    @property
+    def debt_weight(self):
+        return self.debt / (self.equity + self.debt)
+
+    @property
+    def net_debt(self):
+        return self.debt - self.cash
+
+    def wacc(self, cost_of_equity, cost_of_debt=None):
+        """株主資本コスト・負債コスト（配列可）からWACCを計算する"""
+        cost_of_debt = self.cost_of_debt if cost_of_debt is None else cost_of_debt
+        return (self.equity_weight * np.asarray(cost_of_equity)
+                + self.debt_weight * np.asarray(cost_of_debt) * (1 - self.avg_tax_rate))
+
+    def infer_cost_of_debt(self, wacc, cost_of_equity):
+        """WACC と株主資本コスト（配列可）から負債コストを逆算する"""
+        denominator = self.debt_weight * (1 - self.avg_tax_rate)
+        if np.any(np.asarray(denominator) == 0):
+            raise ZeroDivisionError("負債比率または税率によって除算が不可能です")
+        return (np.asarray(wacc) - self.equity_weight * np.asarray(cost_of_equity)) / denominator
+
+    def costs(self, risk_free_rate, market_risk_premium, beta=None, cost_of_debt=None):
+        """
+        資本コストを一括計算する。引数はスカラーまたは配列で、NumPy のブロードキャストに従う
+        （例: risk_free_rate[:, None] と market_risk_premium[None, :] で rfr × mrp の格子）。
+
+        Returns:
+            dict: {"cost_of_equity", "cost_of_debt", "wacc"}（ブロードキャスト後の形状の配列）
+        """
+        beta = self.beta if beta is None else beta
+        cost_of_equity = np.asarray(risk_free_rate) + np.asarray(beta) * np.asarray(market_risk_premium)
+        cost_of_debt = self.cost_of_debt if cost_of_debt is None else cost_of_debt
+        cost_of_debt = np.broadcast_to(np.asarray(cost_of_debt, dtype=np.float64), np.shape(cost_of_equity))
+        return {
+            "cost_of_equity": cost_of_equity,
+            "cost_of_debt": cost_of_debt,
+            "wacc": self.wacc(cost_of_equity, cost_of_debt),
+        }
+
+
+@timed()
 def compute_wacc(cost_of_equity, cost_of_debt, bs_list, nopat_list, years=5):
     """
     株主資本コスト、負債コスト、BSとNOPATからWACCを計算する。
@@ -77,25 +196,8 @@ def compute_wacc(cost_of_equity, cost_of_debt, bs_list, nopat_list, years=5):
         float: 加重平均資本コスト（WACC、小数）
     """
     # 最新のBSから資本構成を取得
-    latest_bs = bs_list[-1]
-    equity = latest_bs.get("total_equity", 0.0)
-    short_term_debt = latest_bs.get("short_term_debt", 0.0)
-    long_term_debt = latest_bs.get("long_term_debt", 0.0)
-    debt = short_term_debt + long_term_debt
-
-    if equity + debt == 0:
-        raise ValueError("資本構成の合計がゼロです")
-
-    # 直近years年の実効税率平均を計算（有効値のみ）
-    valid_tax_rates = [
-        x["effective_tax_rate"]
-        for x in nopat_list[-years:]
-        if x.get("effective_tax_rate") is not None and x["effective_tax_rate"] >= 0
-    ]
-    if not valid_tax_rates:
-        raise ValueError("有効な実効税率データがありません")
-
-    avg_tax_rate = sum(valid_tax_rates) / len(valid_tax_rates)
+    _, equity, debt = _latest_capital(bs_list)
+    avg_tax_rate = _average_tax_rate(nopat_list, years)
 
     # WACC 計算
     total_capital = equity + debt
@@ -120,28 +222,13 @@ def infer_cost_of_debt_from_wacc(wacc, cost_of_equity, bs_list, nopat_list, year
     Returns:
         float: 負債コスト（小数、例：0.038）
     """
-    latest_bs = bs_list[-1]
-    equity = latest_bs.get("total_equity", 0.0)
-    short_term_debt = latest_bs.get("short_term_debt", 0.0)
-    long_term_debt = latest_bs.get("long_term_debt", 0.0)
-    debt = short_term_debt + long_term_debt
-
-    if equity + debt == 0:
-        raise ValueError("資本構成の合計がゼロです")
-
+    _, equity, debt = _latest_capital(bs_list)
     total_capital = equity + debt
     equity_weight = equity / total_capital
     debt_weight = debt / total_capital
 
     # 実効税率の平均
-    valid_tax_rates = [
-        x["effective_tax_rate"]
-        for x in nopat_list[-years:]
-        if x.get("effective_tax_rate") is not None and x["effective_tax_rate"] >= 0
-    ]
-    if not valid_tax_rates:
-        raise ValueError("有効な実効税率データがありません")
-    avg_tax_rate = sum(valid_tax_rates) / len(valid_tax_rates)
+    avg_tax_rate = _average_tax_rate(nopat_list, years)
 
     # 負債コストの逆算
     numerator = wacc - (equity_weight * cost_of_equity)
@@ -152,4 +239,3 @@ def infer_cost_of_debt_from_wacc(wacc, cost_of_equity, bs_list, nopat_list, year
 
     cost_of_debt = numerator / denominator
     return cost_of_debt
-
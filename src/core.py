@@ -0,0 +1,62 @@
+"""
+Streamlit・matplotlib・pandas に依存しない計算コア（取得 → 再構成 → 予測 → WACC → DCF）の窓口
+
+ヘッドレスなワーカーから利用する場合はこのモジュール経由で読み込む。
+各関数は最初に参照されたときに対応するモジュールを読み込むため、起動時の読み込みコストは最小限になる。
+
+利用例:
+    from src import core
+    core.configure(api_key="...")
+    bundle = core.fetch_company_bundle("AAPL")
+    result = core.value_company(bundle.income, bundle.balance, bundle.cash_flow, bundle.profile)
+"""
+import importlib
+
+# 公開名 → 定義元モジュール
+_EXPORTS = {
+    # 取得
+    "configure": "src.data_fetchers",
+    "configure_cache": "src.data_fetchers",
+    "configure_session": "src.data_fetchers",
+    "fetch_company_bundle": "src.data_fetchers",
+    "CompanyBundle": "src.data_fetchers",
+    # 再構成
+    "reconstruct_income_statement": "src.financial_utils",
+    "reconstruct_balance_sheet": "src.financial_utils",
+    "extract_returns_from_cf": "src.financial_utils",
+    "reconstruct_market_data": "src.financial_utils",
+    "build_history": "src.pipeline",
+    "derive_history_metrics": "src.pipeline",
+    # 予測
+    "default_growth_rates": "src.pipeline",
+    "forecast_scenario": "src.pipeline",
+    "forecast_statements_batch": "src.batch_forecasting",
+    # WACC
+    "compute_cost_of_capital": "src.pipeline",
+    "compute_cost_of_equity": "src.compute_wacc",
+    "compute_cost_of_debt_from_pl_bs": "src.compute_wacc",
+    "compute_wacc": "src.compute_wacc",
+    "CapitalStructure": "src.compute_wacc",
+    # DCF
+    "compute_dcf_valuation": "src.dcf",
+    "compute_dcf_valuation_matrix": "src.dcf",
+    "compute_dcf_valuation_grid": "src.dcf",
+    "compute_dcf_sensitivity_cube": "src.dcf",
+    "compute_fair_share_price_from_bs": "src.dcf",
+    "value_company": "src.pipeline",
+}
+
+__all__ = sorted(_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,44 +1,390 @@
-import requests
-import streamlit as st
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 
-FMP_API_KEY = st.secrets["FMP_API_KEY"] 
-BASE_URL = "https://financialmodelingprep.com/api/v3"
+from src.fetch_cache import DiskCache, CacheMiss
+from src.instrumentation import timed, stage, record_bytes
+from src.shared_cache import SingleFlight
 
+logger = logging.getLogger(__name__)
+
+# APIキーは configure() で注入するか、初回のリクエスト時に
+# 環境変数 FMP_API_KEY → Streamlit の secrets の順で解決する
+FMP_API_KEY = None
+DEFAULT_BASE_URL = "https://financialmodelingprep.com/api/v3"
+# ローカルのスタブサーバー（benchmarks/fmp_stub_server.py）などへ向ける場合は FMP_BASE_URL で指定する
+BASE_URL = os.environ.get("FMP_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+REQUEST_TIMEOUT = 10  # 1リクエストあたりのタイムアウト（秒）
+# /profile/AAPL,MSFT,... で1リクエストにまとめる銘柄数
+PROFILE_BATCH_SIZE = int(os.environ.get("FMP_PROFILE_BATCH_SIZE", 100))
+
+# プロセス内で共有するHTTPセッション（keep-alive・再試行付き、初回のリクエスト時に生成）
+_session = None
+_session_lock = threading.Lock()
+
+# プロセス間で共有するレート制限（FMP_PLAN: basic / starter / premium / ultimate / unlimited、
+# または "300/60" 形式。既定は unlimited で、429 を受けた場合の再試行のみ行う）。
+# FMP_RATE_LANE はこのプロセスの既定の優先度（バッチ処理は batch）
+RATE_LIMIT_PLAN = os.environ.get("FMP_PLAN", "unlimited")
+_default_lane = os.environ.get("FMP_RATE_LANE", "interactive")
+_rate_limiter = None
+_rate_limiter_ready = False
+
+# 同じ (endpoint, ticker) への同時のリクエストを1回にまとめる（複数セッションで同じ銘柄を開いた場合など）
+_inflight = SingleFlight()
+
+# プロセス内で共有するディスクキャッシュ（FMP_OFFLINE=1 でキャッシュのみから応答）
+_cache = DiskCache(offline=os.environ.get("FMP_OFFLINE") == "1")
+
+
+def configure(api_key=None, base_url=None):
+    """
+    FMPへの接続設定を注入する（Streamlit の secrets を使わずに実行する場合など）。
+
+    Parameters:
+        api_key (str or None): FMPのAPIキー
+        base_url (str or None): APIのベースURL（例: "http://127.0.0.1:8765/api/v3"）
+    """
+    global FMP_API_KEY, BASE_URL
+    if api_key is not None:
+        FMP_API_KEY = api_key
+    if base_url is not None:
+        BASE_URL = base_url.rstrip("/")
+
+
+def get_api_key():
+    global FMP_API_KEY
+    if FMP_API_KEY:
+        return FMP_API_KEY
+
+    api_key = os.environ.get("FMP_API_KEY")
+    if not api_key:
+        try:
+            import streamlit as st
+            api_key = st.secrets["FMP_API_KEY"]
+        except Exception as e:
+            raise RuntimeError(
+                "FMPのAPIキーが設定されていません（configure(api_key=...)、環境変数 FMP_API_KEY、"
+                ".streamlit/secrets.toml のいずれかで設定してください）"
+            ) from e
+    FMP_API_KEY = api_key
+    return FMP_API_KEY
+
+
+def _create_rate_limiter():
+    from src.rate_limiter import RateLimiter
+
+    # 上限はAPIキーごとなので、同じキーを使うプロセス同士でバケットを共有する
+    try:
+        key_id = hashlib.sha256(get_api_key().encode("utf-8")).hexdigest()[:12]
+    except RuntimeError:
+        key_id = "default"
+    return RateLimiter.for_plan(RATE_LIMIT_PLAN, name=f"fmp-{key_id}")
+
+
+def _get_rate_limiter():
+    global _rate_limiter, _rate_limiter_ready
+    if not _rate_limiter_ready:
+        _rate_limiter = _create_rate_limiter()
+        _rate_limiter_ready = True
+    return _rate_limiter
+
+
+def _get_session():
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                from src.http_session import PooledSession
+                _session = PooledSession(timeout=REQUEST_TIMEOUT, rate_limiter=_get_rate_limiter())
+    return _session
+
+
+def configure_rate_limit(plan=None, lane=None):
+    """
+    レート制限の設定を差し替える。
+
+    Parameters:
+        plan (str or None): プラン名（"starter" など、"unlimited" で無効）または "リクエスト数/秒"
+        lane (str or None): このプロセスの既定の優先度（"interactive" / "batch" / "background"）
+
+    Returns:
+        RateLimiter or None: 新しいレート制限（無効の場合は None）
+    """
+    global RATE_LIMIT_PLAN, _default_lane, _rate_limiter, _rate_limiter_ready
+    if lane is not None:
+        _default_lane = lane
+    if plan is not None:
+        RATE_LIMIT_PLAN = plan
+        with _session_lock:
+            _rate_limiter = _create_rate_limiter()
+            _rate_limiter_ready = True
+            if _session is not None:
+                _session.rate_limiter = _rate_limiter
+    return _get_rate_limiter()
+
+
+def get_rate_limit_stats():
+    return _rate_limiter.get_stats() if _rate_limiter is not None else {}
+
+
+def configure_cache(enabled=True, **kwargs):
+    """
+    ディスクキャッシュの設定を差し替える。
+
+    Parameters:
+        enabled (bool): False の場合はキャッシュを無効化
+        **kwargs: DiskCache の引数（cache_dir, ttls, max_bytes, offline）
+
+    Returns:
+        DiskCache or None: 新しいキャッシュ
+    """
+    global _cache
+    _cache = DiskCache(**kwargs) if enabled else None
+    return _cache
+
+
+def configure_session(**kwargs):
+    """
+    共有HTTPセッションの設定を差し替える。
+
+    Parameters:
+        **kwargs: PooledSession の引数（pool_connections, pool_maxsize, max_retries,
+                  backoff_base, backoff_max, timeout, rate_limiter）
+
+    Returns:
+        PooledSession: 新しいセッション
+    """
+    from src.http_session import PooledSession
+
+    global _session
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    kwargs.setdefault("rate_limiter", _get_rate_limiter())
+    with _session_lock:
+        old_session, _session = _session, PooledSession(**kwargs)
+    if old_session is not None:
+        old_session.close()
+    return _session
+
+
+def get_session_stats():
+    return _session.get_stats() if _session is not None else {}
+
+
+def get_cache_stats():
+    return _cache.get_stats() if _cache is not None else {}
+
+
+# キャッシュを経由してFMPのエンドポイントからJSONを取得する
+def _fetch_json(endpoint, ticker, limit=None, kind="statement", timeout=None, use_cache=True, lane=None):
+    cache = _cache if use_cache else None
+    if cache is not None:
+        with stage("fetch.cache_lookup"):
+            payload = cache.get(endpoint, ticker, limit, kind=kind)
+        if payload is not None:
+            return payload
+        if cache.offline:
+            raise CacheMiss(f"オフラインキャッシュにデータがありません: {endpoint}/{ticker}")
+
+    def request():
+        params = {"apikey": get_api_key()}
+        if limit is not None:
+            params["limit"] = limit
+        with stage(f"fetch.{endpoint}"):
+            response = _get_session().get(f"{BASE_URL}/{endpoint}/{ticker}", params=params, timeout=timeout,
+                                          lane=lane or _default_lane)
+            response.raise_for_status()
+            record_bytes(f"fetch.{endpoint}", len(response.content))
+            payload = response.json()
+
+        # 空のレスポンスやエラーメッセージはキャッシュしない
+        if cache is not None and isinstance(payload, list) and payload:
+            cache.put(endpoint, ticker, payload, limit)
+        return payload
+
+    # 実行中の同じリクエストがあればその結果を共有する（共有された結果は変更しないこと）
+    return _inflight.do((endpoint, ticker.upper(), limit, use_cache), request)
+
+
+def get_inflight_stats():
+    return _inflight.get_stats()
+
+
+@timed()
 def search_ticker_by_name(company_name):
-    url = f"https://financialmodelingprep.com/api/v3/search"
+    url = f"{BASE_URL}/search"
     params = {
         "query": company_name,
         "limit": 5,
-        "apikey": FMP_API_KEY
+        "apikey": get_api_key()
     }
-    response = requests.get(url, params=params)
+    response = _get_session().get(url, params=params, lane=_default_lane)
     return response.json()
 
 
-def fetch_income_statement(ticker, limit=10):
-    url = f"{BASE_URL}/income-statement/{ticker}?limit={limit}&apikey={FMP_API_KEY}"
-    response = requests.get(url)
-    response.raise_for_status()
+@timed()
+def fetch_symbol_list(timeout=60):
+    """
+    FMPの全銘柄一覧（stock/list）を取得する。ローカルの検索インデックス（symbol_index）の構築に使う。
+
+    Returns:
+        List[dict]: [{"symbol", "name", "price", "exchange", "exchangeShortName", "type"}, ...]
+    """
+    with stage("fetch.stock_list"):
+        response = _get_session().get(f"{BASE_URL}/stock/list", params={"apikey": get_api_key()}, timeout=timeout,
+                                      lane=_default_lane)
+        response.raise_for_status()
+        record_bytes("fetch.stock_list", len(response.content))
     return response.json()
 
 
+def fetch_income_statement(ticker, limit=10):
+    return _fetch_json("income-statement", ticker, limit)
+
+
 def fetch_balance_sheet(ticker, limit=10):
-    url = f"{BASE_URL}/balance-sheet-statement/{ticker}?limit={limit}&apikey={FMP_API_KEY}"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
+    return _fetch_json("balance-sheet-statement", ticker, limit)
 
 
 def fetch_cash_flow(ticker, limit=10):
-    url = f"{BASE_URL}/cash-flow-statement/{ticker}?limit={limit}&apikey={FMP_API_KEY}"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
+    return _fetch_json("cash-flow-statement", ticker, limit)
 
 
 def fetch_market_data(ticker: str):
-    url = f"{BASE_URL}/profile/{ticker}?apikey={FMP_API_KEY}"
-    response = requests.get(url)
-    response.raise_for_status()
-    return response.json()
+    return _fetch_json("profile", ticker, kind="profile")
+
+
+@timed()
+def fetch_profiles_bulk(tickers, batch_size=None, max_workers=4, use_cache=True, lane=None):
+    """
+    複数銘柄のプロフィールを、カンマ区切りの /profile/{AAPL,MSFT,...} でまとめて取得する。
+
+    キャッシュにある銘柄は取得せず、取得した銘柄は1銘柄ずつキャッシュに保存する
+    （以降の fetch_market_data・fetch_company_bundle もキャッシュから応答する）。
+
+    Parameters:
+        tickers (Iterable[str]): ティッカー
+        batch_size (int or None): 1リクエストあたりの銘柄数（既定は PROFILE_BATCH_SIZE）
+        max_workers (int): 同時に送信するリクエスト数
+        use_cache (bool): False の場合はキャッシュを使わない
+        lane (str or None): レート制限の優先度
+
+    Returns:
+        dict: {ticker: プロフィール（fetch_market_data と同じ1要素のリスト）}。
+              FMPに存在しない銘柄・取得に失敗したリクエストの銘柄は含まれない
+              （失敗したリクエストはログに記録する。全てのリクエストが失敗した場合は最初の例外を送出する）
+    """
+    batch_size = batch_size or PROFILE_BATCH_SIZE
+    cache = _cache if use_cache else None
+    tickers = list(dict.fromkeys(t.upper() for t in tickers))
+    profiles = {}
+
+    pending = []
+    for ticker in tickers:
+        payload = cache.get("profile", ticker, kind="profile") if cache is not None else None
+        if payload:
+            profiles[ticker] = payload
+        elif cache is not None and cache.offline:
+            raise CacheMiss(f"オフラインキャッシュにデータがありません: profile/{ticker}")
+        else:
+            pending.append(ticker)
+    if not pending:
+        return profiles
+
+    batches = [pending[i:i + batch_size] for i in range(0, len(pending), batch_size)]
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(batches)))) as executor:
+        # キャッシュは銘柄単位で扱うため、ここでは使わない
+        futures = [
+            executor.submit(_fetch_json, "profile", ",".join(batch), kind="profile", use_cache=False, lane=lane)
+            for batch in batches
+        ]
+        errors = []
+        for batch, future in zip(batches, futures):
+            # 1リクエストの失敗で他のリクエストの結果を捨てない（失敗した銘柄だけ呼び出し元で個別に取得する）
+            try:
+                payload = future.result()
+            except Exception as e:
+                errors.append(e)
+                # 例外のメッセージは APIキーを含むURLを含むため、種類とステータスコードだけ記録する
+                status = getattr(getattr(e, "response", None), "status_code", None)
+                logger.warning("プロフィールの一括取得に失敗しました（%d 銘柄: %s ...）: %s status=%s",
+                               len(batch), batch[0], type(e).__name__, status)
+                continue
+            requested = set(batch)
+            for item in payload if isinstance(payload, list) else []:
+                ticker = str(item.get("symbol", "")).upper()
+                if ticker in requested:
+                    profiles[ticker] = [item]
+                    if cache is not None:
+                        cache.put("profile", ticker, [item])
+    if errors and len(errors) == len(batches):
+        raise errors[0]
+    return profiles
+
+
+@dataclass
+class CompanyBundle:
+    """1銘柄分のFMPレスポンス一式。取得に失敗したエンドポイントは None で、errors に例外が入る"""
+    ticker: str
+    income: list | None = None
+    balance: list | None = None
+    cash_flow: list | None = None
+    profile: list | None = None
+    errors: dict = field(default_factory=dict)
+
+    @property
+    def ok(self):
+        return not self.errors
+
+    def raise_for_errors(self):
+        """いずれかのエンドポイントが失敗していれば、最初の例外を送出する"""
+        for error in self.errors.values():
+            raise error
+
+
+# バンドルのフィールド名とエンドポイント・キャッシュ種別の対応
+_BUNDLE_ENDPOINTS = {
+    "income": ("income-statement", "statement"),
+    "balance": ("balance-sheet-statement", "statement"),
+    "cash_flow": ("cash-flow-statement", "statement"),
+    "profile": ("profile", "profile"),
+}
+
+
+@timed()
+def fetch_company_bundle(ticker, limit=10, timeout=None, lane=None, profile=None):
+    """
+    損益計算書・貸借対照表・キャッシュフロー計算書・プロフィールの4エンドポイントを並行取得する。
+
+    Parameters:
+        ticker (str): ティッカー
+        limit (int): 財務諸表の取得年数
+        timeout (float or None): 1リクエストあたりのタイムアウト（秒）。None の場合はセッションの既定値
+        lane (str or None): レート制限の優先度（None の場合はプロセスの既定値）
+        profile (list or None): 取得済みのプロフィール（fetch_profiles_bulk の結果など）。指定した場合は取得しない
+
+    Returns:
+        CompanyBundle: 取得結果。1つのエンドポイントが失敗しても他の結果は保持される
+    """
+    bundle = CompanyBundle(ticker=ticker, profile=profile)
+    endpoints = {name: value for name, value in _BUNDLE_ENDPOINTS.items()
+                 if not (name == "profile" and profile is not None)}
+
+    with ThreadPoolExecutor(max_workers=len(endpoints)) as executor:
+        futures = {
+            name: executor.submit(
+                _fetch_json, endpoint, ticker,
+                limit if kind == "statement" else None, kind, timeout, True, lane
+            )
+            for name, (endpoint, kind) in endpoints.items()
+        }
+        for name, future in futures.items():
+            try:
+                setattr(bundle, name, future.result())
+            except Exception as e:
+                bundle.errors[name] = e
 
+    return bundle
@@ -1,13 +1,17 @@
 import numpy as np
 from numpy import linspace
-from copy import deepcopy
 
+from src.statements import Statements
+from src.instrumentation import timed
+
+@timed()
 def compute_dcf_valuation(cf_list, wacc, perpetual_growth_rate):
     """
     DCF法により企業価値を算出する関数。
 
     Parameters:
-        cf_list (List[dict]): 予測されたキャッシュフローリスト（各要素に 'fcf' を含む）
+        cf_list (List[dict]): 予測期間のキャッシュフローリスト（各要素に 'fcf' を含む）。
+            forecast_scenario の cf_list は実績を含むため、実績の年数分を除いて渡す
         wacc (float): 加重平均資本コスト（例：0.084）
         perpetual_growth_rate (float): 永久成長率（例：0.02）
 
@@ -36,6 +40,50 @@ def compute_dcf_valuation(cf_list, wacc, perpetual_growth_rate):
     return enterprise_value
 
 
+def extract_fcf_array(cf_list, years=10, start=0):
+    """
+    キャッシュフローリストからDCFに用いるFCFベクトルを取り出す。
+
+    Parameters:
+        cf_list (List[dict] or Statements or np.ndarray): キャッシュフローリスト（各要素に 'fcf' を含む）、
+            または取り出し済みのFCFベクトル
+        years (int): 切り取る年数（compute_dcf_valuation と同じく10年）
+        start (int): 予測の先頭の行。forecast_scenario の cf_list（実績＋予測）からは
+            実績の年数（len(pl_list)）を指定し、予測期間のFCFだけを取り出す
+
+    Returns:
+        np.ndarray: FCFの1次元配列（float64）
+    """
+    window = slice(start, start + years)
+    if isinstance(cf_list, np.ndarray):
+        return np.asarray(cf_list[window], dtype=np.float64)
+    if isinstance(cf_list, Statements):
+        return np.nan_to_num(cf_list["fcf"][window], nan=0.0)
+    return np.array([cf.get("fcf", 0) for cf in cf_list[window]], dtype=np.float64)
+
+
+@timed()
+def compute_dcf_valuation_matrix(fcf, wacc_values, growth_values, terminal_year=10):
+    """
+    WACC × 永久成長率の全組み合わせについて、DCF企業価値をブロードキャストで一括計算する。
+
+    compute_dcf_valuation と同じ式（各年FCFの割引和 + 最終年FCFに基づくターミナルバリュー）を
+    compute_dcf_valuation_grid で評価する。g ≥ WACC となるセルはターミナルバリューが定義できないため NaN を返す。
+
+    Parameters:
+        fcf (np.ndarray): FCFベクトル（extract_fcf_array の戻り値）
+        wacc_values (array-like): WACCの配列（行方向）
+        growth_values (array-like): 永久成長率の配列（列方向）
+        terminal_year (int): ターミナルバリューを割り引く年数（デフォルト10）
+
+    Returns:
+        np.ndarray: 企業価値マトリクス（行: WACC, 列: g）
+    """
+    wacc = np.asarray(wacc_values, dtype=np.float64).reshape(-1, 1)
+    growth = np.asarray(growth_values, dtype=np.float64).reshape(1, -1)
+    return compute_dcf_valuation_grid(fcf, wacc, growth, terminal_year=terminal_year)
+
+
 def compute_fair_share_price_from_bs(enterprise_value, bs_list, market_data):
     """
     企業価値と最新BSおよび市場データから理論株価（1株あたりの価値）を算出する。
@@ -84,6 +132,7 @@ def compute_fair_share_price_from_bs(enterprise_value, bs_list, market_data):
     }
 
 
+@timed()
 def sensitivity_analysis_dcf(cf_list, base_wacc, base_growth, 
                              wacc_range=(-0.01, 0.01), 
                              growth_range=(-0.005, 0.005), 
@@ -102,7 +151,7 @@ def sensitivity_analysis_dcf(cf_list, base_wacc, base_growth,
 
     Returns:
         Tuple[np.ndarray, List[float], List[float]]:
-            - 感応度マトリクス（行: WACC, 列: g）
+            - 感応度マトリクス（行: WACC, 列: g、g ≥ WACC のセルは NaN）
             - 使用されたWACCのリスト
             - 使用されたgのリスト
     """
@@ -111,15 +160,116 @@ def sensitivity_analysis_dcf(cf_list, base_wacc, base_growth,
     wacc_list = linspace(base_wacc + wacc_range[0], base_wacc + wacc_range[1], wacc_steps)
     g_list = linspace(base_growth + growth_range[0], base_growth + growth_range[1], growth_steps)
 
-    result_matrix = np.zeros((len(wacc_list), len(g_list)))
-
-    for i, wacc in enumerate(wacc_list):
-        for j, g in enumerate(g_list):
-            try:
-                ev = compute_dcf_valuation(deepcopy(cf_list), wacc, g)
-            except ZeroDivisionError:
-                ev = np.nan  # WACC == g に近い場合に無限大回避
-            result_matrix[i, j] = ev
+    # FCFベクトルを一度だけ取り出し、全セルを一括計算
+    fcf = extract_fcf_array(cf_list)
+    result_matrix = compute_dcf_valuation_matrix(fcf, wacc_list, g_list)
 
     return result_matrix, list(wacc_list), list(g_list)
 
+
+def compute_dcf_valuation_paths(fcf_matrix, wacc, perpetual_growth_rate, terminal_year=10):
+    """
+    パス（シナリオ）ごとに異なるFCF・WACC・永久成長率でDCF企業価値を一括計算する。
+
+    compute_dcf_valuation と同じ式を、行ごとに独立したパラメータで評価する。
+    g ≥ WACC となるパスは NaN を返す。
+
+    Parameters:
+        fcf_matrix (np.ndarray): FCF（shape: (パス数, 年数) または (年数,)）
+        wacc (float or np.ndarray): WACC（スカラー または shape: (パス数,)）
+        perpetual_growth_rate (float or np.ndarray): 永久成長率（スカラー または shape: (パス数,)）
+        terminal_year (int): ターミナルバリューを割り引く年数（デフォルト10）
+
+    Returns:
+        np.ndarray: パスごとの企業価値（shape: (パス数,)）
+    """
+    fcf = np.atleast_2d(np.asarray(fcf_matrix, dtype=np.float64))
+    wacc = np.asarray(wacc, dtype=np.float64).reshape(-1)
+    growth = np.asarray(perpetual_growth_rate, dtype=np.float64).reshape(-1)
+
+    if fcf.shape[1] == 0:
+        raise ValueError("FCFデータが存在しません")
+
+    t = np.arange(1, fcf.shape[1] + 1, dtype=np.float64)
+    discount_factors = (1 + wacc[:, None]) ** -t
+    pv_fcf = np.sum(fcf * discount_factors, axis=1)
+
+    spread = wacc - growth
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terminal_value = fcf[:, -1] * (1 + growth) / spread
+    discounted_terminal_value = terminal_value * (1 + wacc) ** -terminal_year
+
+    return np.where(spread > 0, pv_fcf + discounted_terminal_value, np.nan)
+
+
+def compute_dcf_valuation_grid(fcf, wacc, perpetual_growth_rate, terminal_year=10):
+    """
+    1組のFCFについて、任意の形状のWACC・永久成長率の配列でDCF企業価値をブロードキャストで計算する。
+
+    compute_dcf_valuation と同じ式。g ≥ WACC となる要素は NaN を返す。
+
+    Parameters:
+        fcf (np.ndarray): FCFベクトル（extract_fcf_array の戻り値）
+        wacc (float or np.ndarray): WACC（任意の形状）
+        perpetual_growth_rate (float or np.ndarray): 永久成長率（wacc とブロードキャスト可能な形状）
+        terminal_year (int): ターミナルバリューを割り引く年数（デフォルト10）
+
+    Returns:
+        np.ndarray: 企業価値（wacc と perpetual_growth_rate をブロードキャストした形状）
+    """
+    fcf = np.asarray(fcf, dtype=np.float64)
+    wacc = np.asarray(wacc, dtype=np.float64)
+    growth = np.asarray(perpetual_growth_rate, dtype=np.float64)
+
+    if fcf.size == 0:
+        raise ValueError("FCFデータが存在しません")
+
+    t = np.arange(1, fcf.size + 1, dtype=np.float64)
+    pv_fcf = ((1 + wacc[..., None]) ** -t) @ fcf  # 形状は wacc と同じ
+
+    spread = wacc - growth
+    with np.errstate(divide="ignore", invalid="ignore"):
+        terminal_value = fcf[-1] * (1 + growth) / spread
+    discounted_terminal_value = terminal_value * (1 + wacc) ** -terminal_year
+
+    return np.where(spread > 0, pv_fcf + discounted_terminal_value, np.nan)
+
+
+@timed()
+def compute_dcf_sensitivity_cube(fcf, capital_structure, risk_free_rates, market_risk_premiums, growth_rates,
+                                 beta=None, shares_outstanding=None, terminal_year=10):
+    """
+    無リスク利子率 × 市場リスクプレミアム × 永久成長率の全組み合わせについて、
+    資本コスト → WACC → DCF企業価値（→ 理論株価）を1回の配列演算で計算する。
+
+    Parameters:
+        fcf (np.ndarray): FCFベクトル（extract_fcf_array の戻り値）
+        capital_structure (CapitalStructure): 資本構成・税率の要約（src.compute_wacc）
+        risk_free_rates, market_risk_premiums, growth_rates (array-like): 各軸の値
+        beta (float or None): β（None の場合は capital_structure.beta）
+        shares_outstanding (float or None): 発行済株式数（指定した場合は理論株価も返す）
+        terminal_year (int): ターミナルバリューを割り引く年数
+
+    Returns:
+        dict: {
+            "cost_of_equity", "wacc": np.ndarray (rfr, mrp),
+            "enterprise_value", "equity_value"（, "fair_share_price"）: np.ndarray (rfr, mrp, g)
+        }
+    """
+    rfr = np.asarray(risk_free_rates, dtype=np.float64).reshape(-1, 1)
+    mrp = np.asarray(market_risk_premiums, dtype=np.float64).reshape(1, -1)
+    growth = np.asarray(growth_rates, dtype=np.float64).reshape(1, 1, -1)
+
+    costs = capital_structure.costs(rfr, mrp, beta=beta)
+    enterprise_value = compute_dcf_valuation_grid(fcf, costs["wacc"][..., None], growth, terminal_year)
+    equity_value = enterprise_value - capital_structure.net_debt
+
+    result = {
+        "cost_of_equity": costs["cost_of_equity"],
+        "wacc": costs["wacc"],
+        "enterprise_value": enterprise_value,
+        "equity_value": equity_value,
+    }
+    if shares_outstanding:
+        result["fair_share_price"] = equity_value / shares_outstanding
+    return result
@@ -0,0 +1,165 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+# 決算データ（年次財務諸表）は更新頻度が低く、株価を含むプロフィールは日中に変動する
+DEFAULT_TTLS = {
+    "statement": 7 * 24 * 60 * 60,
+    "profile": 15 * 60,
+}
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+DEFAULT_CACHE_DIR = Path(os.environ.get("FMP_CACHE_DIR", Path.home() / ".cache" / "dcf-app" / "fmp"))
+
+
+class CacheMiss(LookupError):
+    """オフラインモードでキャッシュに該当データが存在しない場合の例外"""
+
+
+class DiskCache:
+    """
+    FMPレスポンスをディスクに保存するコンテンツアドレス型キャッシュ。
+
+    キーは (endpoint, ticker, limit) のSHA-256で、1エントリ1ファイルのJSONとして保存する。
+    エントリの種類（statement / profile）ごとにTTLを持ち、合計サイズが max_bytes を超えた場合は
+    最終アクセス時刻（ファイルのmtime）が古い順に削除する（LRU）。
+
+    Parameters:
+        cache_dir (str or Path): 保存先ディレクトリ
+        ttls (dict): 種類ごとのTTL（秒）
+        max_bytes (int): キャッシュ全体のサイズ上限（バイト）
+        offline (bool): True の場合、期限切れでもキャッシュを返しネットワークを使わない
+    """
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, ttls=None, max_bytes=DEFAULT_MAX_BYTES, offline=False):
+        self.cache_dir = Path(cache_dir)
+        self.ttls = {**DEFAULT_TTLS, **(ttls or {})}
+        self.max_bytes = max_bytes
+        self.offline = offline
+        self.stats = {"hits": 0, "misses": 0, "stale": 0, "writes": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 初回の書き込み時にディレクトリを走査して求める
+
+    @staticmethod
+    def make_key(endpoint, ticker, limit=None):
+        raw = json.dumps([endpoint, ticker.upper(), limit])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def get(self, endpoint, ticker, limit=None, kind="statement"):
+        """
+        キャッシュからペイロードを取得する。存在しない・期限切れの場合は None。
+        オフラインモードでは期限切れのエントリもそのまま返す。
+        """
+        path = self._path(self.make_key(endpoint, ticker, limit))
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self._count("misses")
+            return None
+
+        age = time.time() - entry.get("fetched_at", 0)
+        if age > self.ttls.get(kind, 0) and not self.offline:
+            self._count("stale")
+            self._count("misses")
+            return None
+
+        # LRU用に最終アクセス時刻を更新
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count("hits")
+        return entry["payload"]
+
+    def put(self, endpoint, ticker, payload, limit=None):
+        key = self.make_key(endpoint, ticker, limit)
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        old_size = path.stat().st_size if path.exists() else 0
+
+        entry = {
+            "endpoint": endpoint,
+            "ticker": ticker.upper(),
+            "limit": limit,
+            "fetched_at": time.time(),
+            "payload": payload,
+        }
+        # 書き込み途中のファイルを読まれないよう一時ファイル経由で置き換える
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+        new_size = path.stat().st_size
+
+        with self._lock:
+            self.stats["writes"] += 1
+            if self._total_bytes is None:
+                self._total_bytes = self.size_bytes()
+            else:
+                self._total_bytes += new_size - old_size
+            over_budget = self._total_bytes > self.max_bytes
+
+        if over_budget:
+            self.evict()
+
+    def evict(self):
+        """合計サイズが上限を超えていれば、最終アクセスが古いエントリから削除する"""
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        if total <= self.max_bytes:
+            with self._lock:
+                self._total_bytes = total
+            return
+
+        for _, size, path in sorted(entries):
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            total -= size
+            self._count("evictions")
+            if total <= self.max_bytes:
+                break
+
+        with self._lock:
+            self._total_bytes = total
+
+    def size_bytes(self):
+        total = 0
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                total += path.stat().st_size
+            except OSError:
+                continue
+        return total
+
+    def clear(self):
+        for path in self.cache_dir.glob("*/*.json"):
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._total_bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            stats = dict(self.stats)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
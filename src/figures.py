@@ -0,0 +1,250 @@
+"""
+グラフの Figure の構築（Streamlit に依存しない）と、ワーカープロセスでの並列描画
+
+matplotlib の pyplot・seaborn のテーマはプロセス内で共有される状態のため、スレッドでは並列に描画できない。
+複数のグラフ（シナリオ別の比較グラフ・感応度分析のヒートマップなど）は、Agg バックエンドの
+ワーカープロセスで並列に描画し、画像バイト列として受け取る。
+
+    future = render_pool.submit(build_sensitivity_figure, (scenario, fcf, wacc, growth))
+    image = future.result() if future is not None else render_figure(build_sensitivity_figure, args)
+
+- DCF_RENDER_WORKERS: ワーカープロセス数（0 の場合はプロセス内で順に描画する。既定は CPU 数（最大4）、1CPU の場合は 0）
+"""
+import multiprocessing
+import os
+import sys
+import threading
+import types
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import matplotlib.pyplot as plt
+import seaborn as sns
+
+from src.dcf import sensitivity_analysis_dcf
+from src.render_cache import figure_to_bytes
+
+
+def _default_workers():
+    cpus = os.cpu_count() or 1
+    return min(4, cpus) if cpus > 1 else 0
+
+
+DEFAULT_RENDER_WORKERS = int(os.environ.get("DCF_RENDER_WORKERS", _default_workers()))
+
+
+# 複数の指標の推移を描いた Figure を返す（df は描画対象の列に絞り込み済みのもの）
+def build_multiple_metrics_figure(df, title=None):
+    sns.set_theme(style="whitegrid", palette="muted", font_scale=1.1)
+
+    df_plot = df.copy()
+    df_plot["Date"] = df_plot.index
+
+    # meltで長い形式に変換（Seaborn向け）
+    df_melted = df_plot.melt(id_vars="Date", var_name="Metric", value_name="Value")
+
+    # プロット
+    fig, ax = plt.subplots(figsize=(12, 6))
+    sns.lineplot(data=df_melted, x="Date", y="Value", hue="Metric", marker="o", ax=ax)
+
+    # ラベル・タイトルの設定
+    ax.set_title(title or "Financial Metrics", fontsize=14, weight="bold")
+    ax.set_xlabel("Date", fontsize=12)
+    ax.set_ylabel("Value", fontsize=12)
+    ax.legend(title="Metric", loc="best")
+    fig.tight_layout()
+    return fig
+
+
+# シナリオ別の企業価値（十億USD）の棒グラフの Figure を返す
+def build_ev_comparison_figure(labels, enterprise_values):
+    sns.set_theme(style="whitegrid")
+    df_ev = pd.DataFrame({
+        "Scenario": labels,
+        "Enterprise Value (B USD)": enterprise_values
+    })
+    fig1, ax1 = plt.subplots(figsize=(10, 5))
+    sns.barplot(x="Scenario", y="Enterprise Value (B USD)", data=df_ev, ax=ax1, palette="Blues_d")
+    ax1.set_title("Enterprise Value by Scenario", fontsize=14)
+    ax1.set_ylabel("Enterprise Value (Billion USD)", fontsize=12)
+    ax1.set_xlabel("")
+    ax1.tick_params(axis='x', rotation=15)
+    return fig1
+
+
+# シナリオ別の理論株価と市場株価の棒グラフの Figure を返す
+def build_price_comparison_figure(labels, fair_prices, market_prices):
+    sns.set_theme(style="whitegrid")
+    df_prices = pd.DataFrame({
+        "Scenario": labels * 2,
+        "Price (USD)": fair_prices + market_prices,
+        "Type": ["Fair Value"] * len(labels) + ["Market Price"] * len(labels)
+    })
+    fig2, ax2 = plt.subplots(figsize=(10, 5))
+    sns.barplot(
+        data=df_prices,
+        x="Scenario",
+        y="Price (USD)",
+        hue="Type",
+        palette="Set2",
+        ax=ax2
+    )
+    ax2.set_title("Fair Value vs Market Price per Share", fontsize=14)
+    ax2.set_ylabel("Price (USD)", fontsize=12)
+    ax2.set_xlabel("")
+    ax2.tick_params(axis='x', rotation=15)
+    ax2.legend(title="")
+    return fig2
+
+
+# 1シナリオ分の感応度分析を行い、ヒートマップの Figure を返す
+def build_sensitivity_figure(scenario, cf_list, wacc, growth):
+    sns.set_theme(style="whitegrid")
+    matrix, wacc_list, g_list = sensitivity_analysis_dcf(
+        cf_list=cf_list,
+        base_wacc=wacc,
+        base_growth=growth,
+        wacc_range=(-0.01, 0.01),
+        growth_range=(-0.005, 0.005),
+        wacc_steps=5,
+        growth_steps=5
+    )
+
+    heatmap_df = pd.DataFrame(
+        matrix / 1e9,
+        index=[f"{w*100:.2f}%" for w in wacc_list],
+        columns=[f"{g*100:.2f}%" for g in g_list]
+    )
+
+    fig, ax = plt.subplots(figsize=(9, 6))
+    sns.heatmap(
+        heatmap_df,
+        annot=True,
+        fmt=".1f",
+        cmap="YlGnBu",
+        ax=ax,
+        annot_kws={"size": 10},
+        linewidths=0.5,
+        cbar_kws={'label': 'Enterprise Value (B USD)'}
+    )
+    ax.set_xlabel("Perpetual Growth Rate (g)", fontsize=12)
+    ax.set_ylabel("WACC", fontsize=12)
+    ax.set_title(f"Sensitivity Heatmap: {scenario}", fontsize=14)
+    return fig
+
+
+def render_figure(builder, args=(), image_format="png"):
+    """builder(*args) で Figure を作り、画像バイト列に変換して返す（ワーカープロセスでも実行される）"""
+    return figure_to_bytes(builder(*args), image_format=image_format)
+
+
+def _init_worker():
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _ping():
+    return os.getpid()
+
+
+# ワーカープロセスの起動（__main__ を一時的に置き換える間）はプロセス内で1つずつ行う
+_spawn_lock = threading.Lock()
+
+
+@contextmanager
+def _spawn_without_main():
+    """
+    spawn のワーカープロセスは起動時に親プロセスの __main__ のファイルを再実行する。Streamlit は main.py を
+    __main__ として実行するため、そのままではワーカープロセスがアプリ全体を再実行してしまう。
+    ワーカープロセスを起動する間だけ（プールの作成時に1回、数ミリ秒）、__main__ をファイルを持たないモジュールに置き換える。
+    """
+    with _spawn_lock:
+        main_module = sys.modules.get("__main__")
+        sys.modules["__main__"] = types.ModuleType("__main__")
+        try:
+            yield
+        finally:
+            sys.modules["__main__"] = main_module
+
+
+class RenderPool:
+    """
+    グラフを描画するワーカープロセスのプール（プロセス内で共有し、最初の利用時に起動する）。
+
+    ワーカープロセスはプールの作成時に全て起動する（spawn のプールは submit のたびに必要な分を起動するため、
+    後から起動されると __main__ の置き換えが必要になる）。ワーカープロセスが異常終了した場合はプールを作り直す。
+
+    Parameters:
+        max_workers (int): ワーカープロセス数（0 の場合は submit が常に None を返す）
+    """
+
+    def __init__(self, max_workers=DEFAULT_RENDER_WORKERS):
+        self.max_workers = max_workers
+        self._executor = None
+        self._lock = threading.Lock()
+        self.stats = {"submitted": 0, "failed": 0, "restarts": 0}
+
+    @property
+    def enabled(self):
+        return self.max_workers > 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                )
+                # 待機中のワーカーがない間は submit ごとに1プロセス起動されるため、max_workers 回で全て起動する
+                with _spawn_without_main():
+                    for _ in range(self.max_workers):
+                        executor.submit(_ping)
+                self._executor = executor
+            return self._executor
+
+    def warm_up(self):
+        """ワーカープロセスを起動しておく（最初のグラフの描画に起動時間が含まれないようにする）。起動済みの場合は何もしない"""
+        if self.enabled:
+            self._get_executor()
+
+    def submit(self, builder, args=(), image_format="png"):
+        """
+        render_figure(builder, args) をワーカープロセスで実行する。
+
+        Returns:
+            Future or None: 画像バイト列を返す Future（プールを使えない場合は None。呼び出し元で描画する）
+        """
+        if not self.enabled:
+            return None
+        try:
+            future = self._get_executor().submit(render_figure, builder, args, image_format)
+        except (BrokenProcessPool, RuntimeError):
+            # ワーカープロセスが異常終了した場合は、プールを作り直して次回から使う
+            self.stats["failed"] += 1
+            self.reset()
+            return None
+        self.stats["submitted"] += 1
+        return future
+
+    def reset(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            if executor is not None:
+                self.stats["restarts"] += 1
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self):
+        return {**self.stats, "max_workers": self.max_workers, "running": self._executor is not None}
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+render_pool = RenderPool()
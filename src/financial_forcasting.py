@@ -1,9 +1,14 @@
 import numpy as np
 from copy import deepcopy
-from datetime import datetime
-from src.utils import (safe_divide, average_ratio, average_value, average_growth,
-                       average_dividend_ratio, average_buyback_ratio,)
-
+from src.statements import as_records
+from src.batch_forecasting import (
+    PL_FORECAST_FIELDS, BS_FORECAST_FIELDS, CF_FIELDS,
+    prepare_pl_drivers, prepare_bs_drivers, forecast_dates,
+    forecast_pl_batch, forecast_bs_batch, forecast_cf_batch, batch_to_records,
+)
+from src.instrumentation import timed
+
+@timed()
 def forecast_pl_from_growth(pl_list, growth_rates):
     """
     売上高成長率に基づいて将来のPLを予測し、PLリストに追加する。
@@ -28,58 +33,20 @@ def forecast_pl_from_growth(pl_list, growth_rates):
     - 親会社株主に属する当期純利益：以上から算出
 
     """
-    # 直近5年
-    recent_pl = pl_list[-5:]
+    pl_list = as_records(pl_list)
     extended_pl_list = deepcopy(pl_list)
-    base = extended_pl_list[-1]  # 最新年
-    base_date = datetime.strptime(base["date"], "%Y-%m-%d")
-
-    # 過去の平均比率・平均値
-    cost_ratio = average_ratio(recent_pl, "cost_of_revenue", "revenue")
-    sga_ratio = average_ratio(recent_pl, "sg_and_a", "revenue")
-    depreciation_growth = average_growth(recent_pl, "depreciation_amortization")
-    interest_income_avg = average_value(recent_pl, "interest_income")
-    interest_expense_avg = average_value(recent_pl, "interest_expense")
-    other_non_op_avg = average_value(recent_pl, "other_non_operating")
-    tax_rate = average_ratio(recent_pl, "income_tax", "income_before_tax")
-
-    # 初期値
-    current_revenue = base["revenue"]
-    current_depreciation = base.get("depreciation_amortization", 0)
-
-    for i, growth in enumerate(growth_rates, start=1):
-        current_revenue *= (1 + growth)
-        current_depreciation *= (1 + depreciation_growth)
-        forecast_date = base_date.replace(year=base_date.year + i)
-        forecast_date_str = forecast_date.strftime("%Y-%m-%d")
 
-        cost_of_revenue = current_revenue * cost_ratio
-        sg_and_a = current_revenue * sga_ratio
-        operating_income = current_revenue - cost_of_revenue - sg_and_a - current_depreciation
-        income_before_tax = operating_income + interest_income_avg - interest_expense_avg + other_non_op_avg
-        income_tax = income_before_tax * tax_rate
-        net_income = income_before_tax - income_tax
-
-        forecast_entry = {
-            "date": forecast_date_str,
-            "revenue": current_revenue,
-            "cost_of_revenue": cost_of_revenue,
-            "sg_and_a": sg_and_a,
-            "depreciation_amortization": current_depreciation,
-            "operating_income": operating_income,
-            "interest_income": interest_income_avg,
-            "interest_expense": interest_expense_avg,
-            "other_non_operating": other_non_op_avg,
-            "income_before_tax": income_before_tax,
-            "income_tax": income_tax,
-            "net_income": net_income,
-        }
-
-        extended_pl_list.append(forecast_entry)
+    # 1シナリオ分の配列演算として予測（forecast_pl_batch）
+    drivers = prepare_pl_drivers(pl_list)
+    growth_matrix = np.asarray(growth_rates, dtype=np.float64).reshape(1, -1)
+    forecast = forecast_pl_batch(drivers, growth_matrix)
+    dates = forecast_dates(drivers["date"], growth_matrix.shape[1])
 
+    extended_pl_list.extend(batch_to_records(forecast, PL_FORECAST_FIELDS, dates))
     return extended_pl_list
 
 
+@timed()
 def forecast_bs_from_pl(extended_pl_list, pl_list, bs_list, returns_list, 
                         ppe_growth_coef=None,intangible_growth_coef=None):
     """
@@ -117,124 +84,37 @@ def forecast_bs_from_pl(extended_pl_list, pl_list, bs_list, returns_list,
     - 資本剰余金：直近5年の配当性向の平均から計算
     - その他包括利益累計額：0と仮定
     """
-    # 直近5年
-    recent_pl = pl_list[-5:]
-    recent_bs = bs_list[-5:]
-    latest_bs = recent_bs[-1]
-
-    # 固定値・比率・成長率など
-    short_term_investments = latest_bs["short_term_investments"]
-    other_current_assets = latest_bs["other_current_assets"]
-    long_term_investments = latest_bs["long_term_investments"]
-    other_noncurrent_assets = latest_bs["other_noncurrent_assets"]
-    short_term_debt = latest_bs["short_term_debt"]
-    deferred_revenue = latest_bs["deferred_revenue"]
-    long_term_debt = latest_bs["long_term_debt"]
-    other_noncurrent_liabilities = latest_bs["other_noncurrent_liabilities"]
-    common_stock = latest_bs["common_stock"]
-    aoci = 0
-
-    net_receivables_ratio = average_ratio(recent_bs, "net_receivables", "revenue", recent_pl)
-    inventory_ratio = average_ratio(recent_bs, "inventory", "revenue", recent_pl)
-    accounts_payable_ratio = average_ratio(recent_bs, "accounts_payable", "revenue", recent_pl)
-    other_current_liabilities_ratio = average_ratio(recent_bs, "other_current_liabilities", "revenue", recent_pl)
-
-    # 実績から推定（デフォルト値として使用）
-    avg_ppe_growth = average_growth(bs_list, "ppe")
-    avg_intangible_growth = average_growth(recent_bs, "intangible_assets")
-    avg_revenue_growth = average_growth(pl_list, "revenue")
-
-    if ppe_growth_coef is None:
-        ppe_growth_coef = avg_ppe_growth / avg_revenue_growth
-
-    if intangible_growth_coef is None:
-        intangible_growth_coef = avg_intangible_growth / avg_revenue_growth
-
-    dividend_ratio = average_dividend_ratio(recent_pl, returns_list)
-    buyback_ratio = average_buyback_ratio(recent_pl, returns_list)
-
-     # 過去の cash / revenue 平均を算出
-    cash_revenue_ratios = [
-        bs["cash_and_equivalents"] / pl["revenue"]
-        for bs, pl in zip(recent_bs, recent_pl) if pl["revenue"] != 0
-    ]
-    target_cash_ratio = sum(cash_revenue_ratios) / len(cash_revenue_ratios)
+    extended_pl_list = as_records(extended_pl_list)
+    pl_list = as_records(pl_list)
+    bs_list = as_records(bs_list)
+    returns_list = as_records(returns_list)
 
     extended_bs_list = deepcopy(bs_list)
-    base_bs = bs_list[-1]
-    base_date = datetime.strptime(base_bs["date"], "%Y-%m-%d")
-
-    for i, pl in enumerate(extended_pl_list):
-        if pl["date"] <= base_bs["date"]:
-            continue  # すでに存在するBSより前のPLは無視
-
-        revenue = pl.get("revenue", 0)
-        net_income = pl.get("net_income", 0)
-        prev_bs = extended_bs_list[-1]  # 直前のBS
-        prev_revenue = extended_pl_list[i - 1]["revenue"] if i > 0 else revenue
-        sales_growth_rate = (
-            (revenue - prev_revenue) / prev_revenue if prev_revenue else 0)
-
-        date_obj = datetime.strptime(prev_bs["date"], "%Y-%m-%d")
-        date = date_obj.replace(year=date_obj.year + 1).strftime("%Y-%m-%d")
-
-        # 資産項目
-        net_receivables = revenue * net_receivables_ratio
-        inventory = revenue * inventory_ratio
-        accounts_payable = revenue * accounts_payable_ratio
-        other_current_liabilities = revenue * other_current_liabilities_ratio
-        ppe = prev_bs["ppe"] * (1 + ppe_growth_coef * sales_growth_rate)
-        intangible_assets = prev_bs["intangible_assets"] * (1 + intangible_growth_coef * sales_growth_rate)
-
-        # 純資産項目
-        distributed_ratio = min(dividend_ratio + buyback_ratio, 1.0)
-        retained_earnings = (prev_bs.get("retained_earnings") or 0.0) + net_income * (1 - distributed_ratio)
-        capital_surplus = prev_bs.get("capital_surplus", 0.0)
-
-        non_cash_assets = (
-            short_term_investments + net_receivables + inventory +
-            other_current_assets + ppe + intangible_assets +
-            long_term_investments + other_noncurrent_assets
-        )
-        total_liabilities = (
-            short_term_debt + accounts_payable + other_current_liabilities +
-            deferred_revenue + long_term_debt + other_noncurrent_liabilities
-        )
-        total_equity = common_stock + capital_surplus + retained_earnings + aoci
-        cash = total_liabilities + total_equity - non_cash_assets
-        total_assets = non_cash_assets + cash
-
-        forecast_bs = {
-            "date": date,
-            "cash_and_equivalents": cash,
-            "short_term_investments": short_term_investments,
-            "net_receivables": net_receivables,
-            "inventory": inventory,
-            "other_current_assets": other_current_assets,
-            "long_term_investments": long_term_investments,
-            "ppe": ppe,
-            "intangible_assets": intangible_assets,
-            "other_noncurrent_assets": other_noncurrent_assets,
-            "total_assets": total_assets,
-            "short_term_debt": short_term_debt,
-            "accounts_payable": accounts_payable,
-            "other_current_liabilities": other_current_liabilities,
-            "deferred_revenue": deferred_revenue,
-            "long_term_debt": long_term_debt,
-            "other_noncurrent_liabilities": other_noncurrent_liabilities,
-            "total_liabilities": total_liabilities,
-            "common_stock": common_stock,
-            "retained_earnings": retained_earnings,
-            "aoci": aoci,
-            "capital_surplus":capital_surplus,
-            "total_equity": total_equity,
-        }
-
-        extended_bs_list.append(forecast_bs)
-
+    base_date = bs_list[-1]["date"]
+
+    # すでに存在するBSより後のPLのみを予測対象とする
+    indices = [i for i, pl in enumerate(extended_pl_list) if pl["date"] > base_date]
+    if not indices:
+        return extended_bs_list
+
+    revenue = np.array([[extended_pl_list[i].get("revenue", 0) for i in indices]], dtype=np.float64)
+    net_income = np.array([[extended_pl_list[i].get("net_income", 0) for i in indices]], dtype=np.float64)
+    first = indices[0]
+    prev_revenue = extended_pl_list[first - 1]["revenue"] if first > 0 else revenue[0, 0]
+
+    # 1シナリオ分の配列演算として予測（forecast_bs_batch）
+    drivers = prepare_bs_drivers(pl_list, bs_list, returns_list)
+    forecast = forecast_bs_batch(
+        drivers, revenue, net_income, prev_revenue,
+        ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef
+    )
+    dates = forecast_dates(base_date, len(indices))
+
+    extended_bs_list.extend(batch_to_records(forecast, BS_FORECAST_FIELDS, dates))
     return extended_bs_list
 
 
+@timed()
 def forecast_cf_from_pl_bs_nopat_nwc(extended_pl_list, extended_bs_list, extended_nopat_list, extended_nwc_list):
     """
     将来予測されたPL・BS・NOPAT・NWCに基づき、フリー・キャッシュ・フロー（FCF）を算出する
@@ -256,41 +136,24 @@ def forecast_cf_from_pl_bs_nopat_nwc(extended_pl_list, extended_bs_list, extende
     - 投資活動によるCF：有形固定資産と無形固定資産の差分
     - FCF（フリーキャッシュフロー）：営業CF + 投資CF
     """
-    extended_cf_list = []
-
-    for i in range(len(extended_pl_list)):
-        pl = extended_pl_list[i]
-        bs = extended_bs_list[i]
-        nopat_data = extended_nopat_list[i]
-        nwc_data = extended_nwc_list[i]
-        date = pl["date"]
-
-        nopat = nopat_data.get("nopat", 0)
-        depreciation = pl.get("depreciation_amortization", 0)
-
-        # ΔNWC
-        delta_nwc = 0
-        if i > 0:
-            delta_nwc = nwc_data["nwc"] - extended_nwc_list[i - 1]["nwc"]
-
-        # CapEx = 有形固定資産と無形固定資産の差分
-        capex = 0
-        if i > 0:
-            ppe_investment = bs["ppe"] - extended_bs_list[i - 1]["ppe"]
-            intangible_investment = bs["intangible_assets"] - extended_bs_list[i - 1]["intangible_assets"]
-            capex =  ppe_investment + intangible_investment
-
-        # FCF = NOPAT + 減価償却費 - ΔNWC - CapEx
-        fcf = nopat + depreciation - delta_nwc - capex
-
-        extended_cf_list.append({
-            "date": date,
-            "nopat": nopat,
-            "depreciation": depreciation,
-            "delta_nwc": delta_nwc,
-            "capex": capex,
-            "fcf": fcf
-        })
-
-    return extended_cf_list
-
+    extended_pl_list = as_records(extended_pl_list)
+    extended_bs_list = as_records(extended_bs_list)
+    extended_nopat_list = as_records(extended_nopat_list)
+    extended_nwc_list = as_records(extended_nwc_list)
+
+    n = len(extended_pl_list)
+
+    def column(data_list, key, default=None):
+        return np.array([[data_list[i].get(key, default) for i in range(n)]], dtype=np.float64)
+
+    # 1シナリオ分の配列演算として計算（forecast_cf_batch）
+    cf = forecast_cf_batch(
+        column(extended_nopat_list, "nopat", 0),
+        column(extended_pl_list, "depreciation_amortization", 0),
+        column(extended_nwc_list, "nwc"),
+        column(extended_bs_list, "ppe"),
+        column(extended_bs_list, "intangible_assets"),
+    )
+    dates = [pl["date"] for pl in extended_pl_list]
+
+    return batch_to_records(cf, CF_FIELDS, dates)
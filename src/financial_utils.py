@@ -1,64 +1,105 @@
+import numpy as np
+
+from src.statements import Statements
+from src.instrumentation import timed
+
+# PL項目名とFMPのincome-statementのキーの対応
+INCOME_STATEMENT_FIELDS = {
+    "revenue": "revenue",
+    "cost_of_revenue": "costOfRevenue",
+    "sg_and_a": "sellingGeneralAndAdministrativeExpenses",
+    "depreciation_amortization": "depreciationAndAmortization",
+    "operating_income": "operatingIncome",
+    "interest_income": "interestIncome",
+    "interest_expense": "interestExpense",
+    "other_non_operating": "totalOtherIncomeExpensesNet",
+    "income_before_tax": "incomeBeforeTax",
+    "income_tax": "incomeTaxExpense",
+    "net_income": "netIncome",
+}
+
+# BS項目名とFMPのbalance-sheet-statementのキーの対応（float は定数）
+BALANCE_SHEET_FIELDS = {
+    "cash_and_equivalents": "cashAndCashEquivalents",
+    "short_term_investments": "shortTermInvestments",
+    "net_receivables": "netReceivables",
+    "inventory": "inventory",
+    "other_current_assets": "otherCurrentAssets",
+    "ppe": "propertyPlantEquipmentNet",
+    "long_term_investments": "longTermInvestments",
+    "intangible_assets": "intangibleAssets",
+    "other_noncurrent_assets": "otherNonCurrentAssets",
+    "total_assets": "totalAssets",
+    "short_term_debt": "shortTermDebt",
+    "accounts_payable": "accountPayables",
+    "deferred_revenue": "deferredRevenue",
+    "other_current_liabilities": "otherCurrentLiabilities",
+    "long_term_debt": "longTermDebt",
+    "other_noncurrent_liabilities": "otherNonCurrentLiabilities",
+    "total_liabilities": "totalLiabilities",
+    "common_stock": "commonStock",
+    "retained_earnings": "retainedEarnings",
+    "aoci": "accumulatedOtherComprehensiveIncomeLoss",
+    "capital_surplus": 0.0,
+    "total_equity": "totalStockholdersEquity",
+}
+
+# 株主還元項目名とFMPのcash-flow-statementのキーの対応
+RETURNS_FIELDS = {
+    "dividends_paid": "dividendsPaid",
+    "stock_buyback": "commonStockRepurchased",
+}
+
+
+def _extract_fields(year_data, field_map):
+    return {
+        name: source if isinstance(source, float) else year_data.get(source)
+        for name, source in field_map.items()
+    }
+
+
 # FMPのincome-statementデータから主要PL項目を抽出してリストで返す
-def reconstruct_income_statement(income_statement_data):
+# columnar=True の場合は Statements（列指向）で返す
+@timed()
+def reconstruct_income_statement(income_statement_data, columnar=False):
+    if columnar:
+        return Statements.from_source(income_statement_data, INCOME_STATEMENT_FIELDS)
+
     pl_list = []
 
     for year_data in income_statement_data:
-        pl = {
-            "date": year_data.get("date"),
-            "revenue": year_data.get("revenue"),
-            "cost_of_revenue": year_data.get("costOfRevenue"),
-            "sg_and_a": year_data.get("sellingGeneralAndAdministrativeExpenses"),
-            "depreciation_amortization": year_data.get("depreciationAndAmortization"),
-            "operating_income": year_data.get("operatingIncome"),
-            "interest_income": year_data.get("interestIncome"),
-            "interest_expense": year_data.get("interestExpense"),
-            "other_non_operating": year_data.get("totalOtherIncomeExpensesNet"),
-            "income_before_tax": year_data.get("incomeBeforeTax"),
-            "income_tax": year_data.get("incomeTaxExpense"),
-            "net_income": year_data.get("netIncome"),
-        }
+        pl = {"date": year_data.get("date"), **_extract_fields(year_data, INCOME_STATEMENT_FIELDS)}
         pl_list.append(pl)
     pl_list = sorted(pl_list, key=lambda x: x["date"])
     return pl_list
 
 
 # FMPのbalance-sheet-statementデータから主要BS項目を抽出してリストで返す
-def reconstruct_balance_sheet(balance_sheet_data):
+# columnar=True の場合は Statements（列指向）で返す
+@timed()
+def reconstruct_balance_sheet(balance_sheet_data, columnar=False):
+    if columnar:
+        return Statements.from_source(balance_sheet_data, BALANCE_SHEET_FIELDS)
+
     bs_list = []
 
     for year_data in balance_sheet_data:
-        bs = {
-            "date": year_data.get("date"),
-            "cash_and_equivalents": year_data.get("cashAndCashEquivalents"),
-            "short_term_investments": year_data.get("shortTermInvestments"),
-            "net_receivables": year_data.get("netReceivables"),
-            "inventory": year_data.get("inventory"),
-            "other_current_assets": year_data.get("otherCurrentAssets"),
-            "ppe": year_data.get("propertyPlantEquipmentNet"),
-            "long_term_investments": year_data.get("longTermInvestments"),
-            "intangible_assets": year_data.get("intangibleAssets"),
-            "other_noncurrent_assets": year_data.get("otherNonCurrentAssets"),
-            "total_assets": year_data.get("totalAssets"),
-            "short_term_debt": year_data.get("shortTermDebt"),
-            "accounts_payable": year_data.get("accountPayables"),
-            "deferred_revenue": year_data.get("deferredRevenue"),
-            "other_current_liabilities": year_data.get("otherCurrentLiabilities"),
-            "long_term_debt": year_data.get("longTermDebt"),
-            "other_noncurrent_liabilities": year_data.get("otherNonCurrentLiabilities"),
-            "total_liabilities": year_data.get("totalLiabilities"),
-            "common_stock": year_data.get("commonStock"),
-            "retained_earnings": year_data.get("retainedEarnings"),
-            "aoci" :year_data.get("accumulatedOtherComprehensiveIncomeLoss"),
-            "capital_surplus": 0.0,
-            "total_equity": year_data.get("totalStockholdersEquity"),
-        }
+        bs = {"date": year_data.get("date"), **_extract_fields(year_data, BALANCE_SHEET_FIELDS)}
         bs_list.append(bs)
     
     bs_list = sorted(bs_list, key=lambda x: x["date"])
     return bs_list
 
 ## FMPのcashflow-satatebentデータから配当と自社株買いの情報を抽出する
-def extract_returns_from_cf(cashflow_data):
+# columnar=True の場合は Statements（列指向）で返す
+@timed()
+def extract_returns_from_cf(cashflow_data, columnar=False):
+    if columnar:
+        return Statements.from_source(
+            cashflow_data, RETURNS_FIELDS,
+            transforms={name: abs for name in RETURNS_FIELDS}
+        )
+
     returns_list = []
 
     for item in cashflow_data:
@@ -73,7 +114,11 @@ def extract_returns_from_cf(cashflow_data):
 
 
 #  再構成済みPLのリストからNOPATを計算してリストで返す
+@timed()
 def compute_nopat_from_pl(pl_list):
+    if isinstance(pl_list, Statements):
+        return _compute_nopat_columnar(pl_list)
+
     nopat_list = []
 
     for year_data in pl_list:
@@ -115,7 +160,11 @@ def compute_nopat_from_pl(pl_list):
 
 
 # 再構成済みのBSのリストから正味運転資本（Net Working Capital, NWC）を計算してリストで返す
+@timed()
 def compute_nwc_from_bs(bs_list):
+    if isinstance(bs_list, Statements):
+        return _compute_nwc_columnar(bs_list)
+
     nwc_list = []
 
     for year_data in bs_list:
@@ -152,7 +201,19 @@ def compute_nwc_from_bs(bs_list):
 
 
 # 再構成済みのBSのリストから投下資本（Incested Capital, IC）を計算してリストで返す
+@timed()
 def compute_invested_capital_from_bs(bs_list):
+    if isinstance(bs_list, Statements):
+        short_term_debt = bs_list["short_term_debt"]
+        long_term_debt = bs_list["long_term_debt"]
+        total_equity = bs_list["total_equity"]
+        return bs_list.with_columns({
+            "short_term_debt": short_term_debt,
+            "long_term_debt": long_term_debt,
+            "total_equity": total_equity,
+            "invested_capital": short_term_debt + long_term_debt + total_equity,
+        })
+
     ic_list = []
 
     for bs in bs_list:
@@ -176,7 +237,11 @@ def compute_invested_capital_from_bs(bs_list):
 
 
 # 各種財務諸表を算出してリストで返す
+@timed()
 def compute_financial_ratios_from_pl_bs_nopat_nwc_ic(pl_list, bs_list, nopat_list, nwc_list, ic_list):
+    if isinstance(pl_list, Statements):
+        return _compute_financial_ratios_columnar(pl_list, bs_list, nopat_list, nwc_list, ic_list)
+
     ratios_list = []
 
     for pl, bs, nopat, nwc, ic in zip(pl_list, bs_list, nopat_list,  nwc_list, ic_list):
@@ -222,8 +287,84 @@ def compute_financial_ratios_from_pl_bs_nopat_nwc_ic(pl_list, bs_list, nopat_lis
     return ratios_list
 
 
-def reconstruct_market_data(profile_data, risk_free_rate, market_risk_premium):
-    item = profile_data[0]
+def _compute_nopat_columnar(pl):
+    income_tax = pl["income_tax"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        effective_tax_rate = income_tax / pl["income_before_tax"]
+    tax_on_operating_income = (
+        income_tax
+        - effective_tax_rate * pl["interest_income"]
+        + effective_tax_rate * pl["interest_expense"]
+        - effective_tax_rate * pl["other_non_operating"]
+    )
+    return pl.with_columns({
+        "revenue": pl["revenue"],
+        "operating_income": pl["operating_income"],
+        "income_tax": income_tax,
+        "effective_tax_rate": effective_tax_rate,
+        "tax_on_operating_income": tax_on_operating_income,
+        "nopat": pl["operating_income"] - tax_on_operating_income,
+    })
+
+
+def _compute_nwc_columnar(bs):
+    columns = {
+        name: bs[name] for name in (
+            "net_receivables", "inventory", "other_current_assets",
+            "accounts_payable", "deferred_revenue", "other_current_liabilities",
+        )
+    }
+    columns["nwc"] = (
+        columns["net_receivables"] + columns["inventory"] + columns["other_current_assets"]
+        - columns["accounts_payable"] - columns["deferred_revenue"] - columns["other_current_liabilities"]
+    )
+    return bs.with_columns(columns)
+
+
+def _compute_financial_ratios_columnar(pl, bs, nopat, nwc, ic):
+    # zip と同様に先頭から短い方の年数に揃える
+    n = min(len(pl), len(bs), len(nopat), len(nwc), len(ic))
+    pl, bs, nopat, nwc, ic = pl[:n], bs[:n], nopat[:n], nwc[:n], ic[:n]
+
+    revenue = pl["revenue"]
+    invested_capital = ic["invested_capital"]
+    nwc_values = nwc["nwc"]
+    ppe = bs["ppe"]
+    intangible_assets = bs["intangible_assets"]
+    other_invested_capital = invested_capital - (nwc_values + ppe + intangible_assets)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return pl.with_columns({
+            "pre_tax_roic": pl["operating_income"] / invested_capital,
+            "roic": nopat["nopat"] / invested_capital,
+            "roe": pl["net_income"] / bs["total_equity"],
+            "roa": pl["net_income"] / bs["total_assets"],
+            "operating_margin": pl["operating_income"] / revenue,
+            "cost_ratio": pl["cost_of_revenue"] / revenue,
+            "sg_and_a_ratio": pl["sg_and_a"] / revenue,
+            "capital_turnover": revenue / invested_capital,
+            "nwc_days": 365 * nwc_values / revenue,
+            "ppe_days": 365 * ppe / revenue,
+            "intangible_days": 365 * intangible_assets / revenue,
+            "other_capital_days": 365 * other_invested_capital / revenue,
+        })
+
+
+@timed()
+def reconstruct_market_data(profile_data, risk_free_rate, market_risk_premium, ticker=None):
+    """
+    FMPのプロフィールから株価・ベータ・発行済株式数を取り出す。
+
+    profile_data が複数銘柄をまとめて取得したレスポンス（fetch_profiles_bulk）の場合は、
+    ticker で対象の銘柄を指定する。
+    """
+    if ticker is None:
+        item = profile_data[0]
+    else:
+        symbol = ticker.upper()
+        item = next((p for p in profile_data if str(p.get("symbol", "")).upper() == symbol), None)
+        if item is None:
+            raise KeyError(f"プロフィールに {ticker} が含まれていません")
 
     price = float(item.get("price"))
     beta = float(item.get("beta"))
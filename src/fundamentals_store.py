@@ -0,0 +1,273 @@
+"""
+財務諸表のローカルストア（SQLite）と差分同期
+
+FMPの年次財務諸表（income / balance / cash-flow）を (ticker, statement, date) をキーに1期1行で保存する。
+差分同期では、保存済みの最新の決算日から経過した期間分だけを limit で要求し、
+最新の決算日から1期（period_days）が経過していない銘柄はリクエスト自体を省略する。
+
+    store = FundamentalsStore()
+    sync_company(store, "AAPL")
+    history = build_history_from_store(store, "AAPL")   # src.pipeline
+"""
+import json
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from pathlib import Path
+
+from src.instrumentation import timed
+
+DEFAULT_STORE_PATH = Path(os.environ.get(
+    "FMP_STORE_PATH", Path.home() / ".cache" / "dcf-app" / "fundamentals.sqlite3"))
+STATEMENTS = ("income-statement", "balance-sheet-statement", "cash-flow-statement")
+DEFAULT_LIMIT = 10
+PERIOD_DAYS = 365  # 年次決算の間隔
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS statements (
+    ticker     TEXT NOT NULL,
+    statement  TEXT NOT NULL,
+    date       TEXT NOT NULL,
+    payload    TEXT NOT NULL,  -- FMPのレスポンスの1期分（JSON）
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (ticker, statement, date)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_statements_statement_date ON statements (statement, date);
+CREATE TABLE IF NOT EXISTS sync_state (
+    ticker     TEXT NOT NULL,
+    statement  TEXT NOT NULL,
+    synced_at  REAL NOT NULL,
+    PRIMARY KEY (ticker, statement)
+) WITHOUT ROWID;
+"""
+
+
+class FundamentalsStore:
+    """
+    財務諸表のSQLiteストア。接続はスレッドごとに作る（WALモードで複数プロセスからの読み書きも可能）。
+
+    Parameters:
+        path (str or Path): データベースファイル（":memory:" はテスト用で、スレッド間では共有されない）
+    """
+
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = str(path)
+        if self.path != ":memory:":
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.executescript(_SCHEMA)
+            self._local.conn = conn
+        return conn
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    @timed()
+    def upsert(self, rows, fetched_at=None):
+        """
+        財務諸表をまとめて追加・更新する（1トランザクション）。内容が変わらない行は書き換えない。
+
+        Parameters:
+            rows (Iterable[Tuple[str, str, dict]]): (ticker, statement, FMPのレスポンスの1期分)
+            fetched_at (float or None): 取得時刻（UNIX時間、既定は現在時刻）
+
+        Returns:
+            int: 追加・更新した行数
+        """
+        fetched_at = time.time() if fetched_at is None else fetched_at
+        records = [
+            (ticker.upper(), statement, item["date"], json.dumps(item, sort_keys=True), fetched_at)
+            for ticker, statement, item in rows if item.get("date")
+        ]
+        conn = self._connect()
+        with conn:
+            before = conn.total_changes
+            conn.executemany(
+                """
+                INSERT INTO statements (ticker, statement, date, payload, fetched_at)
+                VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (ticker, statement, date) DO UPDATE
+                SET payload = excluded.payload, fetched_at = excluded.fetched_at
+                WHERE statements.payload != excluded.payload
+                """,
+                records,
+            )
+            return conn.total_changes - before
+
+    def mark_synced(self, ticker, statement, synced_at=None):
+        conn = self._connect()
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sync_state (ticker, statement, synced_at) VALUES (?, ?, ?)",
+                (ticker.upper(), statement, time.time() if synced_at is None else synced_at),
+            )
+
+    def latest_date(self, ticker, statement):
+        row = self._connect().execute(
+            "SELECT MAX(date) FROM statements WHERE ticker = ? AND statement = ?",
+            (ticker.upper(), statement),
+        ).fetchone()
+        return row[0]
+
+    def latest_dates(self, statement):
+        """全銘柄の最新の決算日 {ticker: date} を返す"""
+        rows = self._connect().execute(
+            "SELECT ticker, MAX(date) FROM statements WHERE statement = ? GROUP BY ticker", (statement,)
+        )
+        return dict(rows.fetchall())
+
+    def get_statements(self, ticker, statement, limit=DEFAULT_LIMIT):
+        """
+        保存済みの財務諸表を FMP のレスポンスと同じ形式（日付の降順の dict のリスト）で返す。
+        reconstruct_* にそのまま渡せる。
+        """
+        rows = self._connect().execute(
+            "SELECT payload FROM statements WHERE ticker = ? AND statement = ? ORDER BY date DESC LIMIT ?",
+            (ticker.upper(), statement, -1 if limit is None else limit),
+        )
+        return [json.loads(payload) for (payload,) in rows]
+
+    def tickers(self):
+        return [row[0] for row in self._connect().execute("SELECT DISTINCT ticker FROM statements ORDER BY ticker")]
+
+    def get_stats(self):
+        conn = self._connect()
+        n_rows, n_tickers = conn.execute("SELECT COUNT(*), COUNT(DISTINCT ticker) FROM statements").fetchone()
+        size = os.path.getsize(self.path) if self.path != ":memory:" and os.path.exists(self.path) else 0
+        return {"rows": n_rows, "tickers": n_tickers, "size_bytes": size}
+
+
+def plan_request_limit(latest_date, full_limit=DEFAULT_LIMIT, today=None, period_days=PERIOD_DAYS):
+    """
+    差分同期で要求する期数を返す。
+
+    - 未保存の場合は full_limit
+    - 最新の決算日から1期が経過していない場合は 0（新しい決算は存在しないため取得しない）
+    - それ以外は経過期数 + 1（最新期の修正再表示も取り込む）。full_limit を上限とする
+    """
+    if latest_date is None:
+        return full_limit
+    today = today or date.today()
+    elapsed_days = (today - datetime.strptime(latest_date[:10], "%Y-%m-%d").date()).days
+    if elapsed_days < period_days:
+        return 0
+    return min(full_limit, elapsed_days // period_days + 1)
+
+
+def sync_company(store, ticker, full_limit=DEFAULT_LIMIT, force=False, today=None, timeout=None, lane="batch"):
+    """
+    1銘柄の財務諸表を差分同期する。
+
+    Parameters:
+        store (FundamentalsStore): 保存先
+        ticker (str): ティッカー
+        full_limit (int): 初回・全件取得時の期数
+        force (bool): True の場合は保存済みの有無にかかわらず full_limit 期分を取得する
+        today (date or None): 経過期間の基準日（既定は今日）
+        lane (str): レート制限の優先度
+
+    Returns:
+        dict: {statement: {"requested": 要求した期数（0 は省略）, "received": 受信した期数, "written": 追加・更新した行数}}
+    """
+    from src.data_fetchers import _fetch_json
+
+    report = {}
+    for statement in STATEMENTS:
+        latest = None if force else store.latest_date(ticker, statement)
+        limit = plan_request_limit(latest, full_limit, today=today)
+        if limit == 0:
+            report[statement] = {"requested": 0, "received": 0, "written": 0}
+            continue
+
+        items = _fetch_json(statement, ticker, limit, timeout=timeout, use_cache=False, lane=lane)
+        if not isinstance(items, list):
+            raise ValueError(f"{statement}/{ticker} の応答が不正です: {items!r}"[:200])
+
+        # 受信した全期が保存済みより新しい場合は間が抜けている可能性があるため、全件を取り直す
+        if latest is not None and limit < full_limit and len(items) == limit and all(
+                item.get("date", "") > latest for item in items):
+            limit = full_limit
+            items = _fetch_json(statement, ticker, limit, timeout=timeout, use_cache=False, lane=lane)
+
+        written = store.upsert((ticker, statement, item) for item in items)
+        store.mark_synced(ticker, statement)
+        report[statement] = {"requested": limit, "received": len(items), "written": written}
+    return report
+
+
+@timed()
+def sync_universe(store, tickers, full_limit=DEFAULT_LIMIT, max_workers=8, force=False, today=None):
+    """
+    複数銘柄を並行して差分同期する。失敗した銘柄は errors に記録して続行する。
+
+    Returns:
+        dict: {"tickers", "requests", "skipped_requests", "rows_received", "rows_written", "errors": {ticker: str}}
+    """
+    summary = {"tickers": 0, "requests": 0, "skipped_requests": 0,
+               "rows_received": 0, "rows_written": 0, "errors": {}}
+
+    def run(ticker):
+        try:
+            return ticker, sync_company(store, ticker, full_limit=full_limit, force=force, today=today), None
+        except Exception as e:
+            return ticker, None, e
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for ticker, report, error in executor.map(run, tickers):
+            summary["tickers"] += 1
+            if error is not None:
+                summary["errors"][ticker] = f"{type(error).__name__}: {error}"
+                continue
+            for result in report.values():
+                if result["requested"]:
+                    summary["requests"] += 1
+                else:
+                    summary["skipped_requests"] += 1
+                summary["rows_received"] += result["received"]
+                summary["rows_written"] += result["written"]
+    return summary
+
+
+def main(argv=None):
+    import argparse
+
+    from src.batch import read_tickers
+
+    parser = argparse.ArgumentParser(description="財務諸表のローカルストアの差分同期")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sync_parser = sub.add_parser("sync", help="銘柄リストの財務諸表を差分同期する")
+    sync_parser.add_argument("tickers", help="銘柄リストのファイル（1行1銘柄、'-' で標準入力）")
+    sync_parser.add_argument("--path", default=str(DEFAULT_STORE_PATH))
+    sync_parser.add_argument("--limit", type=int, default=DEFAULT_LIMIT, help="初回・全件取得時の期数")
+    sync_parser.add_argument("--workers", type=int, default=8, help="FMPへの同時アクセス数")
+    sync_parser.add_argument("--force", action="store_true", help="保存済みの銘柄も全件を取り直す")
+    stats_parser = sub.add_parser("stats", help="保存済みの行数・銘柄数を表示する")
+    stats_parser.add_argument("--path", default=str(DEFAULT_STORE_PATH))
+    args = parser.parse_args(argv)
+
+    store = FundamentalsStore(args.path)
+    if args.command == "stats":
+        print(json.dumps(store.get_stats(), indent=2))
+        return 0
+
+    summary = sync_universe(store, read_tickers(args.tickers), full_limit=args.limit,
+                            max_workers=args.workers, force=args.force)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,139 @@
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.instrumentation import record
+
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def parse_retry_after(value):
+    """
+    Retry-After ヘッダ（秒数 または HTTP日付）を待機秒数に変換する。解釈できなければ None。
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class PooledSession:
+    """
+    keep-alive の接続プールを共有する HTTP セッション。
+
+    429 / 5xx と接続エラーに対して、ジッター付き指数バックオフで再試行する。
+    Retry-After ヘッダがあればその秒数（backoff_max を上限）だけ待機する。
+
+    Parameters:
+        pool_connections (int): ホストごとにキャッシュする接続プール数
+        pool_maxsize (int): 1プールあたりの最大接続数（並行リクエスト数に合わせる）
+        max_retries (int): 最大再試行回数
+        backoff_base (float): バックオフの基準秒数（base * 2**attempt を上限に一様乱数）
+        backoff_max (float): 1回あたりの最大待機秒数
+        timeout (float): 1リクエストあたりの既定タイムアウト（秒）
+        rate_limiter (RateLimiter or None): 再試行を含む各リクエストの前にトークンを取得するレート制限
+    """
+
+    def __init__(self, pool_connections=4, pool_maxsize=16, max_retries=3,
+                 backoff_base=0.5, backoff_max=30.0, timeout=10.0, rate_limiter=None):
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+
+        self._session = requests.Session()
+        self._adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self._session.mount("https://", self._adapter)
+        self._session.mount("http://", self._adapter)
+
+        self._lock = threading.Lock()
+        self._counters = {"requests": 0, "retries": 0, "retry_after_honored": 0, "failures": 0}
+
+    def _count(self, name, n=1):
+        with self._lock:
+            self._counters[name] += n
+
+    def _backoff_delay(self, attempt, response=None):
+        if response is not None:
+            retry_after = parse_retry_after(response.headers.get("Retry-After"))
+            if retry_after is not None:
+                self._count("retry_after_honored")
+                return min(retry_after, self.backoff_max)
+        # full jitter
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def get(self, url, params=None, timeout=None, lane="interactive"):
+        """
+        GET リクエストを送信する。再試行しても 429 / 5xx の場合は最後のレスポンスを返す。
+
+        lane はレート制限の優先度（"interactive" / "batch" / "background"）。
+        interactive のリクエストは、レート制限の待機が timeout 秒を超える場合に RateLimitTimeout を送出する
+        （画面操作を長く止めない。batch / background は取得できるまで待機する）。
+        """
+        timeout = timeout if timeout is not None else self.timeout
+        acquire_timeout = timeout if lane == "interactive" else None
+
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter is not None:
+                record("fetch.rate_limit_wait", self.rate_limiter.acquire(lane, timeout=acquire_timeout))
+            self._count("requests")
+            try:
+                response = self._session.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+                self._count("retries")
+                time.sleep(self._backoff_delay(attempt))
+                continue
+
+            if response.status_code not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                if response.status_code in RETRY_STATUS_CODES:
+                    self._count("failures")
+                return response
+
+            self._count("retries")
+            delay = self._backoff_delay(attempt, response)
+            if response.status_code == 429 and self.rate_limiter is not None:
+                # 他のプロセスも含めて、サーバーの指定する間はリクエストを止める
+                self.rate_limiter.block(delay)
+            response.close()
+            time.sleep(delay)
+
+    def get_stats(self):
+        """
+        リクエスト・再試行の回数と、urllib3 の接続プールから集計した接続の再利用状況を返す。
+        """
+        with self._lock:
+            stats = dict(self._counters)
+
+        connections_opened = 0
+        pooled_requests = 0
+        pools = self._adapter.poolmanager.pools
+        for key in list(pools.keys()):
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            connections_opened += pool.num_connections
+            pooled_requests += pool.num_requests
+
+        stats["connections_opened"] = connections_opened
+        stats["connections_reused"] = max(0, pooled_requests - connections_opened)
+        return stats
+
+    def close(self):
+        self._session.close()
@@ -0,0 +1,206 @@
+"""
+処理時間・呼び出し回数・取得バイト数を段階（stage）ごとに記録する計測レイヤー
+
+既定では無効で、環境変数 DCF_INSTRUMENT=1（cProfile / tracemalloc も取得する場合は
+DCF_INSTRUMENT=profile）または enable() で有効化する。無効時は記録処理を行わない。
+
+    from src.instrumentation import stage, timed
+
+    @timed("forecast.pl")
+    def forecast_pl_from_growth(...): ...
+
+    with stage("fetch.income"):
+        ...
+"""
+import functools
+import io
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_mode = os.environ.get("DCF_INSTRUMENT", "").strip().lower()
+_enabled = _mode not in ("", "0", "false", "off")
+_profile_enabled = _mode == "profile"
+
+_lock = threading.Lock()
+# cProfile のプロファイラ・tracemalloc はプロセス内で同時に1つしか使えないため、capture() は同時に1つだけ計測する
+_capture_lock = threading.Lock()
+_stages = {}
+_profiles = []
+_MAX_PROFILES = 20
+
+
+def enable(profile=False):
+    """計測を有効化する（profile=True で capture() による cProfile / tracemalloc も有効化）"""
+    global _enabled, _profile_enabled
+    _enabled = True
+    _profile_enabled = profile
+
+
+def disable():
+    global _enabled, _profile_enabled
+    _enabled = False
+    _profile_enabled = False
+
+
+def is_enabled():
+    return _enabled
+
+
+def is_profile_enabled():
+    return _profile_enabled
+
+
+def reset():
+    with _lock:
+        _stages.clear()
+        _profiles.clear()
+
+
+def _stage_entry(name):
+    entry = _stages.get(name)
+    if entry is None:
+        entry = _stages[name] = {"calls": 0, "total_sec": 0.0, "max_sec": 0.0, "bytes": 0, "errors": 0}
+    return entry
+
+
+def record(name, elapsed, nbytes=0, error=False):
+    """段階 name の1回分の計測値を記録する"""
+    if not _enabled:
+        return
+    with _lock:
+        entry = _stage_entry(name)
+        entry["calls"] += 1
+        entry["total_sec"] += elapsed
+        entry["max_sec"] = max(entry["max_sec"], elapsed)
+        entry["bytes"] += nbytes
+        entry["errors"] += int(error)
+
+
+def record_bytes(name, nbytes):
+    """段階 name で取得したバイト数を加算する（呼び出し回数・時間は変えない）"""
+    if not _enabled:
+        return
+    with _lock:
+        _stage_entry(name)["bytes"] += nbytes
+
+
+@contextmanager
+def stage(name):
+    """with ブロックの処理時間を段階 name として記録する"""
+    if not _enabled:
+        yield
+        return
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        record(name, time.perf_counter() - start, error=error)
+
+
+def timed(name=None):
+    """関数の処理時間を段階 name（省略時は モジュール名.関数名）として記録するデコレーター"""
+    def decorator(func):
+        stage_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            error = False
+            try:
+                return func(*args, **kwargs)
+            except BaseException:
+                error = True
+                raise
+            finally:
+                record(stage_name, time.perf_counter() - start, error=error)
+
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def capture(label, top=25):
+    """
+    with ブロックを cProfile と tracemalloc で計測し、結果を snapshot()["profiles"] に保存する。
+    profile モードでない場合は何もしない。cProfile は呼び出したスレッドのみが対象。
+    他のセッション（スレッド）が計測中の場合は計測せず、"{label}.capture_skipped" の呼び出し回数だけ記録する。
+    """
+    if not _profile_enabled:
+        yield
+        return
+    if not _capture_lock.acquire(blocking=False):
+        record(f"{label}.capture_skipped", 0.0)
+        yield
+        return
+    try:
+        with _capture(label, top):
+            yield
+    finally:
+        _capture_lock.release()
+
+
+@contextmanager
+def _capture(label, top):
+    import cProfile
+    import pstats
+    import tracemalloc
+
+    profiler = cProfile.Profile()
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        current, peak = tracemalloc.get_traced_memory()
+        top_allocations = [
+            str(stat) for stat in tracemalloc.take_snapshot().statistics("lineno")[:10]
+        ]
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+        buffer = io.StringIO()
+        pstats.Stats(profiler, stream=buffer).sort_stats("cumulative").print_stats(top)
+
+        with _lock:
+            _profiles.append({
+                "label": label,
+                "timestamp": time.time(),
+                "memory_current_bytes": current,
+                "memory_peak_bytes": peak,
+                "top_allocations": top_allocations,
+                "cprofile": buffer.getvalue(),
+            })
+            del _profiles[:-_MAX_PROFILES]
+
+
+def snapshot():
+    """記録済みの計測値を dict で返す"""
+    with _lock:
+        stages = {
+            name: {**entry, "avg_sec": entry["total_sec"] / entry["calls"] if entry["calls"] else 0.0}
+            for name, entry in _stages.items()
+        }
+        profiles = list(_profiles)
+    return {"enabled": _enabled, "stages": stages, "profiles": profiles}
+
+
+def export_json(path=None, indent=2):
+    """計測値を JSON 文字列で返す（path を指定した場合はファイルにも書き出す）"""
+    text = json.dumps(snapshot(), indent=indent, ensure_ascii=False)
+    if path is not None:
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+    return text
@@ -0,0 +1,171 @@
+import numpy as np
+
+from src.statements import as_records
+from src.batch_forecasting import prepare_pl_drivers, forecast_statements_batch
+from src.dcf import compute_dcf_valuation_paths
+from src.instrumentation import timed
+
+# サンプリング対象のドライバー
+DRIVERS = (
+    "revenue_growth", "cost_ratio", "sga_ratio",
+    "ppe_growth_coef", "intangible_growth_coef", "wacc", "perpetual_growth_rate",
+)
+
+
+def sample_distribution(spec, size, rng):
+    """
+    分布の指定から乱数を生成する。
+
+    Parameters:
+        spec (float or tuple): 定数、または以下のタプル
+            ("fixed", value)
+            ("normal", mean, std)
+            ("uniform", low, high)
+            ("triangular", low, mode, high)
+            ("lognormal", mean, sigma)  ※ 対数の平均・標準偏差
+            ("truncnormal", mean, std, low, high)  ※ 範囲外は端に丸める
+        size (int or tuple): 生成する個数
+        rng (np.random.Generator): 乱数生成器
+
+    Returns:
+        np.ndarray: 乱数
+    """
+    if isinstance(spec, (int, float)):
+        return np.full(size, float(spec))
+
+    kind, *params = spec
+    if kind == "fixed":
+        return np.full(size, float(params[0]))
+    if kind == "normal":
+        return rng.normal(params[0], params[1], size)
+    if kind == "uniform":
+        return rng.uniform(params[0], params[1], size)
+    if kind == "triangular":
+        return rng.triangular(params[0], params[1], params[2], size)
+    if kind == "lognormal":
+        return rng.lognormal(params[0], params[1], size)
+    if kind == "truncnormal":
+        return np.clip(rng.normal(params[0], params[1], size), params[2], params[3])
+    raise ValueError(f"未対応の分布です: {kind}")
+
+
+def default_distributions(drivers, base_wacc, perpetual_growth_rate=0.02):
+    """
+    過去実績（prepare_pl_drivers の戻り値）と基準WACCを中心とした既定の分布を返す。
+    """
+    return {
+        "revenue_growth": ("normal", drivers["revenue_growth"], 0.03),
+        "cost_ratio": ("truncnormal", drivers["cost_ratio"], 0.01, 0.0, 1.0),
+        "sga_ratio": ("truncnormal", drivers["sga_ratio"], 0.01, 0.0, 1.0),
+        "ppe_growth_coef": ("uniform", 0.25, 0.75),
+        "intangible_growth_coef": ("uniform", 0.25, 0.75),
+        "wacc": ("normal", base_wacc, 0.01),
+        "perpetual_growth_rate": ("truncnormal", perpetual_growth_rate, 0.005, -0.02, base_wacc - 0.005),
+    }
+
+
+@timed()
+def run_monte_carlo(pl_list, bs_list, returns_list, market_data, base_wacc,
+                    n_paths=100_000, distributions=None, perpetual_growth_rate=0.02,
+                    years=10, decay_factor=0.95, growth_volatility=0.0,
+                    percentiles=(5, 25, 50, 75, 95), seed=None):
+    """
+    予測ドライバーを確率分布からサンプリングし、企業価値・理論株価の分布を求める。
+
+    各パスの売上高成長率は「サンプリングした成長率 × decay_factor ** 年」に、
+    年ごとの独立なノイズ（標準偏差 growth_volatility）を加えたものとする。
+    企業価値は予測期間（years 年）のFCFを compute_dcf_valuation と同じ式で割り引いて算出する。
+
+    Parameters:
+        pl_list, bs_list, returns_list: 過去の財務データ（List[dict] または Statements）
+        market_data (dict): reconstruct_market_data の戻り値
+        base_wacc (float): 既定分布の中心とするWACC
+        n_paths (int): パス数
+        distributions (dict or None): ドライバーごとの分布（DRIVERS のキー、sample_distribution の形式）。
+            指定のないドライバーは default_distributions の値を使う
+        perpetual_growth_rate (float): 既定分布の中心とする永久成長率
+        years (int): 予測年数
+        decay_factor (float): 売上高成長率の年ごとの減衰率
+        growth_volatility (float): 年ごとの売上高成長率ノイズの標準偏差
+        percentiles (Tuple[float]): 集計するパーセンタイル
+        seed (int or None): 乱数シード
+
+    Returns:
+        dict: {
+            "fcf": np.ndarray (パス数, 年数),
+            "enterprise_value": np.ndarray (パス数,),
+            "fair_share_price": np.ndarray (パス数,),
+            "samples": dict（ドライバーごとのサンプル）,
+            "summary": dict（平均・標準偏差・パーセンタイル・上振れ確率・無効パス数）
+        }
+    """
+    rng = np.random.default_rng(seed)
+    pl_list = as_records(pl_list)
+    bs_list = as_records(bs_list)
+    drivers = prepare_pl_drivers(pl_list)
+    specs = {**default_distributions(drivers, base_wacc, perpetual_growth_rate), **(distributions or {})}
+
+    unknown = set(specs) - set(DRIVERS)
+    if unknown:
+        raise ValueError(f"未対応のドライバーです: {sorted(unknown)}")
+
+    samples = {name: sample_distribution(specs[name], n_paths, rng) for name in DRIVERS}
+
+    growth_matrix = samples["revenue_growth"][:, None] * decay_factor ** np.arange(years)
+    if growth_volatility:
+        growth_matrix = growth_matrix + rng.normal(0.0, growth_volatility, (n_paths, years))
+
+    # パス × 年のFCFマトリクス（三表予測を全パス一括で計算）
+    forecast = forecast_statements_batch(
+        pl_list, bs_list, returns_list, growth_matrix,
+        ppe_growth_coef=samples["ppe_growth_coef"],
+        intangible_growth_coef=samples["intangible_growth_coef"],
+        cost_ratio=samples["cost_ratio"], sga_ratio=samples["sga_ratio"],
+    )
+    fcf = forecast["cf"]["fcf"]
+    enterprise_value = compute_dcf_valuation_paths(
+        fcf, samples["wacc"], samples["perpetual_growth_rate"], terminal_year=years
+    )
+
+    # 理論株価（compute_fair_share_price_from_bs と同じ式）
+    latest_bs = bs_list[-1]
+    net_debt = (
+        (latest_bs.get("short_term_debt") or 0.0) + (latest_bs.get("long_term_debt") or 0.0)
+        - (latest_bs.get("cash_and_equivalents") or 0.0)
+    )
+    shares_outstanding = market_data["shares_outstanding"]
+    if not shares_outstanding:
+        raise ValueError("BSデータまたは株式数が不正です")
+    fair_share_price = (enterprise_value - net_debt) / shares_outstanding
+
+    return {
+        "fcf": fcf,
+        "enterprise_value": enterprise_value,
+        "fair_share_price": fair_share_price,
+        "samples": samples,
+        "summary": summarize_distribution(
+            enterprise_value, fair_share_price, market_data.get("price"), percentiles
+        ),
+    }
+
+
+def summarize_distribution(enterprise_value, fair_share_price, current_price=None,
+                           percentiles=(5, 25, 50, 75, 95)):
+    """企業価値・理論株価の分布の要約統計量を返す（NaN のパスは除外）"""
+    valid = ~np.isnan(enterprise_value)
+    summary = {"n_paths": int(enterprise_value.size), "n_invalid": int((~valid).sum())}
+
+    for name, values in (("enterprise_value", enterprise_value[valid]),
+                         ("fair_share_price", fair_share_price[valid])):
+        if values.size == 0:
+            summary[name] = None
+            continue
+        summary[name] = {
+            "mean": float(values.mean()),
+            "std": float(values.std()),
+            "percentiles": dict(zip(percentiles, np.percentile(values, percentiles).tolist())),
+        }
+
+    if current_price and valid.any():
+        summary["prob_above_market"] = float(np.mean(fair_share_price[valid] > current_price))
+    return summary
@@ -0,0 +1,214 @@
+import numpy as np
+
+from src.utils import average_growth, to_dataframe
+from src.statements import Statements
+from src.financial_utils import (
+    reconstruct_income_statement,
+    reconstruct_balance_sheet,
+    extract_returns_from_cf,
+    compute_nopat_from_pl,
+    compute_nwc_from_bs,
+    compute_invested_capital_from_bs,
+    compute_financial_ratios_from_pl_bs_nopat_nwc_ic,
+    reconstruct_market_data,
+)
+from src.financial_forcasting import (
+    forecast_pl_from_growth,
+    forecast_bs_from_pl,
+    forecast_cf_from_pl_bs_nopat_nwc,
+)
+from src.compute_wacc import CapitalStructure
+from src.dcf import compute_dcf_valuation, compute_fair_share_price_from_bs
+from src.instrumentation import timed
+
+# ダッシュボード（main.py）の既定値
+DEFAULT_RISK_FREE_RATE = 0.04
+DEFAULT_MARKET_RISK_PREMIUM = 0.055
+DEFAULT_PERPETUAL_GROWTH_RATE = 0.02
+DEFAULT_GROWTH_COEF = 0.5
+SCENARIO_GROWTH_MULTIPLIERS = [0.75, 1.0, 1.25]  # Downside / Normal / Upside
+DECAY_FACTOR = 0.95
+FORECAST_YEARS = 10
+
+
+def build_history(income_raw, balance_raw, cf_raw, columnar=False):
+    """
+    FMPのレスポンスから過去の財務データ一式を再構成する。
+    columnar=True の場合は各データを Statements（列指向）で返す。
+
+    Returns:
+        dict: pl_list, bs_list, returns_list, nopat_list, nwc_list
+    """
+    pl_list = reconstruct_income_statement(income_raw, columnar=columnar)
+    bs_list = reconstruct_balance_sheet(balance_raw, columnar=columnar)
+    returns_list = extract_returns_from_cf(cf_raw, columnar=columnar)
+
+    return {
+        "pl_list": pl_list,
+        "bs_list": bs_list,
+        "returns_list": returns_list,
+        "nopat_list": compute_nopat_from_pl(pl_list),
+        "nwc_list": compute_nwc_from_bs(bs_list),
+    }
+
+
+def build_history_from_store(store, ticker, limit=10, columnar=False):
+    """
+    ローカルストア（src.fundamentals_store.FundamentalsStore）の財務諸表から過去の財務データ一式を再構成する。
+    FMPへはアクセスしない。
+
+    Returns:
+        dict: build_history と同じ
+    """
+    return build_history(
+        store.get_statements(ticker, "income-statement", limit),
+        store.get_statements(ticker, "balance-sheet-statement", limit),
+        store.get_statements(ticker, "cash-flow-statement", limit),
+        columnar=columnar,
+    )
+
+
+def derive_history_metrics(pl_list, bs_list):
+    """
+    過去のPL・BSから NOPAT・NWC・投下資本・財務指標を算出する。
+
+    Returns:
+        dict: nopat_list, nwc_list, ic_list, ratios_list
+    """
+    nopat_list = compute_nopat_from_pl(pl_list)
+    nwc_list = compute_nwc_from_bs(bs_list)
+    ic_list = compute_invested_capital_from_bs(bs_list)
+    ratios_list = compute_financial_ratios_from_pl_bs_nopat_nwc_ic(pl_list, bs_list, nopat_list, nwc_list, ic_list)
+
+    return {
+        "nopat_list": nopat_list,
+        "nwc_list": nwc_list,
+        "ic_list": ic_list,
+        "ratios_list": ratios_list,
+    }
+
+
+def build_history_frames(pl_list, bs_list):
+    """
+    derive_history_metrics の結果に、PL・BS・各指標を日付で結合した DataFrame（df_combined）を加えて返す。
+    """
+    metrics = derive_history_metrics(pl_list, bs_list)
+
+    df_combined = to_dataframe(pl_list) \
+        .join(to_dataframe(bs_list), how="outer", rsuffix="_bs") \
+        .join(to_dataframe(metrics["nopat_list"]), how="outer", rsuffix="_nopat") \
+        .join(to_dataframe(metrics["nwc_list"]), how="outer", rsuffix="_nwc") \
+        .join(to_dataframe(metrics["ic_list"]), how="outer", rsuffix="_ic") \
+        .join(to_dataframe(metrics["ratios_list"]), how="outer", rsuffix="_ratios")
+    df_combined.sort_index(inplace=True)
+
+    return {**metrics, "df_combined": df_combined}
+
+
+def compute_cost_of_capital(pl_list, bs_list, nopat_list, market_data, capital_structure=None):
+    """
+    株主資本コスト・負債コスト・WACCを算出する。
+    capital_structure（CapitalStructure）を渡した場合は、資本構成・税率の再計算を省略する。
+
+    Returns:
+        Tuple[float, float, float]: (株主資本コスト, 負債コスト, WACC)
+    """
+    if capital_structure is None:
+        capital_structure = CapitalStructure.from_history(pl_list, bs_list, nopat_list)
+    costs = capital_structure.costs(
+        market_data["risk_free_rate"], market_data["market_risk_premium"], beta=market_data["beta"]
+    )
+    cost_of_debt = float(costs["cost_of_debt"])
+    if np.isnan(cost_of_debt):
+        raise ValueError("直近の有効な有利子負債データが存在しません")
+    return float(costs["cost_of_equity"]), cost_of_debt, float(costs["wacc"])
+
+
+def default_growth_rates(pl_list, multiplier=1.0, decay_factor=DECAY_FACTOR, years=FORECAST_YEARS):
+    """
+    過去の平均売上高成長率 × シナリオ倍率を年ごとに減衰させた成長率リストを返す。
+    """
+    base_growth = average_growth(pl_list, "revenue")
+    return [base_growth * multiplier * (decay_factor ** i) for i in range(years)]
+
+
+def forecast_scenario(pl_list, bs_list, returns_list, growth_rates,
+                      ppe_growth_coef=DEFAULT_GROWTH_COEF, intangible_growth_coef=DEFAULT_GROWTH_COEF):
+    """
+    1シナリオ分の PL → BS → NOPAT → NWC → CF の予測を行う。
+
+    Returns:
+        dict: pl_list, bs_list, nopat_list, nwc_list, cf_list（いずれも実績＋予測）
+    """
+    extended_pl_list = forecast_pl_from_growth(pl_list, growth_rates)
+    extended_bs_list = forecast_bs_from_pl(
+        extended_pl_list, pl_list, bs_list, returns_list,
+        ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef
+    )
+    extended_nopat_list = compute_nopat_from_pl(extended_pl_list)
+    extended_nwc_list = compute_nwc_from_bs(extended_bs_list)
+    extended_cf_list = forecast_cf_from_pl_bs_nopat_nwc(
+        extended_pl_list, extended_bs_list, extended_nopat_list, extended_nwc_list
+    )
+
+    return {
+        "pl_list": extended_pl_list,
+        "bs_list": extended_bs_list,
+        "nopat_list": extended_nopat_list,
+        "nwc_list": extended_nwc_list,
+        "cf_list": extended_cf_list,
+    }
+
+
+def compact_scenario(scenario, keys=("pl_list", "bs_list", "cf_list")):
+    """
+    forecast_scenario の結果のうち keys を Statements（列指向）に変換して返す。
+    セッションに保持する場合、List[dict] の数分の1のサイズになる。
+    """
+    return {key: Statements.from_records(scenario[key]) for key in keys}
+
+
+@timed()
+def value_company(income_raw, balance_raw, cf_raw, profile_raw,
+                  risk_free_rate=DEFAULT_RISK_FREE_RATE,
+                  market_risk_premium=DEFAULT_MARKET_RISK_PREMIUM,
+                  perpetual_growth_rate=DEFAULT_PERPETUAL_GROWTH_RATE,
+                  growth_multiplier=1.0,
+                  ppe_growth_coef=DEFAULT_GROWTH_COEF,
+                  intangible_growth_coef=DEFAULT_GROWTH_COEF):
+    """
+    FMPのレスポンス一式から、ダッシュボードと同じ手順でDCF評価を行う。
+
+    Returns:
+        dict: compute_fair_share_price_from_bs の結果に、WACC・資本コスト・前提条件を加えたもの
+    """
+    history = build_history(income_raw, balance_raw, cf_raw)
+    pl_list = history["pl_list"]
+    bs_list = history["bs_list"]
+
+    growth_rates = default_growth_rates(pl_list, multiplier=growth_multiplier)
+    scenario = forecast_scenario(
+        pl_list, bs_list, history["returns_list"], growth_rates,
+        ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef
+    )
+
+    market_data = reconstruct_market_data(
+        profile_raw, risk_free_rate=risk_free_rate, market_risk_premium=market_risk_premium
+    )
+    cost_of_equity, cost_of_debt, wacc = compute_cost_of_capital(
+        pl_list, bs_list, history["nopat_list"], market_data
+    )
+
+    # 割り引くのは予測期間のFCFのみ（cf_list の先頭は実績）
+    enterprise_value = compute_dcf_valuation(scenario["cf_list"][len(pl_list):], wacc, perpetual_growth_rate)
+    result = compute_fair_share_price_from_bs(enterprise_value, bs_list, market_data)
+
+    result.update({
+        "cost_of_equity": cost_of_equity,
+        "cost_of_debt": cost_of_debt,
+        "wacc": wacc,
+        "perpetual_growth_rate": perpetual_growth_rate,
+        "base_revenue_growth": average_growth(pl_list, "revenue"),
+        "beta": market_data["beta"],
+    })
+    return result
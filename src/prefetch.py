@@ -0,0 +1,211 @@
+"""
+検索候補・ウォッチリストの銘柄の財務データの先読み
+
+ユーザーが検索結果から銘柄を選ぶ前に、候補の財務諸表・プロフィールをバックグラウンドで取得し、
+再構成した過去の財務データを history_store（セッション間で共有）に保持しておく。
+選択後は history_store とディスクキャッシュ（プロフィール）から読み込むだけになる。
+
+- 取得はレート制限の background レーンで行い、画面操作のリクエストより後回しにする
+- 先読みの対象は要求元（owner、セッションの検索候補・ウォッチリストなど）ごとに置き換える。
+  どの要求元からも外れた銘柄の先読みは、開始前であれば取り消す
+- 実行中の取得は中断せず、結果は保持する。同じ銘柄を画面から開いた場合は、実行中のリクエストの結果を共有する
+- 取得に失敗した銘柄は、一定時間（FAILURE_RETRY_INTERVAL）先読みし直さない
+
+    prefetcher.request(f"{session_id}:search", ["AAPL", "APLE", ...])
+    prefetcher.request(f"{session_id}:watchlist", ["MSFT", "NVDA"])
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.data_fetchers import fetch_company_bundle
+from src.financial_utils import reconstruct_income_statement, reconstruct_balance_sheet, extract_returns_from_cf
+from src.instrumentation import stage
+from src.shared_cache import history_store
+
+DEFAULT_MAX_WORKERS = int(os.environ.get("DCF_PREFETCH_WORKERS", 2))
+DEFAULT_MAX_PENDING = 32  # 取得待ち・実行中の銘柄数の上限（超えた分は先読みしない）
+DEFAULT_WATCHLIST = os.environ.get("DCF_WATCHLIST", "")
+FAILURE_RETRY_INTERVAL = 5 * 60  # 取得に失敗した銘柄を先読みし直すまでの秒数
+
+
+class PrefetchCancelled(Exception):
+    """先読みが取り消された場合の例外（Prefetcher の内部でのみ使う）"""
+
+
+def parse_watchlist(text):
+    """カンマ・空白区切りのティッカーを重複を除いて大文字のリストにする"""
+    tickers = []
+    for token in text.replace(",", " ").split():
+        ticker = token.strip().upper()
+        if ticker and ticker not in tickers:
+            tickers.append(ticker)
+    return tickers
+
+
+class _Job:
+    __slots__ = ("ticker", "future", "cancelled")
+
+    def __init__(self, ticker):
+        self.ticker = ticker
+        self.future = None
+        self.cancelled = threading.Event()
+
+
+class Prefetcher:
+    """
+    銘柄の財務データを上限付きのスレッドプールで先読みし、history_store に保持する（プロセス内で共有）。
+
+    Parameters:
+        max_workers (int): 同時に先読みする銘柄数
+        max_pending (int): 取得待ち・実行中の銘柄数の上限
+        limit (int): 財務諸表の取得年数
+        lane (str): レート制限の優先度
+        store (HistoryStore): 先読みした過去の財務データの保持先
+    """
+
+    def __init__(self, max_workers=DEFAULT_MAX_WORKERS, max_pending=DEFAULT_MAX_PENDING, limit=10,
+                 lane="background", store=history_store):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.limit = limit
+        self.lane = lane
+        self.store = store
+        self._executor = None
+        self._lock = threading.RLock()  # cancel()・add_done_callback から _finish が同じスレッドで呼ばれる場合がある
+        self._jobs = {}  # ticker -> _Job（取得待ち・実行中）
+        self._wanted = {}  # owner -> List[ticker]（取得待ち・実行中の銘柄のみ）
+        self._failures = {}  # ticker -> 取得に失敗した時刻
+        self.stats = {"requested": 0, "submitted": 0, "completed": 0, "already_cached": 0,
+                      "cancelled": 0, "failed": 0, "dropped": 0, "recently_failed": 0}
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="prefetch")
+        return self._executor
+
+    def request(self, owner, tickers):
+        """
+        owner の先読み対象を tickers（優先度の高い順）に置き換える。
+        保持済みの銘柄・最近取得に失敗した銘柄は取得せず、どの owner の対象からも外れた銘柄の先読みは取り消す。
+
+        Returns:
+            List[str]: 新たに先読みを開始した銘柄
+        """
+        tickers = [t.upper() for t in tickers if t]
+        submitted = []
+        now = time.time()
+        with self._lock:
+            if tickers:
+                self._wanted[owner] = tickers
+            else:
+                self._wanted.pop(owner, None)
+            self.stats["requested"] += len(tickers)
+            self._cancel_unwanted()
+            self._failures = {t: failed_at for t, failed_at in self._failures.items()
+                              if now - failed_at < FAILURE_RETRY_INTERVAL}
+
+            for ticker in tickers:
+                existing = self._jobs.get(ticker)
+                if existing is not None and not existing.cancelled.is_set():
+                    continue
+                if self.store.contains(ticker, self.limit):
+                    self.stats["already_cached"] += 1
+                    continue
+                if ticker in self._failures:
+                    self.stats["recently_failed"] += 1
+                    continue
+                # 中断を指示済みで実行中のものは、新しい先読みで置き換える
+                if existing is None and len(self._jobs) >= self.max_pending:
+                    self.stats["dropped"] += 1
+                    continue
+                job = self._jobs[ticker] = _Job(ticker)
+                job.future = self._get_executor().submit(self._run, job)
+                job.future.add_done_callback(lambda _, job=job: self._finish(job))
+                self.stats["submitted"] += 1
+                submitted.append(ticker)
+
+            # 先読みしない銘柄（保持済み・失敗・上限超過）と既に完了した銘柄は、_finish で取り除かれないため
+            # ここで対象から外しておく
+            kept = [ticker for ticker in tickers if ticker in self._jobs]
+            if kept:
+                self._wanted[owner] = kept
+            else:
+                self._wanted.pop(owner, None)
+        return submitted
+
+    def _cancel_unwanted(self):
+        wanted = {ticker for tickers in self._wanted.values() for ticker in tickers}
+        for ticker, job in list(self._jobs.items()):
+            if ticker not in wanted and not job.cancelled.is_set():
+                job.cancelled.set()
+                job.future.cancel()  # 開始前であれば取り消す
+
+    def _run(self, job):
+        if job.cancelled.is_set():
+            raise PrefetchCancelled(job.ticker)
+        if self.store.contains(job.ticker, self.limit):
+            return "already_cached"
+
+        with stage("prefetch.fetch"):
+            bundle = fetch_company_bundle(job.ticker, self.limit, lane=self.lane)
+        bundle.raise_for_errors()
+
+        # 取得済みの結果は取り消された場合も保持する（画面から同じ銘柄を開いたセッションが待っている場合がある）
+        self.store.get_or_load(job.ticker, lambda: {
+            "pl_list": reconstruct_income_statement(bundle.income),
+            "bs_list": reconstruct_balance_sheet(bundle.balance),
+            "returns_list": extract_returns_from_cf(bundle.cash_flow),
+        }, self.limit)
+        return "completed"
+
+    def _finish(self, job):
+        with self._lock:
+            # 取り消し後に request() で置き換えられた古い先読みの場合、_wanted は新しい先読みのものなので変更しない
+            if self._jobs.get(job.ticker) is job:
+                del self._jobs[job.ticker]
+                for owner in list(self._wanted):
+                    remaining = [t for t in self._wanted[owner] if t != job.ticker]
+                    if remaining:
+                        self._wanted[owner] = remaining
+                    else:
+                        del self._wanted[owner]
+
+            if job.future.cancelled():
+                self.stats["cancelled"] += 1
+                return
+            error = job.future.exception()
+            if isinstance(error, PrefetchCancelled):
+                self.stats["cancelled"] += 1
+            elif error is not None:
+                self.stats["failed"] += 1  # 画面から開いた場合に改めて取得し、エラーを表示する
+                self._failures[job.ticker] = time.time()
+            else:
+                self.stats[job.future.result()] += 1
+
+    def status(self, ticker):
+        """"pending" / "running" / "cached" / None（先読みしていない）を返す"""
+        ticker = ticker.upper()
+        with self._lock:
+            job = self._jobs.get(ticker)
+        if job is not None:
+            return "running" if job.future.running() else "pending"
+        return "cached" if self.store.contains(ticker, self.limit) else None
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "inflight": len(self._jobs), "owners": len(self._wanted),
+                    "failures": len(self._failures)}
+
+    def shutdown(self, wait=True):
+        """全ての先読みを取り消し、スレッドプールを終了する"""
+        with self._lock:
+            self._wanted.clear()
+            self._cancel_unwanted()
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,260 @@
+"""
+FMPへのリクエストのプロセス間で共有するレート制限（トークンバケット）
+
+バケットの状態（残りトークン・最終更新時刻・待機中のリクエスト）は小さなJSONファイルに保存し、
+ファイルロック（fcntl.flock）で排他制御する。同じAPIキーを使う Streamlit のワーカー・バッチ処理の
+全プロセスが1つのバケットを共有するため、合計のリクエスト数がプランの上限を超えない。
+
+優先度の異なるレーン（interactive > batch > background）を持ち、
+- 優先度の高いレーンで待機中のリクエストがある間、低いレーンはトークンを取得しない
+- 低いレーンは容量の reserve_fraction 分のトークンを残して取得する（画面操作の分を空けておく）
+
+fcntl が使えない環境（Windows）ではプロセス内でのみ共有する。
+
+    limiter = RateLimiter.for_plan("starter", name="fmp-...")
+    waited = limiter.acquire("interactive")
+"""
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+# FMPのプランごとの上限（リクエスト数, 秒）。None は制限なし
+PLAN_LIMITS = {
+    "basic": (250, 24 * 60 * 60),
+    "starter": (300, 60),
+    "premium": (750, 60),
+    "ultimate": (3000, 60),
+    "unlimited": None,
+}
+DEFAULT_PLAN = "unlimited"  # プランはAPIキーごとに異なるため、既定では制限しない（FMP_PLAN で指定する）
+LANES = {"interactive": 0, "batch": 1, "background": 2}  # 値が小さいほど優先
+DEFAULT_STATE_DIR = Path(os.environ.get(
+    "FMP_RATE_LIMIT_DIR", Path.home() / ".cache" / "dcf-app" / "ratelimit"))
+
+SAFETY_FACTOR = 0.9  # 補充速度を上限の90%に抑え、バースト分と合わせても期間内の上限を超えないようにする
+BURST_SECONDS = 5.0  # バケット容量（補充速度の何秒分か）
+LONG_WINDOW_SECONDS = 60 * 60  # これより長い期間の上限（1日あたりなど）は、容量を上限の回数から決める
+WAITER_TTL = 2.0  # 待機中の登録の有効期限（秒）。異常終了したプロセスの登録は自然に消える
+MAX_SLEEP = 0.5  # 1回あたりの最大待機秒数（優先度の高い待機の解消を検知するため短く区切る）
+_WAIT_SAMPLES = 2048  # レーンごとに保持する待機時間のサンプル数
+
+
+class RateLimitTimeout(TimeoutError):
+    """acquire の timeout までにトークンを取得できなかった場合の例外"""
+
+
+def parse_limit(value):
+    """
+    "300/60"（リクエスト数/秒）またはプラン名をレート制限の設定に変換する。制限なしの場合は None。
+    """
+    value = value.strip().lower()
+    if value in PLAN_LIMITS:
+        return PLAN_LIMITS[value]
+    try:
+        calls, period = value.split("/")
+        return int(calls), float(period)
+    except ValueError:
+        raise ValueError(f"レート制限の指定が不正です（プラン名 {sorted(PLAN_LIMITS)} または '300/60' 形式）: {value!r}")
+
+
+class RateLimiter:
+    """
+    ファイルロックでプロセス間に共有するトークンバケット。
+
+    Parameters:
+        rate (float): 1秒あたりの補充トークン数
+        capacity (float): バケット容量（バースト許容量）
+        name (str): 共有するバケットの名前（同じ名前・state_dir のプロセス間で共有）
+        state_dir (str or Path): 状態ファイルの保存先
+        reserve_fraction (float): 優先度の低いレーンが残しておく容量の割合
+    """
+
+    def __init__(self, rate, capacity, name="fmp", state_dir=DEFAULT_STATE_DIR, reserve_fraction=0.2):
+        if rate <= 0 or capacity < 1:
+            raise ValueError("rate は正、capacity は1以上を指定してください")
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.name = name
+        self.reserve_fraction = reserve_fraction
+        self.path = Path(state_dir) / f"{name}.json"
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        self._local_lock = threading.Lock()
+        self._local_state = None  # fcntl が使えない場合のプロセス内の状態
+        self._stats_lock = threading.Lock()
+        self._stats = {lane: self._empty_lane_stats() for lane in LANES}
+        self._waits = {lane: deque(maxlen=_WAIT_SAMPLES) for lane in LANES}
+
+    @classmethod
+    def for_plan(cls, plan=DEFAULT_PLAN, name="fmp", **kwargs):
+        """
+        プラン名または "リクエスト数/秒" から RateLimiter を作る。制限なしのプランでは None を返す。
+        """
+        limit = parse_limit(plan)
+        if limit is None:
+            return None
+        calls, period = limit
+        rate = calls / period * SAFETY_FACTOR
+        # 補充速度 × 期間 + 容量 ≤ 上限 となるよう、容量は上限の (1 - SAFETY_FACTOR) 以下に抑える。
+        # 1日あたりの上限などでは補充速度の BURST_SECONDS 秒分が1回未満になり、銘柄を1つ開くだけで
+        # 数分〜数十分待つことになるため、上限の (1 - SAFETY_FACTOR) をそのまま容量にする
+        if period > LONG_WINDOW_SECONDS:
+            capacity = max(1.0, calls * (1 - SAFETY_FACTOR))
+        else:
+            capacity = max(1.0, min(rate * BURST_SECONDS, calls * (1 - SAFETY_FACTOR)))
+        return cls(rate, capacity, name=name, **kwargs)
+
+    @staticmethod
+    def _empty_lane_stats():
+        return {"acquired": 0, "waited": 0, "wait_total_sec": 0.0, "wait_max_sec": 0.0, "timeouts": 0}
+
+    # --- 共有状態の読み書き ---------------------------------------------------
+
+    def _initial_state(self, now):
+        return {"tokens": self.capacity, "updated": now, "blocked_until": 0.0, "waiters": {}}
+
+    def _update(self, func):
+        """
+        ロックを取得して状態を読み込み、func(state, now) で更新して書き戻す。func の戻り値を返す。
+        """
+        with self._local_lock:
+            if fcntl is None:
+                now = time.time()
+                if self._local_state is None:
+                    self._local_state = self._initial_state(now)
+                return func(self._local_state, now)
+
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                raw = os.read(fd, 1 << 16)
+                now = time.time()  # プロセス間で比較するため壁時計を使う
+                try:
+                    state = json.loads(raw) if raw else self._initial_state(now)
+                except ValueError:
+                    state = self._initial_state(now)
+                result = func(state, now)
+                data = json.dumps(state).encode("utf-8")
+                os.lseek(fd, 0, os.SEEK_SET)
+                os.ftruncate(fd, 0)
+                os.write(fd, data)
+                return result
+            finally:
+                os.close(fd)  # ロックも解放される
+
+    def _refill(self, state, now):
+        elapsed = max(0.0, now - state["updated"])
+        state["tokens"] = min(self.capacity, state["tokens"] + elapsed * self.rate)
+        state["updated"] = now
+        # 期限切れの待機登録を削除
+        state["waiters"] = {key: expires for key, expires in state["waiters"].items() if expires > now}
+
+    def _try_acquire(self, lane, waiter_key):
+        priority = LANES[lane]
+        # 容量が1に近い場合も低いレーンが取得できるよう、残しておく量は capacity - 1 までとする
+        reserve = 0.0 if priority == 0 else min(self.capacity * self.reserve_fraction, self.capacity - 1.0)
+
+        def update(state, now):
+            self._refill(state, now)
+            if now < state["blocked_until"]:
+                delay = state["blocked_until"] - now
+            elif any(LANES.get(key.split(":", 1)[0], 0) < priority for key in state["waiters"]):
+                delay = 1.0 / self.rate  # 優先度の高いレーンが待機中
+            elif state["tokens"] >= 1.0 + reserve:
+                state["tokens"] -= 1.0
+                state["waiters"].pop(waiter_key, None)
+                return 0.0
+            else:
+                delay = (1.0 + reserve - state["tokens"]) / self.rate
+            delay = min(max(delay, 0.001), MAX_SLEEP)
+            state["waiters"][waiter_key] = now + delay + WAITER_TTL
+            return delay
+
+        return self._update(update)
+
+    # --- 公開API --------------------------------------------------------------
+
+    def acquire(self, lane="interactive", timeout=None):
+        """
+        トークンを1つ取得する（取得できるまで待機する）。
+
+        Parameters:
+            lane (str): "interactive" / "batch" / "background"
+            timeout (float or None): 最大待機秒数。超過した場合は RateLimitTimeout
+
+        Returns:
+            float: 待機した秒数
+        """
+        if lane not in LANES:
+            raise ValueError(f"不明なレーンです: {lane!r}（{list(LANES)} のいずれか）")
+        waiter_key = f"{lane}:{os.getpid()}:{threading.get_ident()}"
+        start = time.perf_counter()
+        while True:
+            delay = self._try_acquire(lane, waiter_key)
+            waited = time.perf_counter() - start
+            if delay == 0.0:
+                self._record(lane, waited)
+                return waited
+            if timeout is not None and waited + delay > timeout:
+                self._update(lambda state, now: state["waiters"].pop(waiter_key, None))
+                with self._stats_lock:
+                    self._stats[lane]["timeouts"] += 1
+                raise RateLimitTimeout(f"レート制限の待機が {timeout} 秒を超えました（lane={lane}）")
+            time.sleep(delay)
+
+    def block(self, seconds):
+        """
+        全プロセスのリクエストを seconds 秒停止する（サーバーから 429 を受けた場合など）。
+        """
+        def update(state, now):
+            self._refill(state, now)
+            state["blocked_until"] = max(state["blocked_until"], now + seconds)
+            state["tokens"] = min(state["tokens"], 0.0)
+
+        self._update(update)
+
+    def _record(self, lane, waited):
+        with self._stats_lock:
+            stats = self._stats[lane]
+            stats["acquired"] += 1
+            if waited > 0.001:
+                stats["waited"] += 1
+            stats["wait_total_sec"] += waited
+            stats["wait_max_sec"] = max(stats["wait_max_sec"], waited)
+            self._waits[lane].append(waited)
+
+    def get_stats(self):
+        """
+        このプロセスでのレーンごとの取得数・待機時間（合計・最大・p50・p95）と、共有バケットの現在の状態を返す。
+        """
+        with self._stats_lock:
+            lanes = {}
+            for lane, stats in self._stats.items():
+                samples = sorted(self._waits[lane])
+                lanes[lane] = {
+                    **stats,
+                    "wait_p50_ms": samples[len(samples) // 2] * 1e3 if samples else 0.0,
+                    "wait_p95_ms": samples[int(len(samples) * 0.95)] * 1e3 if samples else 0.0,
+                }
+
+        def snapshot(state, now):
+            self._refill(state, now)
+            return {"tokens": state["tokens"], "waiters": len(state["waiters"]),
+                    "blocked_sec": max(0.0, state["blocked_until"] - now)}
+
+        return {"rate_per_sec": self.rate, "capacity": self.capacity, "shared": fcntl is not None,
+                "bucket": self._update(snapshot), "lanes": lanes}
+
+    def reset_stats(self):
+        with self._stats_lock:
+            self._stats = {lane: self._empty_lane_stats() for lane in LANES}
+            for samples in self._waits.values():
+                samples.clear()
@@ -0,0 +1,111 @@
+import hashlib
+import io
+import json
+import threading
+from collections import OrderedDict
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+
+def _update_hash(h, value):
+    """グラフの入力（DataFrame・配列・基本型）をハッシュに加える"""
+    import numpy as np
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        h.update(b"df")
+        h.update(json.dumps([str(c) for c in value.columns]).encode("utf-8"))
+        h.update(pd.util.hash_pandas_object(value, index=True).values.tobytes())
+    elif isinstance(value, np.ndarray):
+        h.update(b"nd" + str((value.dtype, value.shape)).encode("utf-8"))
+        h.update(np.ascontiguousarray(value).tobytes())
+    elif isinstance(value, dict):
+        h.update(b"{")
+        for k in sorted(value, key=str):
+            _update_hash(h, str(k))
+            _update_hash(h, value[k])
+        h.update(b"}")
+    elif isinstance(value, (list, tuple)):
+        h.update(b"[")
+        for v in value:
+            _update_hash(h, v)
+        h.update(b"]")
+    else:
+        h.update(repr(value).encode("utf-8"))
+        h.update(b"|")
+
+
+def make_render_key(*parts):
+    """描画データとスタイル設定からレンダーキャッシュのキーを作る"""
+    h = hashlib.sha256()
+    for part in parts:
+        _update_hash(h, part)
+    return h.hexdigest()
+
+
+class RenderCache:
+    """
+    描画済みグラフの画像バイト列を保持する、バイト数上限付きのLRUキャッシュ（プロセス内で共有）。
+
+    Parameters:
+        max_bytes (int): 保持する画像の合計サイズ上限（バイト）
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._total_bytes -= len(old)
+            self._entries[key] = data
+            self._total_bytes += len(data)
+
+            while self._total_bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._total_bytes -= len(evicted)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._total_bytes = 0
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._total_bytes}
+
+
+def figure_to_bytes(fig, image_format="png", dpi=200, max_width_px=1400):
+    """
+    Figure を画像バイト列に変換し、Figure を必ず閉じる。
+
+    Streamlit は表示幅（約1460px）を超える画像を表示のたびに縮小するため、
+    幅が max_width_px 以下になるよう解像度を下げて保存する。
+    """
+    import matplotlib.pyplot as plt
+
+    try:
+        dpi = min(dpi, max_width_px / fig.get_figwidth())
+        buffer = io.BytesIO()
+        fig.savefig(buffer, format=image_format, dpi=dpi, bbox_inches="tight")
+        return buffer.getvalue()
+    finally:
+        plt.close(fig)
@@ -0,0 +1,329 @@
+"""
+逆DCF：現在の株価を再現する永久成長率・WACC・売上高成長率（一定）を複数銘柄まとめて求める
+
+株価から目標の企業価値（時価総額 + 純有利子負債、compute_fair_share_price_from_bs の逆算）を求め、
+compute_dcf_valuation と同じ式の企業価値がそれに一致する値を、銘柄をベクトルとした
+区間付きニュートン法（区間外に出る・収束が遅い場合は二分法）で解く。
+"""
+import numpy as np
+
+from src.batch_forecasting import prepare_pl_drivers, prepare_bs_drivers, stack_drivers, forecast_from_drivers
+from src.dcf import compute_dcf_valuation_paths
+from src.instrumentation import timed
+
+# 解の状態（diagnostics["status"] の値）
+STATUS_CONVERGED = "converged"
+STATUS_MAX_ITER = "max_iter"
+STATUS_NO_BRACKET = "no_bracket"  # 探索区間の両端で目標との差の符号が同じ（解がない、または区間外）
+STATUS_INVALID = "invalid"        # 目標値や区間が NaN など
+
+# 永久成長率の上限を WACC からどれだけ離すか（g → WACC でターミナルバリューが発散するため）
+GROWTH_WACC_MARGIN = 1e-4
+
+
+def _rows(value, n):
+    return np.broadcast_to(np.asarray(value, dtype=np.float64).reshape(-1), (n,)).copy()
+
+
+def target_enterprise_value(bs_list, market_data):
+    """
+    現在の株価が前提とする企業価値を返す（compute_fair_share_price_from_bs の逆算）。
+
+    Returns:
+        dict: {"enterprise_value": float, "net_debt": float, "market_cap": float}
+    """
+    latest_bs = bs_list[-1]
+    net_debt = (latest_bs.get("short_term_debt", 0.0) + latest_bs.get("long_term_debt", 0.0)
+                - latest_bs.get("cash_and_equivalents", 0.0))
+    market_cap = (market_data.get("price") or 0.0) * market_data.get("shares_outstanding", 0.0)
+    return {
+        "enterprise_value": market_cap + net_debt,
+        "net_debt": net_debt,
+        "market_cap": market_cap,
+    }
+
+
+def find_brackets(func, target, lower, upper, n_points=16):
+    """
+    区間 [lower, upper] を n_points 点で走査し、目標との差の符号が最初に変わる小区間を行ごとに返す。
+
+    企業価値が単調でない場合（売上高成長率が高いほど設備投資が増えてFCFが減る場合など）に、
+    下限に最も近い解を囲む区間を選ぶために使う。符号が変わらない行は元の区間を返す。
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: 下限, 上限, 符号が変わった回数（複数解の目安）
+    """
+    lower = np.asarray(lower, dtype=np.float64).reshape(-1)
+    upper = np.asarray(upper, dtype=np.float64).reshape(-1)
+    target = np.asarray(target, dtype=np.float64).reshape(-1)
+    n = max(lower.size, upper.size, target.size)
+    lower, upper, target = _rows(lower, n), _rows(upper, n), _rows(target, n)
+
+    fractions = np.linspace(0.0, 1.0, n_points)
+    lo, hi = lower.copy(), upper.copy()
+    found = np.zeros(n, dtype=bool)
+    sign_changes = np.zeros(n, dtype=np.int64)
+    prev_x = prev_r = None
+    with np.errstate(all="ignore"):
+        for fraction in fractions:
+            x = lower + (upper - lower) * fraction
+            r = func(x)[0] - target
+            if prev_r is not None:
+                change = np.sign(prev_r) * np.sign(r) <= 0
+                first = change & ~found
+                lo = np.where(first, prev_x, lo)
+                hi = np.where(first, x, hi)
+                found |= change
+                sign_changes += change
+            prev_x, prev_r = x, r
+    return lo, hi, sign_changes
+
+
+@timed()
+def solve_bracketed(func, target, lower, upper, x0=None, rtol=1e-10, xtol=1e-12, max_iter=100):
+    """
+    func(x) = target となる x を、行ごとに独立に区間 [lower, upper] 内で解く（ベクトル化）。
+
+    各反復でニュートン法のステップを試し、区間外に出る場合または直前のステップの半分より
+    縮まない場合は二分法に切り替える（rtsafe）。func が導関数を返さない場合は区間両端の割線の傾きを使う。
+
+    Parameters:
+        func (callable): x (shape: (n,)) → (値, 導関数 または None)（いずれも shape: (n,)）
+        target (float or np.ndarray): 目標値
+        lower, upper (float or np.ndarray): 探索区間
+        x0 (float or np.ndarray or None): 初期値（None の場合は区間の中点）
+        rtol (float): |func(x) - target| ≤ rtol × max(|target|, 1) で収束とみなす
+        xtol (float): 区間幅が xtol 以下で収束とみなす
+        max_iter (int): 最大反復回数
+
+    Returns:
+        Tuple[np.ndarray, dict]: 解（収束しなかった行は NaN）と診断情報
+            {"status", "converged", "iterations", "newton_steps", "bisection_steps", "residual", "bracket_width"}
+    """
+    lower = np.asarray(lower, dtype=np.float64).reshape(-1)
+    upper = np.asarray(upper, dtype=np.float64).reshape(-1)
+    target = np.asarray(target, dtype=np.float64).reshape(-1)
+    n = max(lower.size, upper.size, target.size, 1 if x0 is None else np.size(x0))
+    lo, hi, target = _rows(lower, n), _rows(upper, n), _rows(target, n)
+    scale = np.maximum(np.abs(target), 1.0)
+
+    with np.errstate(all="ignore"):
+        f_lo = func(lo)[0] - target
+        f_hi = func(hi)[0] - target
+
+        invalid = ~(np.isfinite(lo) & np.isfinite(hi) & np.isfinite(target) & (lo < hi))
+        no_bracket = ~invalid & ~(np.sign(f_lo) * np.sign(f_hi) <= 0)
+        # 区間の端がそのまま解の場合
+        at_lo = ~invalid & (np.abs(f_lo) <= rtol * scale)
+        at_hi = ~invalid & ~at_lo & (np.abs(f_hi) <= rtol * scale)
+        no_bracket &= ~(at_lo | at_hi)
+
+        x = (lo + hi) / 2 if x0 is None else np.clip(_rows(x0, n), lo, hi)
+        fx, dfx = func(x)
+        r = fx - target
+
+    x = np.where(at_lo, lo, np.where(at_hi, hi, x))
+    r = np.where(at_lo, f_lo, np.where(at_hi, f_hi, r))
+    converged = at_lo | at_hi
+    active = ~(invalid | no_bracket | converged)
+    iterations = np.zeros(n, dtype=np.int64)
+    newton_steps = np.zeros(n, dtype=np.int64)
+    bisection_steps = np.zeros(n, dtype=np.int64)
+    prev_step = hi - lo
+
+    for _ in range(max_iter):
+        done = active & ((np.abs(r) <= rtol * scale) | (hi - lo <= xtol))
+        converged |= done
+        active &= ~done
+        if not active.any():
+            break
+
+        # 区間の更新：目標との差の符号が下端と同じなら下端を、そうでなければ上端を x に置き換える
+        same_as_lo = np.sign(r) == np.sign(f_lo)
+        lo, f_lo = np.where(active & same_as_lo, x, lo), np.where(active & same_as_lo, r, f_lo)
+        hi, f_hi = np.where(active & ~same_as_lo, x, hi), np.where(active & ~same_as_lo, r, f_hi)
+
+        with np.errstate(all="ignore"):
+            slope = dfx if dfx is not None else (f_hi - f_lo) / (hi - lo)
+            x_newton = x - r / slope
+            step = np.abs(x_newton - x)
+            use_newton = np.isfinite(x_newton) & (x_newton > lo) & (x_newton < hi) & (step <= 0.5 * prev_step)
+        x_next = np.where(use_newton, x_newton, (lo + hi) / 2)
+        prev_step = np.where(active, np.abs(x_next - x), prev_step)
+        x = np.where(active, x_next, x)
+
+        iterations += active
+        newton_steps += active & use_newton
+        bisection_steps += active & ~use_newton
+
+        with np.errstate(all="ignore"):
+            fx, dfx = func(x)
+        r = np.where(active, fx - target, r)
+
+    done = active & ((np.abs(r) <= rtol * scale) | (hi - lo <= xtol))
+    converged |= done
+
+    status = np.full(n, STATUS_MAX_ITER, dtype=object)
+    status[converged] = STATUS_CONVERGED
+    status[no_bracket] = STATUS_NO_BRACKET
+    status[invalid] = STATUS_INVALID
+
+    diagnostics = {
+        "status": status,
+        "converged": converged,
+        "iterations": iterations,
+        "newton_steps": newton_steps,
+        "bisection_steps": bisection_steps,
+        "residual": np.where(converged | active, r, np.nan),
+        "bracket_width": np.where(active | converged, hi - lo, np.nan),
+    }
+    return np.where(converged, x, np.nan), diagnostics
+
+
+def _dcf_value_and_derivative(fcf, wacc, growth, terminal_year, wrt):
+    """compute_dcf_valuation_paths の値と、wrt（"growth" または "wacc"）に関する導関数"""
+    value = compute_dcf_valuation_paths(fcf, wacc, growth, terminal_year=terminal_year)
+
+    final_fcf = fcf[:, -1]
+    spread = wacc - growth
+    tv_discount = (1 + wacc) ** -terminal_year
+    if wrt == "growth":
+        # d/dg [F (1+g)/(w-g)] = F (1+w)/(w-g)^2
+        derivative = final_fcf * tv_discount * (1 + wacc) / spread ** 2
+    else:
+        t = np.arange(1, fcf.shape[1] + 1, dtype=np.float64)
+        d_pv_fcf = -np.sum(t * fcf * (1 + wacc[:, None]) ** -(t + 1), axis=1)
+        d_terminal = final_fcf * (1 + growth) * tv_discount * (
+            -1 / spread ** 2 - terminal_year / (spread * (1 + wacc))
+        )
+        derivative = d_pv_fcf + d_terminal
+    return value, derivative
+
+
+def implied_perpetual_growth(fcf_matrix, target_ev, wacc, lower=-0.10, upper=None,
+                             terminal_year=10, **solver_kwargs):
+    """
+    企業価値が target_ev となる永久成長率を銘柄ごとに求める。
+
+    Parameters:
+        fcf_matrix (np.ndarray): FCF（shape: (銘柄数, 年数)、extract_fcf_array の行を積んだもの）
+        target_ev (float or np.ndarray): 目標の企業価値（target_enterprise_value）
+        wacc (float or np.ndarray): 銘柄ごとのWACC
+        lower (float): 探索区間の下限
+        upper (float or np.ndarray or None): 探索区間の上限（None の場合は WACC - GROWTH_WACC_MARGIN）
+        **solver_kwargs: solve_bracketed の引数（rtol, xtol, max_iter）
+
+    Returns:
+        Tuple[np.ndarray, dict]: 永久成長率と診断情報（solve_bracketed を参照）
+    """
+    fcf = np.atleast_2d(np.asarray(fcf_matrix, dtype=np.float64))
+    n = fcf.shape[0]
+    wacc = _rows(wacc, n)
+    upper = wacc - GROWTH_WACC_MARGIN if upper is None else np.minimum(_rows(upper, n), wacc - GROWTH_WACC_MARGIN)
+
+    def func(growth):
+        return _dcf_value_and_derivative(fcf, wacc, growth, terminal_year, "growth")
+
+    return solve_bracketed(func, target_ev, _rows(lower, n), upper, **solver_kwargs)
+
+
+def implied_wacc(fcf_matrix, target_ev, perpetual_growth_rate, lower=None, upper=0.50,
+                 terminal_year=10, scan_points=16, **solver_kwargs):
+    """
+    企業価値が target_ev となるWACCを銘柄ごとに求める。
+
+    Parameters:
+        fcf_matrix (np.ndarray): FCF（shape: (銘柄数, 年数)）
+        target_ev (float or np.ndarray): 目標の企業価値
+        perpetual_growth_rate (float or np.ndarray): 銘柄ごとの永久成長率
+        lower (float or np.ndarray or None): 探索区間の下限（None の場合は g + GROWTH_WACC_MARGIN）
+        upper (float): 探索区間の上限
+        scan_points (int): 解を囲む区間を探す走査点数（FCFに負の年があると企業価値が単調にならないため、0 で走査しない）
+        **solver_kwargs: solve_bracketed の引数
+
+    Returns:
+        Tuple[np.ndarray, dict]: WACCと診断情報（"sign_changes" を含む）
+    """
+    fcf = np.atleast_2d(np.asarray(fcf_matrix, dtype=np.float64))
+    n = fcf.shape[0]
+    growth = _rows(perpetual_growth_rate, n)
+    min_wacc = growth + GROWTH_WACC_MARGIN
+    lower = min_wacc if lower is None else np.maximum(_rows(lower, n), min_wacc)
+
+    def func(wacc):
+        return _dcf_value_and_derivative(fcf, wacc, growth, terminal_year, "wacc")
+
+    return _solve_with_scan(func, target_ev, lower, _rows(upper, n), scan_points, solver_kwargs)
+
+
+def _solve_with_scan(func, target, lower, upper, scan_points, solver_kwargs):
+    if scan_points:
+        lo, hi, sign_changes = find_brackets(func, target, lower, upper, n_points=scan_points)
+    else:
+        lo, hi, sign_changes = lower, upper, None
+    x, diagnostics = solve_bracketed(func, target, lo, hi, **solver_kwargs)
+    if sign_changes is not None:
+        diagnostics["sign_changes"] = sign_changes
+    return x, diagnostics
+
+
+@timed()
+def implied_revenue_growth(histories, target_ev, wacc, perpetual_growth_rate,
+                           years=10, lower=-0.30, upper=0.60, scan_points=24,
+                           ppe_growth_coef=None, intangible_growth_coef=None, **solver_kwargs):
+    """
+    予測期間の売上高成長率を一定とした場合に、企業価値が target_ev となる成長率を銘柄ごとに求める。
+
+    予測は forecast_statements_batch と同じ三表モデルを全銘柄まとめて評価し、
+    予測年度のFCFを compute_dcf_valuation と同じ式で割り引く（導関数は割線で近似）。
+    成長率が高いと設備投資の増加でFCFが減り企業価値が単調でなくなるため、区間を走査して
+    最も低い解を選ぶ（diagnostics["sign_changes"] が2以上の銘柄は解が複数ある）。
+
+    Parameters:
+        histories (List[dict]): 銘柄ごとの {"pl_list", "bs_list", "returns_list"}（build_history の戻り値など）
+        target_ev (float or np.ndarray): 目標の企業価値
+        wacc, perpetual_growth_rate (float or np.ndarray): 銘柄ごとのWACC・永久成長率
+        years (int): 予測年数
+        lower, upper (float): 探索区間
+        scan_points (int): 解を囲む区間を探す走査点数
+        ppe_growth_coef, intangible_growth_coef (float or np.ndarray or None): 固定資産の弾力性
+        **solver_kwargs: solve_bracketed の引数
+
+    Returns:
+        Tuple[np.ndarray, dict]: 売上高成長率と診断情報
+    """
+    n = len(histories)
+    pl_drivers = stack_drivers([prepare_pl_drivers(h["pl_list"]) for h in histories])
+    bs_drivers = stack_drivers([
+        prepare_bs_drivers(h["pl_list"], h["bs_list"], h["returns_list"]) for h in histories
+    ])
+    wacc = _rows(wacc, n)
+    growth = _rows(perpetual_growth_rate, n)
+
+    def func(revenue_growth):
+        growth_matrix = np.repeat(revenue_growth.reshape(-1, 1), years, axis=1)
+        forecast = forecast_from_drivers(
+            pl_drivers, bs_drivers, growth_matrix,
+            ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef
+        )
+        return compute_dcf_valuation_paths(forecast["cf"]["fcf"], wacc, growth, terminal_year=years), None
+
+    return _solve_with_scan(func, target_ev, _rows(lower, n), _rows(upper, n), scan_points, solver_kwargs)
+
+
+def summarize_convergence(diagnostics):
+    """
+    診断情報を集計する（状態ごとの件数、収束した行の反復回数の平均・最大）。
+    """
+    status = diagnostics["status"]
+    iterations = diagnostics["iterations"][diagnostics["converged"]]
+    names, counts = np.unique(status, return_counts=True)
+    return {
+        "n": int(status.size),
+        "status_counts": {str(name): int(count) for name, count in zip(names, counts)},
+        "mean_iterations": float(iterations.mean()) if iterations.size else float("nan"),
+        "max_iterations": int(iterations.max()) if iterations.size else 0,
+        "newton_steps": int(diagnostics["newton_steps"].sum()),
+        "bisection_steps": int(diagnostics["bisection_steps"].sum()),
+        "multiple_roots": int(np.sum(diagnostics["sign_changes"] > 1)) if "sign_changes" in diagnostics else None,
+    }
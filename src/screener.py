@@ -0,0 +1,493 @@
+"""
+複数銘柄の横断スクリーニング
+
+銘柄 × 年度の2次元配列（Universe）に過去の財務データをまとめ、ROIC・利益率・回転日数と
+DCFによる理論株価・上昇余地を全銘柄について配列演算で一括計算する。
+フィルタ・上位k件の抽出はメモリ上で行う。
+
+    universe = Universe.from_payloads(payloads)   # {ticker: {"income", "balance", "cash_flow", "profile"}}
+    screener = Screener(universe)
+    screener.top("roic", k=50, where=screener["fair_share_price"] > screener["price"])
+
+年度は銘柄ごとに最新期を右端（列 -1）に揃え、データのない期は NaN とする。
+DCFの前提（過去平均の比率・成長率、資本コスト）は pipeline.value_company と同じ定義で算出し、
+value_company・ダッシュボードと同じく予測期間（forecast_years 年）のFCFを割り引く。
+"""
+import numpy as np
+
+from src.statements import Statements
+from src.financial_utils import (
+    INCOME_STATEMENT_FIELDS, BALANCE_SHEET_FIELDS, RETURNS_FIELDS,
+    reconstruct_income_statement, reconstruct_balance_sheet, extract_returns_from_cf,
+)
+from src.batch_forecasting import forecast_from_drivers
+from src.compute_wacc import CapitalStructure
+from src.dcf import compute_dcf_valuation_paths
+from src.instrumentation import timed
+
+DEFAULT_YEARS = 10
+RECENT_YEARS = 5  # 比率・平均値の算出に使う直近の年数（prepare_*_drivers と同じ）
+
+
+def masked_divide(numerator, denominator):
+    """
+    要素ごとの割り算。分母が0・NaN、または分子がNaNの要素は NaN とする（警告は出さない）。
+    """
+    numerator = np.asarray(numerator, dtype=np.float64)
+    denominator = np.asarray(denominator, dtype=np.float64)
+    out = np.full(np.broadcast(numerator, denominator).shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=(denominator != 0) & ~np.isnan(denominator))
+    return out
+
+
+class Universe:
+    """
+    銘柄 × 年度の財務データ。
+
+    Parameters:
+        tickers (List[str]): ティッカー
+        pl, bs, returns (dict): {項目名: np.ndarray (銘柄数, 年数)}（最新期が列 -1、欠損は NaN）
+        counts (dict): {"pl", "bs", "returns": np.ndarray (銘柄数,)} 銘柄ごとの期数
+        price, beta, shares_outstanding (np.ndarray or None): 銘柄ごとの市場データ（shape: (銘柄数,)）
+    """
+
+    __slots__ = ("tickers", "pl", "bs", "returns", "counts", "price", "beta", "shares_outstanding", "_index")
+
+    def __init__(self, tickers, pl, bs, returns, counts, price=None, beta=None, shares_outstanding=None):
+        n = len(tickers)
+        self.tickers = list(tickers)
+        self.pl = pl
+        self.bs = bs
+        self.returns = returns
+        self.counts = counts
+        nan = np.full(n, np.nan)
+        self.price = nan.copy() if price is None else np.asarray(price, dtype=np.float64)
+        self.beta = nan.copy() if beta is None else np.asarray(beta, dtype=np.float64)
+        self.shares_outstanding = (
+            nan.copy() if shares_outstanding is None else np.asarray(shares_outstanding, dtype=np.float64))
+        self._index = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+    def __len__(self):
+        return len(self.tickers)
+
+    def __repr__(self):
+        return f"Universe(tickers={len(self)}, years={self.n_years})"
+
+    @property
+    def n_years(self):
+        return next(iter(self.pl.values())).shape[1]
+
+    def index(self, ticker):
+        return self._index[ticker.upper()]
+
+    @classmethod
+    @timed("screener.load")
+    def from_histories(cls, histories, profiles=None, years=DEFAULT_YEARS):
+        """
+        銘柄ごとの過去の財務データから Universe を作る。
+
+        Parameters:
+            histories (dict): {ticker: {"pl_list", "bs_list", "returns_list"}}（List[dict] または Statements、昇順）
+            profiles (dict or None): {ticker: FMPのプロフィール}（fetch_profiles_bulk の戻り値など）
+            years (int): 保持する年数
+        """
+        tickers = [t.upper() for t in histories]
+        n = len(tickers)
+        sections = {
+            "pl": ("pl_list", list(INCOME_STATEMENT_FIELDS)),
+            "bs": ("bs_list", list(BALANCE_SHEET_FIELDS)),
+            "returns": ("returns_list", list(RETURNS_FIELDS)),
+        }
+        arrays = {key: {name: np.full((n, years), np.nan) for name in fields}
+                  for key, (_, fields) in sections.items()}
+        counts = {key: np.zeros(n, dtype=np.int64) for key in sections}
+
+        for row, history in enumerate(histories.values()):
+            for key, (source, fields) in sections.items():
+                counts[key][row] = _fill_row(arrays[key], row, history[source], fields, years)
+
+        price = beta = shares = None
+        if profiles is not None:
+            price, beta, shares = _market_arrays(tickers, profiles)
+        return cls(tickers, arrays["pl"], arrays["bs"], arrays["returns"], counts, price, beta, shares)
+
+    @classmethod
+    def from_payloads(cls, payloads, years=DEFAULT_YEARS):
+        """
+        FMPのレスポンス {ticker: {"income", "balance", "cash_flow", "profile"}} から Universe を作る。
+        """
+        histories = {
+            ticker: {
+                "pl_list": reconstruct_income_statement(p["income"], columnar=True),
+                "bs_list": reconstruct_balance_sheet(p["balance"], columnar=True),
+                "returns_list": extract_returns_from_cf(p["cash_flow"], columnar=True),
+            }
+            for ticker, p in payloads.items()
+        }
+        profiles = {ticker: p["profile"] for ticker, p in payloads.items() if p.get("profile")}
+        return cls.from_histories(histories, profiles, years=years)
+
+    @classmethod
+    def from_store(cls, store, tickers, profiles=None, years=DEFAULT_YEARS):
+        """
+        ローカルストア（fundamentals_store.FundamentalsStore）の財務諸表から Universe を作る。
+        保存されていない銘柄は除く。
+        """
+        histories = {}
+        for ticker in tickers:
+            income = store.get_statements(ticker, "income-statement", years)
+            balance = store.get_statements(ticker, "balance-sheet-statement", years)
+            if not income or not balance:
+                continue
+            histories[ticker] = {
+                "pl_list": reconstruct_income_statement(income, columnar=True),
+                "bs_list": reconstruct_balance_sheet(balance, columnar=True),
+                "returns_list": extract_returns_from_cf(
+                    store.get_statements(ticker, "cash-flow-statement", years), columnar=True),
+            }
+        return cls.from_histories(histories, profiles, years=years)
+
+
+def _fill_row(target, row, data, fields, years):
+    """1銘柄分のデータを右詰めで書き込み、書き込んだ期数を返す"""
+    if isinstance(data, Statements):
+        k = min(len(data), years)
+        if k:
+            for name in fields:
+                if name in data:
+                    target[name][row, years - k:] = data[name][-k:]
+        return k
+
+    records = list(data)[-years:]
+    k = len(records)
+    if k:
+        for name in fields:
+            target[name][row, years - k:] = [
+                np.nan if value is None else value for value in (r.get(name) for r in records)
+            ]
+    return k
+
+
+def _market_arrays(tickers, profiles):
+    price = np.full(len(tickers), np.nan)
+    beta = np.full(len(tickers), np.nan)
+    market_cap = np.full(len(tickers), np.nan)
+    for i, ticker in enumerate(tickers):
+        profile = profiles.get(ticker)
+        if not profile:
+            continue
+        item = profile[0] if isinstance(profile, list) else profile
+        for target, key in ((price, "price"), (beta, "beta"), (market_cap, "mktCap")):
+            value = item.get(key)
+            if value is not None:
+                target[i] = float(value)
+    # 発行済株式数 = 時価総額 ÷ 株価（reconstruct_market_data と同じ）
+    return price, beta, masked_divide(market_cap, price)
+
+
+# --- 過去平均（src.utils の average_* と同じ定義を銘柄方向に一括で計算する） -------------------------
+
+def _window(values, start, length, k):
+    """
+    各行の列 start から length 個（最大 k 個）を左詰めで取り出す（足りない部分は NaN）。
+    List[dict] のスライス（list[-5:] や list[:5]）に相当する。
+    """
+    offsets = np.arange(k)
+    index = np.clip(start[:, None] + offsets, 0, values.shape[1] - 1)
+    window = np.take_along_axis(values, index, axis=1)
+    return np.where(offsets < length[:, None], window, np.nan)
+
+
+def _recent(values, count, k=RECENT_YEARS):
+    """直近 k 期（list[-k:]）"""
+    length = np.minimum(count, k)
+    return _window(values, values.shape[1] - length, length, k), length
+
+
+def _first(values, count, k=RECENT_YEARS):
+    """先頭の k 期（zip で短い方に揃えられる場合の list[:k]）"""
+    return _window(values, values.shape[1] - count, np.minimum(count, k), k)
+
+
+def _nanmean_or_zero(values, valid):
+    n = valid.sum(axis=1)
+    total = np.where(valid, values, 0.0).sum(axis=1)
+    return np.where(n > 0, total / np.maximum(n, 1), 0.0)
+
+
+def average_ratio_rows(numerator, denominator):
+    """average_ratio: 分母が0・欠損の年を除いた 分子 / 分母 の平均（該当がなければ0）"""
+    valid = (denominator != 0) & ~np.isnan(denominator) & ~np.isnan(numerator)
+    return _nanmean_or_zero(masked_divide(numerator, denominator), valid)
+
+
+def average_value_rows(values):
+    """average_value: 欠損を除いた平均（該当がなければ0）"""
+    return _nanmean_or_zero(values, ~np.isnan(values))
+
+
+def average_growth_rows(values):
+    """average_growth: 欠損を除いて詰めた系列の前年比の平均（前年が0の年は除く、該当がなければ0）"""
+    valid = ~np.isnan(values)
+    # 欠損を除いた値を順序を保って左に詰める
+    order = np.argsort(~valid, axis=1, kind="stable")
+    packed = np.take_along_axis(values, order, axis=1)
+    prev, curr = packed[:, :-1], packed[:, 1:]
+    pair_valid = ~np.isnan(prev) & ~np.isnan(curr) & (prev != 0)
+    return _nanmean_or_zero(masked_divide(curr - prev, prev), pair_valid)
+
+
+def average_payout_rows(returns_window, net_income_window):
+    """average_dividend_ratio / average_buyback_ratio: 還元額 / 当期純利益 の平均"""
+    valid = ~np.isnan(returns_window) & (net_income_window != 0) & ~np.isnan(net_income_window)
+    return _nanmean_or_zero(masked_divide(returns_window, net_income_window), valid)
+
+
+# --- 指標 --------------------------------------------------------------------------------------
+
+@timed("screener.ratios")
+def compute_ratios(universe):
+    """
+    全銘柄・全年度の NOPAT・NWC・投下資本と財務指標を計算する
+    （compute_financial_ratios_from_pl_bs_nopat_nwc_ic と同じ定義）。
+
+    Returns:
+        dict: {指標名: np.ndarray (銘柄数, 年数)}
+    """
+    pl, bs = universe.pl, universe.bs
+    revenue = pl["revenue"]
+
+    effective_tax_rate = masked_divide(pl["income_tax"], pl["income_before_tax"])
+    tax_on_operating_income = pl["income_tax"] - effective_tax_rate * (
+        pl["interest_income"] - pl["interest_expense"] + pl["other_non_operating"])
+    nopat = pl["operating_income"] - tax_on_operating_income
+    nwc = (bs["net_receivables"] + bs["inventory"] + bs["other_current_assets"]
+           - bs["accounts_payable"] - bs["deferred_revenue"] - bs["other_current_liabilities"])
+    invested_capital = bs["short_term_debt"] + bs["long_term_debt"] + bs["total_equity"]
+    other_invested_capital = invested_capital - (nwc + bs["ppe"] + bs["intangible_assets"])
+
+    return {
+        "nopat": nopat,
+        "effective_tax_rate": effective_tax_rate,
+        "nwc": nwc,
+        "invested_capital": invested_capital,
+        "pre_tax_roic": masked_divide(pl["operating_income"], invested_capital),
+        "roic": masked_divide(nopat, invested_capital),
+        "roe": masked_divide(pl["net_income"], bs["total_equity"]),
+        "roa": masked_divide(pl["net_income"], bs["total_assets"]),
+        "operating_margin": masked_divide(pl["operating_income"], revenue),
+        "net_margin": masked_divide(pl["net_income"], revenue),
+        "cost_ratio": masked_divide(pl["cost_of_revenue"], revenue),
+        "sg_and_a_ratio": masked_divide(pl["sg_and_a"], revenue),
+        "capital_turnover": masked_divide(revenue, invested_capital),
+        "nwc_days": masked_divide(365 * nwc, revenue),
+        "ppe_days": masked_divide(365 * bs["ppe"], revenue),
+        "intangible_days": masked_divide(365 * bs["intangible_assets"], revenue),
+        "other_capital_days": masked_divide(365 * other_invested_capital, revenue),
+        "revenue_growth": masked_divide(revenue[:, 1:] - revenue[:, :-1], revenue[:, :-1]),
+    }
+
+
+def stack_universe_drivers(universe):
+    """
+    全銘柄の予測の前提を、prepare_pl_drivers / prepare_bs_drivers と同じ定義で一括計算する。
+
+    Returns:
+        Tuple[dict, dict]: (pl_drivers, bs_drivers)（stack_drivers と同じ (銘柄数, 1) の配列）
+    """
+    pl, bs, returns, counts = universe.pl, universe.bs, universe.returns, universe.counts
+
+    def column(values):
+        return np.asarray(values, dtype=np.float64).reshape(-1, 1)
+
+    recent_pl = {name: _recent(values, counts["pl"])[0] for name, values in pl.items()}
+    recent_bs = {name: _recent(values, counts["bs"])[0] for name, values in bs.items()}
+    # List[dict] 版と同じく、還元額は先頭の期から直近5年のPLと組み合わせる
+    first_returns = {name: _first(values, counts["returns"]) for name, values in returns.items()}
+    pairs = np.minimum(np.minimum(counts["returns"], RECENT_YEARS), np.minimum(counts["pl"], RECENT_YEARS))
+    paired = np.arange(RECENT_YEARS) < pairs[:, None]
+    net_income = np.where(paired, recent_pl["net_income"], np.nan)
+
+    revenue_growth = average_growth_rows(pl["revenue"])
+    pl_drivers = {
+        "revenue": column(pl["revenue"][:, -1]),
+        "depreciation": column(pl["depreciation_amortization"][:, -1]),
+        "cost_ratio": column(average_ratio_rows(recent_pl["cost_of_revenue"], recent_pl["revenue"])),
+        "sga_ratio": column(average_ratio_rows(recent_pl["sg_and_a"], recent_pl["revenue"])),
+        "depreciation_growth": column(average_growth_rows(recent_pl["depreciation_amortization"])),
+        "interest_income": column(average_value_rows(recent_pl["interest_income"])),
+        "interest_expense": column(average_value_rows(recent_pl["interest_expense"])),
+        "other_non_operating": column(average_value_rows(recent_pl["other_non_operating"])),
+        "tax_rate": column(average_ratio_rows(recent_pl["income_tax"], recent_pl["income_before_tax"])),
+        "revenue_growth": column(revenue_growth),
+    }
+
+    latest_bs = {name: column(values[:, -1]) for name, values in bs.items()}
+    latest_bs["retained_earnings"] = np.nan_to_num(latest_bs["retained_earnings"], nan=0.0)
+    bs_drivers = {
+        "latest_bs": latest_bs,
+        "net_receivables_ratio": column(average_ratio_rows(recent_bs["net_receivables"], recent_pl["revenue"])),
+        "inventory_ratio": column(average_ratio_rows(recent_bs["inventory"], recent_pl["revenue"])),
+        "accounts_payable_ratio": column(average_ratio_rows(recent_bs["accounts_payable"], recent_pl["revenue"])),
+        "other_current_liabilities_ratio": column(
+            average_ratio_rows(recent_bs["other_current_liabilities"], recent_pl["revenue"])),
+        "avg_ppe_growth": column(average_growth_rows(bs["ppe"])),
+        "avg_intangible_growth": column(average_growth_rows(recent_bs["intangible_assets"])),
+        "avg_revenue_growth": column(revenue_growth),
+        "dividend_ratio": column(average_payout_rows(first_returns["dividends_paid"], net_income)),
+        "buyback_ratio": column(average_payout_rows(first_returns["stock_buyback"], net_income)),
+    }
+    return pl_drivers, bs_drivers
+
+
+def summarize_capital_structure_rows(universe, ratios, years=RECENT_YEARS):
+    """
+    全銘柄の資本構成・税率の要約（CapitalStructure.from_history と同じ定義）を、
+    各フィールドを (銘柄数,) の配列とする CapitalStructure で返す。
+    算出できない銘柄（資本構成の合計が0、有効な実効税率がないなど）は NaN。
+    """
+    pl, bs, counts = universe.pl, universe.bs, universe.counts
+
+    # 負債コスト: 直近 years 年の 支払利息合計 / 有利子負債合計（データが揃った年のみ）
+    n = np.minimum(np.minimum(counts["pl"], counts["bs"]), years)
+    in_window = np.arange(universe.n_years) >= (universe.n_years - n)[:, None]
+    interest = pl["interest_expense"]
+    debt = bs["short_term_debt"] + bs["long_term_debt"]
+    valid = in_window & ~np.isnan(interest) & ~np.isnan(debt) & (debt > 0)
+    cost_of_debt = masked_divide(np.where(valid, interest, 0.0).sum(axis=1), np.where(valid, debt, 0.0).sum(axis=1))
+
+    # 資本構成（最新BS）と直近 years 年の実効税率（0以上のみ）の平均
+    equity = bs["total_equity"][:, -1]
+    latest_debt = debt[:, -1]
+    tax_rates, _ = _recent(ratios["effective_tax_rate"], counts["pl"], years)
+    avg_tax_rate = masked_divide(
+        np.where(tax_rates >= 0, tax_rates, 0.0).sum(axis=1), (tax_rates >= 0).sum(axis=1))
+
+    return CapitalStructure(
+        equity=np.where(equity + latest_debt != 0, equity, np.nan),
+        debt=latest_debt,
+        cash=bs["cash_and_equivalents"][:, -1],
+        avg_tax_rate=avg_tax_rate,
+        cost_of_debt=cost_of_debt,
+        beta=universe.beta,
+    )
+
+
+@timed("screener.valuation")
+def value_universe(universe, ratios=None, risk_free_rate=0.04, market_risk_premium=0.055,
+                   perpetual_growth_rate=0.02, growth_multiplier=1.0, decay_factor=0.95, forecast_years=10,
+                   ppe_growth_coef=0.5, intangible_growth_coef=0.5):
+    """
+    全銘柄のDCF評価を一括で行う（pipeline.value_company と同じ前提。割り引くのは予測期間 forecast_years 年のFCF）。
+
+    Returns:
+        dict: {"enterprise_value", "net_debt", "equity_value", "fair_share_price", "upside",
+               "cost_of_equity", "cost_of_debt", "wacc", "base_revenue_growth": np.ndarray (銘柄数,)}
+    """
+    ratios = compute_ratios(universe) if ratios is None else ratios
+    pl_drivers, bs_drivers = stack_universe_drivers(universe)
+
+    base_growth = pl_drivers["revenue_growth"]
+    growth_matrix = base_growth * growth_multiplier * decay_factor ** np.arange(forecast_years)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        forecast = forecast_from_drivers(
+            pl_drivers, bs_drivers, growth_matrix,
+            ppe_growth_coef=ppe_growth_coef, intangible_growth_coef=intangible_growth_coef,
+        )
+        capital = summarize_capital_structure_rows(universe, ratios)
+        costs = capital.costs(risk_free_rate, market_risk_premium)
+        enterprise_value = compute_dcf_valuation_paths(forecast["cf"]["fcf"], costs["wacc"], perpetual_growth_rate)
+
+    net_debt = capital.net_debt
+    equity_value = enterprise_value - net_debt
+    fair_share_price = masked_divide(equity_value, universe.shares_outstanding)
+
+    return {
+        "enterprise_value": enterprise_value,
+        "net_debt": net_debt,
+        "equity_value": equity_value,
+        "fair_share_price": fair_share_price,
+        "upside": masked_divide(fair_share_price, universe.price) - 1,
+        "cost_of_equity": costs["cost_of_equity"],
+        "cost_of_debt": costs["cost_of_debt"],
+        "wacc": costs["wacc"],
+        "base_revenue_growth": base_growth.ravel(),
+    }
+
+
+class Screener:
+    """
+    Universe の最新期の指標とDCF評価を列とする表（{列名: np.ndarray (銘柄数,)}）を保持し、
+    フィルタと上位k件の抽出を行う。
+
+    Parameters:
+        universe (Universe): 対象銘柄
+        year (int): 指標を取り出す列（既定は最新期）
+        **valuation_kwargs: value_universe の前提条件
+    """
+
+    def __init__(self, universe, year=-1, **valuation_kwargs):
+        self.universe = universe
+        self.ratios = compute_ratios(universe)
+        self.table = {name: values[:, year] for name, values in self.ratios.items()}
+        self.table.update(value_universe(universe, self.ratios, **valuation_kwargs))
+        self.table.update({
+            "price": universe.price,
+            "beta": universe.beta,
+            "revenue": universe.pl["revenue"][:, year],
+            "market_cap": universe.price * universe.shares_outstanding,
+        })
+        self.tickers = np.asarray(universe.tickers, dtype=object)
+
+    def __getitem__(self, name):
+        return self.table[name]
+
+    @property
+    def columns(self):
+        return list(self.table)
+
+    def mask(self, **ranges):
+        """
+        列ごとの範囲 (下限, 上限)（None は制限なし、両端を含む）をすべて満たす銘柄のマスクを返す。
+
+            screener.mask(roic=(0.15, None), operating_margin=(0.2, None))
+        """
+        mask = np.ones(len(self.tickers), dtype=bool)
+        for name, (lower, upper) in ranges.items():
+            values = self.table[name]
+            mask &= ~np.isnan(values)
+            if lower is not None:
+                mask &= values >= lower
+            if upper is not None:
+                mask &= values <= upper
+        return mask
+
+    @timed("screener.top")
+    def top(self, sort_by, k=50, where=None, ascending=False, columns=None):
+        """
+        条件 where（bool 配列）を満たす銘柄のうち、列 sort_by の上位 k 件を返す（NaN は除く）。
+
+        Returns:
+            List[dict]: [{"ticker": str, 列名: float, ...}, ...]（順位順）
+        """
+        values = self.table[sort_by]
+        candidates = ~np.isnan(values)
+        if where is not None:
+            candidates &= where
+        index = np.flatnonzero(candidates)
+        keys = values[index] if ascending else -values[index]
+        if k < index.size:
+            part = np.argpartition(keys, k)[:k]
+            index, keys = index[part], keys[part]
+        index = index[np.argsort(keys, kind="stable")]
+
+        columns = columns or [sort_by, "fair_share_price", "price", "upside", "wacc"]
+        return [
+            {"ticker": self.tickers[i], **{name: float(self.table[name][i]) for name in dict.fromkeys(columns)}}
+            for i in index
+        ]
+
+    def to_dataframe(self):
+        import pandas as pd
+
+        return pd.DataFrame(self.table, index=pd.Index(self.tickers, name="ticker"))
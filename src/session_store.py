@@ -0,0 +1,263 @@
+"""
+Streamlit のセッションごとの計算結果の保持（メモリ上限・使用量の計測付き）
+
+セッションの状態（st.session_state）には生のレスポンスや予測結果をそのまま置かず、SessionStore に保持する。
+
+- SessionStore: セッションごとの、合計サイズ上限付きのLRU。上限を超えた場合は古いものから破棄する
+  （破棄された計算結果は次の再実行で再計算される）
+  - pin=True のエントリ（表示中の銘柄の市場データなど）は破棄しない。pin したエントリも上限に含め、
+    pin したエントリの合計が上限を超える場合は pin せずに（破棄の対象として）保持する
+  - shared=True のエントリ（history_store と共有する過去の財務データなど）は参照のみで、上限の計算に含めない
+- SessionRegistry: プロセス内の全セッションの使用量の合計を計測し、合計の上限を超えた場合は
+  最後に使われたのが古いセッションから順に破棄する
+
+サイズは shared_cache.estimate_size による概算。
+
+    store = get_session_store(st.session_state)
+    graph = ComputeGraph(store=store)
+    session_registry.get_stats()
+"""
+import os
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from src.shared_cache import estimate_size
+
+DEFAULT_SESSION_MAX_BYTES = int(os.environ.get("DCF_SESSION_MAX_BYTES", 32 * 1024 * 1024))
+DEFAULT_SESSIONS_MAX_BYTES = int(os.environ.get("DCF_SESSIONS_MAX_BYTES", 1024 * 1024 * 1024))
+
+_MISSING = object()
+
+
+class SessionStore:
+    """
+    1セッション分の計算結果を保持する、合計サイズ上限付きのLRU（dict と同様に扱える）。
+
+    Parameters:
+        session_id (str): セッションの識別子（使用量の表示用）
+        max_bytes (int): 保持するデータの合計サイズ上限（バイト、pin したエントリを含む。shared を除く）
+        registry (SessionRegistry or None): プロセス全体の使用量を管理するレジストリ
+    """
+
+    def __init__(self, session_id="", max_bytes=DEFAULT_SESSION_MAX_BYTES, registry=None):
+        self.session_id = session_id
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key -> (value, size, pinned, shared)
+        self._bytes = 0  # 上限の対象（shared 以外）
+        self._pinned_bytes = 0
+        self._shared_bytes = 0
+        self._lock = threading.Lock()
+        self.last_access = time.time()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "rejected": 0, "pin_rejected": 0}
+        self._registry = registry
+        if registry is not None:
+            registry.register(self)
+
+    # --- dict と同じ操作（ComputeGraph から利用する） ----------------------------
+
+    def get(self, key, default=None):
+        with self._lock:
+            self.last_access = time.time()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats["misses"] += 1
+                return default
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.put(key, value)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def pop(self, key, default=None):
+        with self._lock:
+            entry = self._remove(key)
+        return default if entry is None else entry[0]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = self._pinned_bytes = self._shared_bytes = 0
+
+    def keys(self):
+        with self._lock:
+            return list(self._entries)
+
+    # --- 保持・破棄 -----------------------------------------------------------
+
+    def put(self, key, value, pin=False, shared=False):
+        """
+        value を保持する。
+
+        Parameters:
+            pin (bool): True の場合は破棄しない。ただし pin したエントリの合計が上限を超える場合は
+                pin せずに保持し、stats["pin_rejected"] に数える
+            shared (bool): True の場合は他で計上済みの共有データとして、上限の計算に含めない
+
+        Returns:
+            bool: 保持した場合は True（単独で上限を超えるエントリは保持しない）
+        """
+        size = estimate_size(value)
+        with self._lock:
+            self.last_access = time.time()
+            self._remove(key)
+            if pin and not shared and self._pinned_bytes + size > self.max_bytes:
+                self.stats["pin_rejected"] += 1
+                pin = False
+            if not (pin or shared) and size > self.max_bytes:
+                self.stats["rejected"] += 1
+                return False
+            self._entries[key] = (value, size, pin, shared)
+            if shared:
+                self._shared_bytes += size
+            else:
+                self._bytes += size
+                if pin:
+                    self._pinned_bytes += size
+            self._evict(self.max_bytes)
+        if self._registry is not None and not shared:
+            self._registry.enforce()
+        return True
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            if entry[3]:
+                self._shared_bytes -= entry[1]
+            else:
+                self._bytes -= entry[1]
+                if entry[2]:
+                    self._pinned_bytes -= entry[1]
+        return entry
+
+    def _evict(self, max_bytes):
+        """pin・shared でないエントリを古いものから破棄し、合計を max_bytes 以下にする。破棄したバイト数を返す"""
+        freed = 0
+        for key in list(self._entries):
+            if self._bytes <= max_bytes:
+                break
+            _, size, pinned, shared = self._entries[key]
+            if pinned or shared:
+                continue
+            self._remove(key)
+            self.stats["evictions"] += 1
+            freed += size
+        return freed
+
+    def evict_bytes(self, amount):
+        """amount バイト以上を（可能な範囲で）破棄する。破棄したバイト数を返す"""
+        with self._lock:
+            return self._evict(max(0, self._bytes - amount))
+
+    @property
+    def nbytes(self):
+        return self._bytes
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                **self.stats,
+                "session_id": self.session_id,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "pinned_bytes": self._pinned_bytes,
+                "shared_bytes": self._shared_bytes,
+                "max_bytes": self.max_bytes,
+                "idle_sec": time.time() - self.last_access,
+                "largest": sorted(
+                    ((str(key), size) for key, (_, size, _, shared) in self._entries.items() if not shared),
+                    key=lambda item: -item[1],
+                )[:5],
+            }
+
+
+class SessionRegistry:
+    """
+    プロセス内の全 SessionStore の使用量を合計し、上限を超えた場合は
+    最後に使われたのが古いセッションから順に（pin されていないエントリを）破棄する。
+    終了したセッション（SessionStore が参照されなくなったもの）は自動的に対象から外れる。
+
+    Parameters:
+        max_bytes (int): 全セッションの合計サイズ上限（バイト、shared を除く）
+    """
+
+    def __init__(self, max_bytes=DEFAULT_SESSIONS_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._stores = weakref.WeakSet()
+        self._lock = threading.Lock()
+        self.stats = {"enforcements": 0, "evicted_bytes": 0}
+
+    def register(self, store):
+        with self._lock:
+            self._stores.add(store)
+
+    def _snapshot(self):
+        with self._lock:
+            return list(self._stores)
+
+    @property
+    def nbytes(self):
+        return sum(store.nbytes for store in self._snapshot())
+
+    def enforce(self):
+        """合計が上限を超えていれば、古いセッションから破棄して上限以下にする"""
+        stores = self._snapshot()
+        excess = sum(store.nbytes for store in stores) - self.max_bytes
+        if excess <= 0:
+            return 0
+        freed = 0
+        for store in sorted(stores, key=lambda s: s.last_access):
+            freed += store.evict_bytes(excess - freed)
+            if freed >= excess:
+                break
+        with self._lock:
+            self.stats["enforcements"] += 1
+            self.stats["evicted_bytes"] += freed
+        return freed
+
+    def get_stats(self, top=10):
+        """
+        プロセス全体の使用量と、使用量の多いセッション top 件の内訳を返す。
+        """
+        sessions = sorted((store.get_stats() for store in self._snapshot()), key=lambda s: -s["bytes"])
+        return {
+            **self.stats,
+            "sessions": len(sessions),
+            "bytes": sum(s["bytes"] for s in sessions),
+            "pinned_bytes": sum(s["pinned_bytes"] for s in sessions),
+            "shared_bytes": sum(s["shared_bytes"] for s in sessions),
+            "max_bytes": self.max_bytes,
+            "top_sessions": sessions[:top],
+        }
+
+
+session_registry = SessionRegistry()
+
+
+def get_session_store(state, max_bytes=None):
+    """
+    Streamlit の session_state に SessionStore がなければ作って返す（プロセスのレジストリに登録する）。
+    """
+    store = state.get("session_store")
+    if store is None:
+        session_id = state.get("session_id", "")
+        store = SessionStore(session_id, max_bytes=max_bytes or DEFAULT_SESSION_MAX_BYTES,
+                             registry=session_registry)
+        state["session_store"] = store
+    return store
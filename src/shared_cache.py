@@ -0,0 +1,189 @@
+"""
+Streamlit のセッション間（プロセス内）で共有する取得・計算結果
+
+- SingleFlight: 同じキーの同時呼び出しを1回の実行にまとめ、結果（または例外）を全員で共有する
+- HistoryStore: ティッカーごとの過去の財務データ（pl_list, bs_list, returns_list）を
+  メモリ上限付きのLRUで保持する
+
+共有された結果は複数のセッションから参照されるため、呼び出し側で変更しないこと。
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+DEFAULT_HISTORY_MAX_BYTES = int(os.environ.get("DCF_HISTORY_MAX_BYTES", 64 * 1024 * 1024))
+DEFAULT_HISTORY_MAX_AGE = 24 * 60 * 60  # 決算データの更新頻度に合わせ1日で破棄する
+
+
+class SingleFlight:
+    """
+    同じキーの処理が実行中であれば、新たに実行せずその結果を待って共有する。
+    完了したキーは保持しない（結果のキャッシュは行わない）。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._inflight = {}
+        self.stats = {"calls": 0, "executions": 0, "shared": 0}
+
+    def do(self, key, func):
+        """
+        key の処理が実行中ならその結果を待ち、そうでなければ func() を実行する。
+        func の例外は待機中の全呼び出しに送出される。
+        """
+        with self._lock:
+            self.stats["calls"] += 1
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = self._inflight[key] = Future()
+                self.stats["executions"] += 1
+            else:
+                self.stats["shared"] += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "inflight": len(self._inflight)}
+
+
+def estimate_size(value, _seen=None):
+    """
+    オブジェクトのおおよそのメモリ使用量（バイト）。配列は nbytes、DataFrame は memory_usage で数える。
+    """
+    _seen = set() if _seen is None else _seen
+    if id(value) in _seen:
+        return 0
+    _seen.add(id(value))
+
+    if hasattr(value, "memory_usage") and hasattr(value, "columns"):  # DataFrame
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, "nbytes") and hasattr(value, "dtype"):  # ndarray
+        return int(value.nbytes)
+
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _seen) + estimate_size(v, _seen) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(v, _seen) for v in value)
+    elif hasattr(value, "__slots__"):  # Statements など
+        size += sum(estimate_size(getattr(value, name), _seen)
+                    for name in value.__slots__ if hasattr(value, name))
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), _seen)
+    return size
+
+
+class HistoryStore:
+    """
+    ティッカーごとの過去の財務データを、合計サイズ上限付きのLRUで保持する（プロセス内で共有）。
+    同じティッカーの同時の読み込みは SingleFlight で1回にまとめる。
+
+    Parameters:
+        max_bytes (int): 保持するデータの合計サイズ上限（バイト、estimate_size による概算）
+        max_age (float): エントリの有効期間（秒）
+    """
+
+    def __init__(self, max_bytes=DEFAULT_HISTORY_MAX_BYTES, max_age=DEFAULT_HISTORY_MAX_AGE):
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()  # key -> (value, size, stored_at)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    @staticmethod
+    def make_key(ticker, limit=10):
+        return ticker.upper(), limit
+
+    def get(self, ticker, limit=10):
+        key = self.make_key(ticker, limit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[2] > self.max_age:
+                self._remove(key)
+                self.stats["expired"] += 1
+                entry = None
+            if entry is None:
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry[0]
+
+    def contains(self, ticker, limit=10):
+        """有効なエントリを保持しているか（ヒット率の統計・LRUの順序は変えない）"""
+        with self._lock:
+            entry = self._entries.get(self.make_key(ticker, limit))
+            return entry is not None and time.time() - entry[2] <= self.max_age
+
+    def put(self, ticker, value, limit=10):
+        key = self.make_key(ticker, limit)
+        size = estimate_size(value)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (value, size, time.time())
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.stats["evictions"] += 1
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._total_bytes -= entry[1]
+
+    def get_or_load(self, ticker, loader, limit=10):
+        """
+        保持していればそれを返し、なければ loader() の結果を保持して返す。
+        同じティッカーを同時に読み込む場合、loader は1回だけ実行される。
+        """
+        value = self.get(ticker, limit)
+        if value is not None:
+            return value
+
+        def load():
+            # 先行する読み込みが直前に完了していれば、それを使う
+            with self._lock:
+                entry = self._entries.get(self.make_key(ticker, limit))
+            if entry is not None:
+                return entry[0]
+            value = loader()
+            self.put(ticker, value, limit)
+            return value
+
+        return self._flight.do(self.make_key(ticker, limit), load)
+
+    def invalidate(self, ticker=None):
+        with self._lock:
+            for key in [k for k in self._entries if ticker is None or k[0] == ticker.upper()]:
+                self._remove(key)
+
+    def get_stats(self):
+        with self._lock:
+            return {**self.stats, "entries": len(self._entries), "bytes": self._total_bytes,
+                    "max_bytes": self.max_bytes, "loads": self._flight.get_stats()}
+
+
+history_store = HistoryStore()
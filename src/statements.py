@@ -0,0 +1,138 @@
+import numpy as np
+
+
+class Statements:
+    """
+    財務諸表の列指向（カラムナ）表現。
+
+    各項目を float64 の1行とする2次元配列 values（項目 × 年度）と、日付インデックス、
+    値の有無を表す valid マスクを持つ。値の欠損（None）は NaN として格納し、valid は False となる。
+    日付は常に昇順に並ぶ。
+
+    既存の List[dict] ベースの関数にもそのまま渡せるよう、以下の操作をサポートする。
+        - statements["revenue"]  : 項目の配列（コピーなしのビュー）
+        - statements[-1]         : 1年度分の dict（欠損値は None）
+        - statements[-5:]        : 年度方向のスライス（ビュー）
+        - for row in statements  : 年度ごとの dict を昇順に返す
+
+    Parameters:
+        dates (array-like): 日付（"YYYY-MM-DD" 文字列 または datetime64）
+        fields (List[str]): 項目名
+        values (np.ndarray): shape (len(fields), len(dates)) の float64 配列
+        valid (np.ndarray or None): values と同じ形状の bool 配列（None の場合は ~isnan(values)）
+    """
+
+    __slots__ = ("dates", "fields", "values", "valid", "_field_index")
+
+    def __init__(self, dates, fields, values, valid=None):
+        self.dates = np.asarray(dates, dtype="datetime64[D]")
+        self.fields = list(fields)
+        self.values = np.asarray(values, dtype=np.float64)
+        self.valid = ~np.isnan(self.values) if valid is None else np.asarray(valid, dtype=bool)
+        self._field_index = {name: i for i, name in enumerate(self.fields)}
+
+        if self.values.shape != (len(self.fields), len(self.dates)):
+            raise ValueError("values の形状が (項目数, 年度数) と一致しません")
+
+    @classmethod
+    def from_records(cls, records, fields=None):
+        """
+        List[dict] 形式の財務データから生成する（date で昇順に並べ替える）。
+        """
+        records = sorted(records, key=lambda x: x["date"])
+        if fields is None:
+            fields = [key for key in (records[0] if records else {}) if key != "date"]
+        return cls.from_source(records, {name: name for name in fields})
+
+    @classmethod
+    def from_source(cls, items, field_map, date_key="date", transforms=None):
+        """
+        FMPのレスポンスなど dict のリストから、中間の dict を作らずに直接生成する。
+
+        Parameters:
+            items (List[dict]): 元データ
+            field_map (dict): {項目名: 元データのキー}。キーの代わりに定数（float）も指定可能
+            date_key (str): 日付のキー
+            transforms (dict or None): {項目名: 値を変換する関数}（None 以外の値に適用）
+        """
+        items = sorted(items, key=lambda x: x.get(date_key))
+        transforms = transforms or {}
+        fields = list(field_map)
+
+        values = np.full((len(fields), len(items)), np.nan)
+        for i, name in enumerate(fields):
+            source = field_map[name]
+            func = transforms.get(name)
+            for j, item in enumerate(items):
+                value = source if isinstance(source, float) else item.get(source)
+                if value is not None:
+                    values[i, j] = func(value) if func else value
+
+        dates = [item.get(date_key) for item in items]
+        return cls(dates, fields, values, valid=~np.isnan(values))
+
+    def __len__(self):
+        return len(self.dates)
+
+    def __contains__(self, name):
+        return name in self._field_index
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self.values[self._field_index[key]]
+        if isinstance(key, slice):
+            return Statements(self.dates[key], self.fields, self.values[:, key], self.valid[:, key])
+        return self.row(key)
+
+    def __iter__(self):
+        for j in range(len(self)):
+            yield self.row(j)
+
+    def __repr__(self):
+        return f"Statements(fields={len(self.fields)}, years={len(self)})"
+
+    def get(self, name, default=None):
+        """項目の配列を返す（存在しない場合は default）"""
+        index = self._field_index.get(name)
+        return self.values[index] if index is not None else default
+
+    def row(self, j):
+        """1年度分を dict で返す（欠損値は None）"""
+        row = {"date": str(self.dates[j])}
+        column = self.values[:, j]
+        mask = self.valid[:, j]
+        for i, name in enumerate(self.fields):
+            row[name] = float(column[i]) if mask[i] else None
+        return row
+
+    def to_records(self):
+        return [self.row(j) for j in range(len(self))]
+
+    def with_columns(self, columns, dates=None):
+        """
+        {項目名: 配列} から、同じ日付インデックスを持つ新しい Statements を作る。
+        """
+        fields = list(columns)
+        values = np.vstack([np.asarray(columns[name], dtype=np.float64) for name in fields]) \
+            if fields else np.empty((0, len(self)))
+        return Statements(self.dates if dates is None else dates, fields, values)
+
+    def to_dataframe(self):
+        """
+        日付をインデックスとする pandas.DataFrame に変換する。
+
+        values は (項目, 年度) の C 連続配列なので、その転置は pandas の内部ブロックと
+        同じメモリ配置になり、コピーなしで DataFrame を構築できる。
+        """
+        import pandas as pd
+
+        df = pd.DataFrame(
+            self.values.T, index=pd.DatetimeIndex(self.dates, name="date"),
+            columns=self.fields, copy=False
+        )
+        return df
+
+
+def as_records(data):
+    """Statements であれば List[dict] に変換し、それ以外はそのまま返す"""
+    return data.to_records() if isinstance(data, Statements) else data
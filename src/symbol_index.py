@@ -0,0 +1,403 @@
+"""
+ティッカー・企業名のローカル検索インデックス（入力中の候補表示用、APIを呼ばない）
+
+FMPの銘柄一覧（stock/list）のスナップショットから、
+- ティッカー・企業名・企業名の各単語の前方一致（ソート済みキー配列を二分探索する平坦化したトライ）
+- ティッカー＋企業名の文字3-gramによるあいまい一致（表記ゆれ・タイプミス）
+の索引を作り、ディスクに保存する。索引は初回の検索時に読み込み、古い・存在しない場合は
+バックグラウンドで再構築する（その間はリモート検索にフォールバックする）。
+
+    python -m src.symbol_index build              # FMPから取得して構築
+    python -m src.symbol_index build --from-json stock_list.json
+    python -m src.symbol_index search "appl"
+"""
+import bisect
+import logging
+import os
+import pickle
+import re
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+
+from src.instrumentation import timed
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+DEFAULT_INDEX_PATH = Path(os.environ.get(
+    "FMP_SYMBOL_INDEX", Path.home() / ".cache" / "dcf-app" / "symbol_index.pkl"))
+DEFAULT_MAX_AGE = 7 * 24 * 60 * 60
+REFRESH_RETRY_INTERVAL = 5 * 60  # 再構築に失敗した後、再試行するまでの秒数
+
+# 候補の順位付けに使う取引所・種別の重み（主要市場の普通株を優先）
+EXCHANGE_WEIGHTS = {"NASDAQ": 1.0, "NYSE": 1.0, "AMEX": 0.8, "TSX": 0.6, "LSE": 0.6, "XETRA": 0.5, "OTC": 0.1}
+TYPE_WEIGHTS = {"stock": 1.0, "etf": 0.5, "trust": 0.4, "fund": 0.3}
+
+# 前方一致の種類ごとの基本スコア（一致率 0〜1 を加える）
+_SCORE_EXACT_SYMBOL = 5.0
+_KIND_SCORES = {0: 3.0, 1: 2.5, 2: 2.0}  # 0: ティッカー, 1: 企業名全体, 2: 企業名の単語
+_FUZZY_SCALE = 1.5
+_MIN_FUZZY_SIMILARITY = 0.4
+# 出現銘柄数がこの割合を超える3-gram（"INC" など）はあいまい一致の候補集めに使わない
+_MAX_GRAM_FREQUENCY = 0.25
+# この長さ以下のクエリは一致する銘柄が多いため、構築時に上位候補を求めておく
+_SHORT_PREFIX_LENGTH = 2
+_SHORT_PREFIX_TOP = 20
+
+_NON_ALNUM = re.compile(r"[^0-9A-Z]+")
+_API_KEY_PARAM = re.compile(r"(apikey=)[^&\s'\")]+")
+
+
+def normalize(text):
+    """大文字化し、英数字以外を空白1つにまとめる"""
+    return _NON_ALNUM.sub(" ", str(text or "").upper()).strip()
+
+
+def _trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _entry_weight(item):
+    symbol = item.get("symbol", "")
+    weight = EXCHANGE_WEIGHTS.get(item.get("exchangeShortName"), 0.3)
+    weight *= TYPE_WEIGHTS.get(item.get("type", "stock"), 0.3)
+    # 優先株・クラス株など（"BRK-B"、"RY.TO"）より本銘柄を優先
+    if "." in symbol or "-" in symbol:
+        weight *= 0.5
+    return weight
+
+
+class SymbolIndex:
+    """
+    銘柄一覧の検索インデックス。build() で構築し、save() / load() で保存・読み込みする。
+
+    search() は前方一致（ティッカー > 企業名 > 企業名の単語）を優先し、候補が limit 件に満たない場合に
+    3-gram のあいまい一致で補う。同じ種類の一致の中では、一致率・取引所と種別の重みで順位付けする。
+    """
+
+    def __init__(self, state):
+        self.symbols = state["symbols"]
+        self.names = state["names"]
+        self.exchanges = state["exchanges"]
+        self.weights = state["weights"]
+        self.built_at = state["built_at"]
+        self._keys = state["keys"]
+        self._key_ids = state["key_ids"]
+        self._key_kinds = state["key_kinds"]
+        self._key_lengths = state["key_lengths"]
+        self._grams = state["grams"]
+        self._gram_counts = state["gram_counts"]
+        self._short_prefix_top = state.get("short_prefix_top") or {}
+
+    def __len__(self):
+        return len(self.symbols)
+
+    @classmethod
+    @timed()
+    def build(cls, symbol_list):
+        """
+        FMPの銘柄一覧（[{"symbol", "name", "exchangeShortName", "type", ...}, ...]）から構築する。
+        """
+        items = [item for item in symbol_list if item.get("symbol")]
+        symbols = [item["symbol"] for item in items]
+        names = [item.get("name") or "" for item in items]
+        exchanges = [item.get("exchangeShortName") or "" for item in items]
+        weights = np.array([_entry_weight(item) for item in items], dtype=np.float64)
+
+        # 前方一致用のキー（キー, 銘柄番号, 種類）
+        key_rows = []
+        for i, (symbol, name) in enumerate(zip(symbols, names)):
+            key_rows.append((normalize(symbol), i, 0))
+            normalized_name = normalize(name)
+            if normalized_name:
+                key_rows.append((normalized_name, i, 1))
+                for token in set(normalized_name.split(" ")[1:]):
+                    key_rows.append((token, i, 2))
+        key_rows.sort()
+
+        # 3-gram → 銘柄番号の転置インデックス
+        postings = {}
+        gram_counts = np.zeros(len(items), dtype=np.int32)
+        for i, (symbol, name) in enumerate(zip(symbols, names)):
+            grams = _trigrams(normalize(f"{symbol} {name}"))
+            gram_counts[i] = len(grams)
+            for gram in grams:
+                postings.setdefault(gram, []).append(i)
+
+        index = cls({
+            "symbols": symbols,
+            "names": names,
+            "exchanges": exchanges,
+            "weights": weights,
+            "built_at": time.time(),
+            "keys": [row[0] for row in key_rows],
+            "key_ids": np.array([row[1] for row in key_rows], dtype=np.int32),
+            "key_kinds": np.array([row[2] for row in key_rows], dtype=np.int8),
+            "key_lengths": np.array([len(row[0]) for row in key_rows], dtype=np.int32),
+            "grams": {gram: np.array(ids, dtype=np.int32) for gram, ids in postings.items()},
+            "gram_counts": gram_counts,
+        })
+        index._short_prefix_top = index._build_short_prefix_top()
+        return index
+
+    def _build_short_prefix_top(self):
+        prefixes = {key[:n] for key in self._keys for n in range(1, _SHORT_PREFIX_LENGTH + 1) if len(key) >= n}
+        top = {}
+        for prefix in prefixes:
+            ids, scores = self._prefix_candidates(prefix)
+            top[prefix] = self._rank(ids, scores, _SHORT_PREFIX_TOP)
+        return top
+
+    def save(self, path=DEFAULT_INDEX_PATH):
+        """インデックスを path に保存する（一時ファイルに書いてから置き換える）"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "version": INDEX_VERSION,
+            "symbols": self.symbols, "names": self.names, "exchanges": self.exchanges,
+            "weights": self.weights, "built_at": self.built_at,
+            "keys": self._keys, "key_ids": self._key_ids, "key_kinds": self._key_kinds,
+            "key_lengths": self._key_lengths, "grams": self._grams, "gram_counts": self._gram_counts,
+            "short_prefix_top": self._short_prefix_top,
+        }
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path=DEFAULT_INDEX_PATH):
+        """保存済みのインデックスを読み込む。存在しない・形式が古い場合は None"""
+        try:
+            with open(path, "rb") as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            return None
+        if not isinstance(state, dict) or state.get("version") != INDEX_VERSION:
+            return None
+        return cls(state)
+
+    def age(self):
+        return time.time() - self.built_at
+
+    # ---- 検索 ----
+
+    def _prefix_candidates(self, query):
+        """前方一致するキーの (銘柄番号, スコア) を返す"""
+        lo = bisect.bisect_left(self._keys, query)
+        hi = bisect.bisect_left(self._keys, query + "\uffff", lo)
+        if lo == hi:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+
+        ids = self._key_ids[lo:hi]
+        kinds = self._key_kinds[lo:hi]
+        base = np.select([kinds == 0, kinds == 1], [_KIND_SCORES[0], _KIND_SCORES[1]], _KIND_SCORES[2])
+        scores = base + len(query) / self._key_lengths[lo:hi]
+        scores = np.where((kinds == 0) & (self._key_lengths[lo:hi] == len(query)), _SCORE_EXACT_SYMBOL, scores)
+        return ids, scores
+
+    def _fuzzy_candidates(self, query):
+        """クエリの 3-gram のうち一致する割合が閾値以上の (銘柄番号, スコア) を返す（名前が短いほど高い）"""
+        grams = _trigrams(query)
+        max_postings = max(1, int(len(self.symbols) * _MAX_GRAM_FREQUENCY))
+        lists = [self._grams[g] for g in grams if g in self._grams and len(self._grams[g]) <= max_postings]
+        if not lists:
+            return np.empty(0, dtype=np.int32), np.empty(0)
+
+        shared = np.bincount(np.concatenate(lists), minlength=len(self.symbols))
+        ids = np.flatnonzero(shared >= _MIN_FUZZY_SIMILARITY * len(grams))
+        coverage = shared[ids] / len(grams)
+        return ids, (coverage - 0.001 * self._gram_counts[ids]) * _FUZZY_SCALE
+
+    def _rank(self, ids, scores, limit):
+        """同じ銘柄は最も高いスコアのみ残し、取引所・種別の重みを加えた順位で上位 limit 件の銘柄番号を返す"""
+        if ids.size == 0:
+            return ids
+        scores = scores + 0.1 * self.weights[ids]
+        # 候補が多い場合は上位だけを部分ソートで取り出してから並べる（重複を考慮して多めに残す）
+        keep = max(limit * 16, 64)
+        if ids.size > keep:
+            part = np.argpartition(-scores, keep - 1)[:keep]
+            ids, scores = ids[part], scores[part]
+        order = np.argsort(-scores, kind="stable")
+        ids = ids[order]
+        _, first = np.unique(ids, return_index=True)
+        return ids[np.sort(first)][:limit]
+
+    def search(self, query, limit=5, fuzzy=True):
+        """
+        クエリに一致する銘柄を順位順に返す（FMPの search と同じ形式の dict のリスト）。
+
+        Parameters:
+            query (str): ティッカーまたは企業名（の一部）
+            limit (int): 最大件数
+            fuzzy (bool): 前方一致が limit 件に満たない場合に 3-gram のあいまい一致で補うか
+        """
+        query = normalize(query)
+        if not query or not self.symbols:
+            return []
+
+        if query in self._short_prefix_top and limit <= _SHORT_PREFIX_TOP:
+            top = self._short_prefix_top[query][:limit]
+        else:
+            ids, scores = self._prefix_candidates(query)
+            if fuzzy and len(query) >= 3 and ids.size < limit * 4 and np.unique(ids).size < limit:
+                fuzzy_ids, fuzzy_scores = self._fuzzy_candidates(query)
+                ids = np.concatenate([ids, fuzzy_ids])
+                scores = np.concatenate([scores, fuzzy_scores])
+            top = self._rank(ids, scores, limit)
+
+        return [
+            {"symbol": self.symbols[i], "name": self.names[i], "exchangeShortName": self.exchanges[i]}
+            for i in top.tolist()
+        ]
+
+
+# ---- プロセス内で共有するインデックス（遅延読み込み） ----
+
+_index = None
+_index_lock = threading.Lock()
+_refresh_thread = None
+# バックグラウンドでの再構築の結果（get_index_stats() で計測パネルに表示する）
+_refresh_stats = {"refreshes": 0, "failures": 0, "skipped": 0, "last_refresh_time": None,
+                  "last_error": None, "last_error_time": None}
+
+
+def refresh_index(path=DEFAULT_INDEX_PATH, symbol_list=None):
+    """
+    銘柄一覧（省略時はFMPから取得）からインデックスを構築して保存し、共有インデックスを置き換える。
+    """
+    global _index
+    if symbol_list is None:
+        from src.data_fetchers import fetch_symbol_list
+        symbol_list = fetch_symbol_list()
+    index = SymbolIndex.build(symbol_list)
+    index.save(path)
+    with _index_lock:
+        _index = index
+    return index
+
+
+def _refresh_in_background(path):
+    global _refresh_thread
+    with _index_lock:
+        if _refresh_thread is not None and _refresh_thread.is_alive():
+            return
+        # 失敗した直後は再試行しない（インデックスがない間は検索のたびに呼ばれるため）
+        last_error_time = _refresh_stats["last_error_time"]
+        if last_error_time is not None and time.time() - last_error_time < REFRESH_RETRY_INTERVAL:
+            _refresh_stats["skipped"] += 1
+            return
+
+        def run():
+            try:
+                refresh_index(path)
+            except Exception as e:
+                # REFRESH_RETRY_INTERVAL の経過後に再試行する（それまではリモート検索にフォールバックする）
+                logger.exception("検索インデックスの再構築に失敗しました: %s", path)
+                with _index_lock:
+                    _refresh_stats["failures"] += 1
+                    # エラーメッセージの URL に含まれる APIキーは画面に表示しない
+                    _refresh_stats["last_error"] = _API_KEY_PARAM.sub(r"\1***", f"{type(e).__name__}: {e}")
+                    _refresh_stats["last_error_time"] = time.time()
+            else:
+                with _index_lock:
+                    _refresh_stats["refreshes"] += 1
+                    _refresh_stats["last_refresh_time"] = time.time()
+
+        _refresh_thread = threading.Thread(target=run, name="symbol-index-refresh", daemon=True)
+        _refresh_thread.start()
+
+
+def get_symbol_index(path=DEFAULT_INDEX_PATH, max_age=DEFAULT_MAX_AGE, refresh=True):
+    """
+    共有インデックスを返す。初回はディスクから読み込み、存在しない・max_age より古い場合は
+    バックグラウンドで再構築する（構築が終わるまでは古いインデックス または None を返す）。
+    """
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = SymbolIndex.load(path)
+    index = _index
+    if refresh and (index is None or index.age() > max_age):
+        _refresh_in_background(path)
+    return index
+
+
+def get_index_stats():
+    """共有インデックスの状態と、バックグラウンドでの再構築の成功・失敗（直近のエラー）を返す"""
+    with _index_lock:
+        index = _index
+        stats = dict(_refresh_stats)
+        refreshing = _refresh_thread is not None and _refresh_thread.is_alive()
+    return {
+        **stats,
+        "loaded": index is not None,
+        "symbols": len(index) if index is not None else 0,
+        "age_sec": index.age() if index is not None else None,
+        "refreshing": refreshing,
+    }
+
+
+def search_symbols(query, limit=5):
+    """
+    ローカルのインデックスで検索し、インデックスが未構築 または 該当がない場合のみ FMP の検索APIを使う。
+    """
+    index = get_symbol_index()
+    if index is not None:
+        results = index.search(query, limit=limit)
+        if results:
+            return results
+
+    from src.data_fetchers import search_ticker_by_name
+    results = search_ticker_by_name(query)
+    # APIのエラー応答（dict）は空の結果として扱う
+    return results if isinstance(results, list) else []
+
+
+def main(argv=None):
+    import argparse
+    import json
+    import sys
+
+    parser = argparse.ArgumentParser(description="ティッカー・企業名のローカル検索インデックス")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build_parser = sub.add_parser("build", help="銘柄一覧からインデックスを構築する")
+    build_parser.add_argument("--from-json", help="FMP stock/list 形式のJSONファイル（省略時はFMPから取得）")
+    build_parser.add_argument("--path", default=str(DEFAULT_INDEX_PATH))
+    search_parser = sub.add_parser("search", help="インデックスで検索する")
+    search_parser.add_argument("query")
+    search_parser.add_argument("--limit", type=int, default=5)
+    search_parser.add_argument("--path", default=str(DEFAULT_INDEX_PATH))
+    args = parser.parse_args(argv)
+
+    if args.command == "build":
+        symbol_list = None
+        if args.from_json:
+            with open(args.from_json, encoding="utf-8") as f:
+                symbol_list = json.load(f)
+        index = refresh_index(args.path, symbol_list=symbol_list)
+        print(f"{len(index)} 銘柄のインデックスを {args.path} に保存しました", file=sys.stderr)
+        return 0
+
+    index = SymbolIndex.load(args.path)
+    if index is None:
+        print(f"インデックスがありません（python -m src.symbol_index build で構築してください）: {args.path}",
+              file=sys.stderr)
+        return 1
+    start = time.perf_counter()
+    results = index.search(args.query, limit=args.limit)
+    elapsed_ms = (time.perf_counter() - start) * 1e3
+    for item in results:
+        print(f"{item['symbol']:<10} {item['name']} ({item['exchangeShortName']})")
+    print(f"{elapsed_ms:.3f} ms", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,8 +1,15 @@
-import pandas as pd
 import numpy as np
 
-# 財務諸表のリストをDataFlameに変換
+from src.statements import Statements
+
+# 財務諸表のリストをDataFlameに変換（Statements はコピーなしで変換）
+# pandas の読み込みは重いため、計算のみを行うワーカーでは読み込まないよう遅延インポートする
 def to_dataframe(statement_list):
+    if isinstance(statement_list, Statements):
+        return statement_list.to_dataframe()
+
+    import pandas as pd
+
     df = pd.DataFrame(statement_list)
     if "date" in df.columns:
         df["date"] = pd.to_datetime(df["date"])
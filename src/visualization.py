@@ -1,40 +1,95 @@
+import threading
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+
 import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
 
-from src.dcf import sensitivity_analysis_dcf
+from src.dcf import extract_fcf_array
+from src.figures import (build_multiple_metrics_figure, build_ev_comparison_figure, build_price_comparison_figure,
+                         build_sensitivity_figure, render_figure, render_pool)
+from src.instrumentation import timed, stage
+from src.render_cache import RenderCache, make_render_key
+
+# 描画済みグラフのキャッシュ（プロセス内の全セッションで共有）
+render_cache = RenderCache()
+RENDER_FORMAT = "png"  # "png" または "svg"
+
+# render_batch() の中で描画を待っているグラフ（Streamlit のスクリプトのスレッドごと）
+_batch = threading.local()
+
+
+def _show_image(image, container=st):
+    if RENDER_FORMAT == "svg":
+        container.image(image.decode("utf-8"))
+    else:
+        container.image(image)
+
+
+# キャッシュにあれば画像を、なければ builder(*args) で描画した画像を表示する
+# （render_batch() の中では、表示位置だけ確保してワーカープロセスで描画する）
+def _show_cached_figure(key, builder, *args):
+    image = render_cache.get(key)
+    if image is None:
+        pending = getattr(_batch, "pending", None)
+        future = render_pool.submit(builder, args, RENDER_FORMAT) if pending is not None else None
+        if future is not None:
+            pending.append((key, st.empty(), future, builder, args))
+            return
+        image = render_figure(builder, args, image_format=RENDER_FORMAT)
+        render_cache.put(key, image)
+    _show_image(image)
+
+
+# with 内で表示するグラフを、ワーカープロセスでまとめて並列に描画する。
+# 表示位置はグラフを呼び出した順に確保し、描画が終わったものから表示する（入れ子の場合は外側でまとめる）
+@contextmanager
+def render_batch():
+    if getattr(_batch, "pending", None) is not None or not render_pool.enabled:
+        yield
+        return
+
+    pending = _batch.pending = []
+    try:
+        yield
+    except BaseException:
+        for item in pending:
+            item[2].cancel()
+        raise
+    finally:
+        _batch.pending = None
+
+    with stage("render.batch"):
+        futures = {item[2]: item for item in pending}
+        for future in as_completed(futures):
+            key, placeholder, _, builder, args = futures[future]
+            try:
+                image = future.result()
+            except BrokenProcessPool:
+                # ワーカープロセスの異常終了。プールを作り直し、このグラフはこの場で描画する
+                render_pool.reset()
+                image = render_figure(builder, args, image_format=RENDER_FORMAT)
+            except Exception:
+                # グラフ自体の例外など。プールは正常なので作り直さず、この場で描画する（例外はここで改めて発生する）
+                image = render_figure(builder, args, image_format=RENDER_FORMAT)
+            render_cache.put(key, image)
+            _show_image(image, placeholder)
+
 
 # 複数の指標を1つのグラフにプロットして表示
+@timed()
 def plot_multiple_metrics(df_statement, metrics, title=None):
-    sns.set_theme(style="whitegrid", palette="muted", font_scale=1.1)
-
     # プロット対象のDataFrameを整形
     df = df_statement.copy()
     df = df[metrics].dropna(axis=0, how='all')  # 全てNaNの行は削除
-    df["Date"] = df.index
-
-    # meltで長い形式に変換（Seaborn向け）
-    df_melted = df.melt(id_vars="Date", var_name="Metric", value_name="Value")
-
-    # プロット
-    fig, ax = plt.subplots(figsize=(12, 6))
-    sns.lineplot(data=df_melted, x="Date", y="Value", hue="Metric", marker="o", ax=ax)
 
-    # ラベル・タイトルの設定
-    ax.set_title(title or "Financial Metrics", fontsize=14, weight="bold")
-    ax.set_xlabel("Date", fontsize=12)
-    ax.set_ylabel("Value", fontsize=12)
-    ax.legend(title="Metric", loc="best")
-    fig.tight_layout()
-
-    st.pyplot(fig)
+    key = make_render_key("multiple_metrics", RENDER_FORMAT, df, metrics, title)
+    _show_cached_figure(key, build_multiple_metrics_figure, df, title)
 
 
 # 企業価値・理論株価のシナリオ別比較グラフを表示
+@timed()
 def plot_dcf_comparison_charts(valid_results):
-    sns.set_theme(style="whitegrid")
-
     if not valid_results:
         st.info("Insufficient scenario results. Comparison charts are not available.")
         return
@@ -44,76 +99,24 @@ def plot_dcf_comparison_charts(valid_results):
     fair_prices = [res["fair_share_price"] for res in valid_results]
     market_prices = [res["current_market_price"] for res in valid_results]
 
-    df_ev = pd.DataFrame({
-        "Scenario": labels,
-        "Enterprise Value (B USD)": enterprise_values
-    })
-    fig1, ax1 = plt.subplots(figsize=(10, 5))
-    sns.barplot(x="Scenario", y="Enterprise Value (B USD)", data=df_ev, ax=ax1, palette="Blues_d")
-    ax1.set_title("Enterprise Value by Scenario", fontsize=14)
-    ax1.set_ylabel("Enterprise Value (Billion USD)", fontsize=12)
-    ax1.set_xlabel("")
-    ax1.tick_params(axis='x', rotation=15)
-    st.pyplot(fig1)
-
-    df_prices = pd.DataFrame({
-        "Scenario": labels * 2,
-        "Price (USD)": fair_prices + market_prices,
-        "Type": ["Fair Value"] * len(labels) + ["Market Price"] * len(labels)
-    })
-    fig2, ax2 = plt.subplots(figsize=(10, 5))
-    sns.barplot(
-        data=df_prices,
-        x="Scenario",
-        y="Price (USD)",
-        hue="Type",
-        palette="Set2",
-        ax=ax2
+    _show_cached_figure(
+        make_render_key("dcf_comparison_ev", RENDER_FORMAT, labels, enterprise_values),
+        build_ev_comparison_figure, labels, enterprise_values
+    )
+    _show_cached_figure(
+        make_render_key("dcf_comparison_price", RENDER_FORMAT, labels, fair_prices, market_prices),
+        build_price_comparison_figure, labels, fair_prices, market_prices
     )
-    ax2.set_title("Fair Value vs Market Price per Share", fontsize=14)
-    ax2.set_ylabel("Price (USD)", fontsize=12)
-    ax2.set_xlabel("")
-    ax2.tick_params(axis='x', rotation=15)
-    ax2.legend(title="")
-    st.pyplot(fig2)
 
 
 # シナリオ別のDCF感応度分析ヒートマップを表示
+@timed()
 def plot_dcf_sensitivity_heatmaps(valid_results):
-    sns.set_theme(style="whitegrid")
-
     for res in valid_results:
         st.markdown(f"#### {res['scenario']}")
-        with st.spinner("Running sensitivity analysis..."):
-            matrix, wacc_list, g_list = sensitivity_analysis_dcf(
-                cf_list=res["cf_list"],
-                base_wacc=res["wacc"],
-                base_growth=res["growth"],
-                wacc_range=(-0.01, 0.01),
-                growth_range=(-0.005, 0.005),
-                wacc_steps=5,
-                growth_steps=5
-            )
-
-        heatmap_df = pd.DataFrame(
-            matrix / 1e9,
-            index=[f"{w*100:.2f}%" for w in wacc_list],
-            columns=[f"{g*100:.2f}%" for g in g_list]
-        )
-
-        fig, ax = plt.subplots(figsize=(9, 6))
-        sns.heatmap(
-            heatmap_df,
-            annot=True,
-            fmt=".1f",
-            cmap="YlGnBu",
-            ax=ax,
-            annot_kws={"size": 10},
-            linewidths=0.5,
-            cbar_kws={'label': 'Enterprise Value (B USD)'}
-        )
-        ax.set_xlabel("Perpetual Growth Rate (g)", fontsize=12)
-        ax.set_ylabel("WACC", fontsize=12)
-        ax.set_title(f"Sensitivity Heatmap: {res['scenario']}", fontsize=14)
-        st.pyplot(fig)
 
+        # 感応度分析の結果は FCF・WACC・g で決まるため、キャッシュヒット時は分析自体も省略される
+        fcf = extract_fcf_array(res["fcf"])
+        key = make_render_key("dcf_sensitivity", RENDER_FORMAT, res["scenario"], fcf, res["wacc"], res["growth"])
+        with st.spinner("Running sensitivity analysis..."):
+            _show_cached_figure(key, build_sensitivity_figure, res["scenario"], fcf, res["wacc"], res["growth"])